@@ -0,0 +1,114 @@
+"""Opt-in keyset pagination for incremental sync clients.
+
+The default LimitOffsetPagination counts the filtered rows on every request and skips offset
+rows, so deep pages get slower the further a client pages. With ?pagination=cursor the
+rows are ordered by (ordering_field, id) instead and every page continues after the last row
+of the previous one: "WHERE last_updated > %s OR (last_updated = %s AND id > %s) ORDER BY
+last_updated, id LIMIT n", which is one range scan of the (last_updated, id) index whatever
+the position. The response has no count, next links carry the opaque cursor and keep all
+other query parameters, so the mode pairs with filters like modified_after. The order is
+fixed, so cursor mode combined with a sort parameter is rejected with a 400.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.utils.dateparse import parse_datetime
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """LimitOffsetPagination with an opt-in keyset (cursor) mode
+
+    Views set keyset_ordering_field to the modification timestamp of their model, defaults
+    to "last_updated". The model needs an index on (keyset_ordering_field, id). Query parameters
+    in sort_query_params sort the results and can not be combined with the cursor mode.
+    """
+
+    mode_query_param = "pagination"
+    cursor_query_param = "cursor"
+    ordering_field = "last_updated"
+    invalid_cursor_message = "Invalid cursor"
+    sort_query_params = ("sort", "ordering")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        sort = [param for param in self.sort_query_params if request.query_params.get(param)]
+        if sort:
+            raise ValidationError({sort[0]: "cursor pagination is ordered by modification, sorting is not supported"})
+        self.request = request
+        self.limit = self.get_limit(request)
+        field = queryset.model._meta.get_field(getattr(view, "keyset_ordering_field", self.ordering_field))
+        queryset = queryset.order_by(field.name, "pk")
+        position = self.decode_cursor(request)
+        if position is not None:
+            timestamp, pk = position
+            # the >= bound lets the planner scan the index from the position on
+            queryset = queryset.filter(
+                Q(**{f"{field.name}__gte": timestamp}),
+                Q(**{f"{field.name}__gt": timestamp}) | Q(**{field.name: timestamp, "pk__gt": pk}),
+            )
+        page = list(queryset[:self.limit + 1])
+        self.next_position = None
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            self.next_position = (getattr(page[-1], field.attname).isoformat(), page[-1].pk)
+        return page
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            timestamp, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError(encoded)
+            return timestamp, int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position) -> str:
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([("next", self.get_next_link()), ("results", data)]))
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to cursor to page by (last modification, id), the response then has no count. "
+                "Can not be combined with sorting.",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Cursor of the next link of the previous page.",
+                "schema": {"type": "string"},
+            },
+        ]
@@ -69,6 +69,26 @@ CELERY_task_routes = {
     }
 }
 
+# periodic maintenance of the research backend, run by the celery beat program in celery_config
+CELERY_beat_schedule = {
+    "sweep-scrape-claims": {
+        "task": "oebl_research_backend.tasks.sweep_scrape_claims",
+        "schedule": 300.0,
+    },
+    "flush-notifications": {
+        "task": "oebl_research_backend.tasks.flush_notifications",
+        "schedule": 60.0,
+    },
+    "prune-research-job-events": {
+        "task": "oebl_research_backend.tasks.prune_research_job_events",
+        "schedule": 86400.0,
+    },
+    "prune-list-entry-changes": {
+        "task": "oebl_research_backend.tasks.prune_list_entry_changes",
+        "schedule": 86400.0,
+    },
+}
+
 
 SECRET_KEY = (
     "d3j@454545()(/)@zlck/6dsaf*#sdfsaf*#sadflj/6dsfk-11$)d6ixcvjsdfsdf&-u35#ayi"
@@ -14,6 +14,7 @@ from drf_spectacular.utils import inline_serializer, extend_schema, extend_schem
 from rest_framework import status
 from django.contrib.auth.models import User
 from django.db.models import QuerySet, Subquery
+from apis.pagination import KeysetPagination
 
 
 from .models import (
@@ -89,6 +90,8 @@ class IssueLemmaViewset(viewsets.ModelViewSet):
 
     queryset = IssueLemma.objects.all()
     filter_fields = ["lemma", "issue", "editor", ]
+    pagination_class = KeysetPagination
+    keyset_ordering_field = "created"
     http_method_names = ["get", "post", "head", "options", "delete", "update", "patch", "put", ]
     permission_classes = [IsAuthenticated, IssueLemmaEditorAssignmentPermissions]
 
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-17 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_irs_workflow', '0004_auto_20220707_1334'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='issuelemma',
+            index=models.Index(fields=['created', 'id'], name='oebl_irs_wo_created_baf343_idx'),
+        ),
+    ]
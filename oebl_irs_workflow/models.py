@@ -187,6 +187,10 @@ class IssueLemma(models.Model):
             ret = super().save(*args, **kwargs)
         return ret
 
+    class Meta:
+        # keyset pagination of the issuelemma endpoint, see KeysetPagination
+        indexes = [models.Index(fields=["created", "id"])]
+
 
 
 class EditTypes(models.TextChoices):
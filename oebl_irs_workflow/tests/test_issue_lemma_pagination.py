@@ -0,0 +1,59 @@
+"""
+# Summary Of Tests Rules In This Module:
+
+Test the opt-in keyset pagination of the issue lemma endpoint -> `IssueLemmaViewset`
+
+- With ?pagination=cursor IssueLemmas are paged by (created, id), without a count.
+- Next links continue after the last IssueLemma of the page and keep the filters.
+- Invalid cursors get a 404.
+"""
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from oebl_irs_workflow.models import Editor, IrsUser, Issue, IssueLemma, Lemma
+from oebl_irs_workflow.tests.utilities import LogOutMixin, create_and_login_user
+
+
+class CursorPaginationTestCase(LogOutMixin, APITestCase):
+
+    def setUp(self) -> None:
+        create_and_login_user(IrsUser, self.client)
+        self.issue = Issue.objects.create(name='Issue')
+        editor = Editor.objects.create(username='Any editor')
+        for idx in range(5):
+            IssueLemma.objects.create(
+                issue=self.issue if idx % 2 == 0 else None,
+                editor=editor,
+                lemma=Lemma.objects.create(first_name=f'First Name {idx}', name='Last Name'),
+            )
+        # rows saved by one statement share their timestamp, the id breaks the tie
+        IssueLemma.objects.filter(pk__in=IssueLemma.objects.order_by('pk').values('pk')[:3]).update(
+            created=timezone.now()
+        )
+
+    def get_all(self, **params) -> list:
+        response = self.client.get('/workflow/api/v1/issue-lemma/', {'pagination': 'cursor', 'limit': 2, **params})
+        seen = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(x['id'] for x in response.data['results'])
+            if response.data['next'] is None:
+                return seen
+            response = self.client.get(response.data['next'])
+
+    def test_pages_are_ordered_by_created(self):
+        self.assertEqual(
+            self.get_all(),
+            list(IssueLemma.objects.order_by('created', 'pk').values_list('pk', flat=True)),
+        )
+
+    def test_filters_are_kept(self):
+        self.assertEqual(
+            self.get_all(issue=self.issue.pk),
+            list(IssueLemma.objects.filter(issue=self.issue).order_by('created', 'pk').values_list('pk', flat=True)),
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/workflow/api/v1/issue-lemma/', {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
@@ -1,7 +1,9 @@
 from django.contrib import admin
 
-from .models import List, ListEntry, IRSPerson
+from .models import List, ListEntry, IRSPerson, ResearchJob, ScrapeCounter
 
 admin.site.register(List)
 admin.site.register(ListEntry)
-admin.site.register(IRSPerson)
\ No newline at end of file
+admin.site.register(IRSPerson)
+admin.site.register(ResearchJob)
+admin.site.register(ScrapeCounter)
@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework import routers
 
-from .api_views import LemmaResearchView, ListViewset
+from .api_views import LemmaResearchView, ListViewset, ResearchJobViewset
 from .autocompletes import ProfessionGroupAutocomplete
 
 app_name = "oebl_research_backend"
@@ -10,6 +10,7 @@ app_name = "oebl_research_backend"
 router = routers.DefaultRouter()
 router.register(r"listresearch", ListViewset)
 router.register(r"lemmaresearch", LemmaResearchView)
+router.register(r"researchjobs", ResearchJobViewset)
 
 urlpatterns = router.urls
 
@@ -1,20 +1,33 @@
 import json
+import math
 from numpy import require
 from rest_framework.generics import ListCreateAPIView
 from rest_framework.mixins import DestroyModelMixin
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import viewsets
 from rest_framework import serializers
-from .tasks import scrape
+from .tasks import rescrape_entries, scrape, start_research_job
 from rest_framework.response import Response
-from drf_spectacular.utils import inline_serializer, extend_schema, extend_schema_view
+from drf_spectacular.utils import OpenApiParameter, inline_serializer, extend_schema, extend_schema_view
 from drf_spectacular.types import OpenApiTypes
 from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+from django.http import StreamingHttpResponse
 from django_filters import rest_framework as filters
-from django.contrib.postgres.search import SearchVector
+from django.db.models import Prefetch
 
-from .models import ListEntry, List, Editor, CHOICES_GENDER
-from .serializers import ListEntrySerializer, ListSerializer, create_alternative_names_field, create_secondary_literature_field, create_zotero_keys_field, create_gideon_legacy_literature_field
+from .models import ListEntry, ListEntryChange, List, Editor, ResearchJob, ResearchJobChunk, CHOICES_GENDER
+from .bulk import set_deleted, update_entries
+from .gnd_lookup import lookup_gnds
+from .json_filters import filter_json_field
+from apis.pagination import KeysetPagination
+from .progress import LONG_POLL_TIMEOUT, event_stream, wait_for_events
+from .search import search_field, search_persons
+from .sync import InvalidSyncToken, sync_list
+from .serializers import BulkSelectionSerializer, BulkUpdateSerializer, GndLookupSerializer, ListEntrySerializer, ListSerializer, ResearchJobSerializer, create_alternative_names_field, create_secondary_literature_field, create_zotero_keys_field, create_gideon_legacy_literature_field
 
 
 class LemmaResearchFilter(filters.FilterSet):
@@ -25,6 +38,7 @@ class LemmaResearchFilter(filters.FilterSet):
     columns_user = filters.CharFilter(method="search_json_field")
     columns_scrape = filters.CharFilter(method="search_json_field")
     search = filters.CharFilter(method="search_vector")
+    gnd = filters.CharFilter(method="search_gnd")
     sort = filters.OrderingFilter(
         fields=(
             ("person__first_name", "first_name"),
@@ -38,20 +52,16 @@ class LemmaResearchFilter(filters.FilterSet):
         fields = ["modified_after", "deleted"]
     
     def search_def(self, queryset, field_name, value):
-        q = {f"{field_name}__search": value}
-        return queryset.filter(**q)
-    
-    def search_vector(self, queryset,field_name, value):
-        return queryset.annotate(
-        search=SearchVector("person__name", "person__first_name"),
-            ).filter(search=value)
+        return search_field(queryset, field_name, value)
+
+    def search_vector(self, queryset, field_name, value):
+        return search_persons(queryset, value, prefix="person__")
     
     def search_json_field(self, queryset, field_name, value):
-        q = json.loads(value)
-        q2 = {}
-        for k, v in q.items():
-            q2[f"{field_name}__{k}"] = v
-        return queryset.filter(**q2)
+        return filter_json_field(queryset, field_name, value)
+
+    def search_gnd(self, queryset, field_name, value):
+        return queryset.filter(person__gnds__contains=[value])
 
 
 @extend_schema(
@@ -186,23 +196,27 @@ class LemmaResearchView(viewsets.ModelViewSet):
         GenericAPIView ([type]): [description]
     """
 
-    queryset = ListEntry.objects.all()
+    # ListEntrySerializer reads person and list, list.editor is rendered from editor_id
+    queryset = ListEntry.objects.select_related("person", "list")
     serializer_class = ListEntrySerializer
     permission_classes = [IsAuthenticated]
     filter_backends = (filters.DjangoFilterBackend,)
     filter_class = LemmaResearchFilter
+    pagination_class = KeysetPagination
     http_method_names = ["get", "post", "head", "options", "delete", "update", "patch"]
 
     def create(self, request):
-        job_id = scrape.delay(request.data, request.user.pk, request.data["listId"])
-        return Response({"success": job_id.id})
+        job = start_research_job(request.data, request.user.pk, request.data["listId"])
+        return Response({"success": job.job_id})
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop("partial", False)
         instance = self.get_object()
+        old_list_id = instance.list_id
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        self.log_update(serializer, old_list_id)
         if getattr(instance, "_prefetched_objects_cache", None):
             # If 'prefetch_related' has been applied to a queryset, we need to
             # forcibly invalidate the prefetch cache on the instance.
@@ -219,21 +233,167 @@ class LemmaResearchView(viewsets.ModelViewSet):
                 serializer.data["list"]["id"],
                 update=instance.pk,
                 gnd_job=serializer.data["gnd"],
+                force_refresh=request.query_params.get("force_refresh", "").lower() == "true",
             )
             return Response({"success": job_id.id, "instance": serializer.data})
         else:
             return Response({"success": None, "instance": serializer.data})
 
+    def log_update(self, serializer, old_list_id):
+        """Logs an update for the sync endpoint, person fields changed for all entries of the person"""
+        instance = serializer.instance
+        fields = [key for key in serializer.initial_data.keys() if key in serializer.fields]
+        person_fields = {name for name, field in serializer.fields.items() if field.source.startswith("person.")}
+        if "gnd" in fields or person_fields.intersection(fields):
+            # the person is shared by the entries of all lists it was uploaded to
+            ListEntryChange.log(
+                ListEntry.objects.filter(person_id=instance.person_id).values_list("pk", flat=True), fields
+            )
+        elif instance.list_id == old_list_id:
+            ListEntryChange.log([instance.pk], fields)
+        if instance.list_id != old_list_id:
+            # the entry is new to its list and gone from the old one
+            ListEntryChange.log([instance.pk])
+            if old_list_id is not None:
+                ListEntryChange.log([instance.pk], deleted=True, list_id=old_list_id)
+
+    @extend_schema(
+        description="""Changes of the entries of a list since the last sync: the changed fields of changed
+        entries and {"id": .., "deleted": true} for entries deleted or moved to another list. Without token,
+        or if the token expired, all entries of the list are returned and reset is true: drop the local copy
+        of the list first. Pass the returned token to the next sync, while more is true there are further
+        changes.
+        """,
+        parameters=[
+            OpenApiParameter("list_id", OpenApiTypes.INT, required=True),
+            OpenApiParameter("token", OpenApiTypes.STR, description="token returned by the last sync"),
+        ],
+        responses=inline_serializer(
+            name="ListEntrySync",
+            fields={
+                "changes": serializers.ListField(child=serializers.DictField()),
+                "token": serializers.CharField(),
+                "more": serializers.BooleanField(),
+                "reset": serializers.BooleanField(),
+            },
+        ),
+    )
+    @action(detail=False, filter_backends=[], pagination_class=None)
+    def sync(self, request):
+        try:
+            list_id = int(request.query_params["list_id"])
+        except (KeyError, ValueError):
+            return Response({"detail": "list_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(sync_list(list_id, request.query_params.get("token")))
+        except InvalidSyncToken as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     def destroy(self, request, *arg, **kwargs):
         ent = ListEntry.objects.filter(pk=kwargs["pk"])
         if ent.count() == 0:
             return Response(status.HTTP_404_NOT_FOUND)
         else:
-            for e in ent:
-                e.deleted = True
-                e.save()
+            set_deleted(ent)
             return Response(status.HTTP_204_NO_CONTENT)
 
+    def get_bulk_queryset(self, request):
+        """List entries selected by the ids or the filter of a bulk action, see BulkSelectionSerializer"""
+        selection = BulkSelectionSerializer(data=request.data)
+        selection.is_valid(raise_exception=True)
+        if "ids" in selection.validated_data:
+            return ListEntry.objects.filter(pk__in=selection.validated_data["ids"])
+        data = {
+            key: json.dumps(value) if isinstance(value, (dict, list)) else value
+            for key, value in selection.validated_data["filter"].items()
+        }
+        filterset = LemmaResearchFilter(data=data, queryset=ListEntry.objects.all(), request=request)
+        # unknown keys would be ignored and select all entries
+        unknown = set(data) - set(filterset.filters)
+        if unknown:
+            raise ValidationError({"filter": f"unknown filters: {', '.join(sorted(unknown))}"})
+        if not filterset.is_valid():
+            raise ValidationError({"filter": filterset.errors})
+        return filterset.qs
+
+    @extend_schema(
+        description="""Soft deletes all list entries given by ids or matching filter (the filters of this endpoint)
+        with one statement.
+        """,
+        request=BulkSelectionSerializer,
+        responses=inline_serializer(name="BulkDeleteResponse", fields={"affected": serializers.IntegerField()}),
+    )
+    @action(detail=False, methods=["post"], url_path="bulk-delete")
+    def bulk_delete(self, request):
+        return Response({"affected": len(set_deleted(self.get_bulk_queryset(request)))})
+
+    @extend_schema(
+        description="""Restores all soft deleted list entries given by ids or matching filter with one statement.
+        """,
+        request=BulkSelectionSerializer,
+        responses=inline_serializer(name="BulkRestoreResponse", fields={"affected": serializers.IntegerField()}),
+    )
+    @action(detail=False, methods=["post"], url_path="bulk-restore")
+    def bulk_restore(self, request):
+        return Response({"affected": len(set_deleted(self.get_bulk_queryset(request), deleted=False))})
+
+    @extend_schema(
+        description="""Applies patch (the fields of a PATCH of a single list entry) to all list entries given by ids
+        or matching filter. selected and list are set, columns_user is merged into the user columns, the person
+        fields and gnd are set on the persons of the entries. Unchanged entries and persons are not written, only
+        entries whose GNDs changed are scraped again (job id in success).
+        """,
+        request=BulkUpdateSerializer,
+        parameters=[OpenApiParameter("force_refresh", OpenApiTypes.BOOL)],
+        responses=inline_serializer(
+            name="BulkUpdateResponse",
+            fields={
+                "entries": serializers.IntegerField(),
+                "persons": serializers.IntegerField(),
+                "rescraped": serializers.IntegerField(),
+                "success": serializers.CharField(allow_null=True),
+            },
+        ),
+    )
+    @action(detail=False, methods=["patch"], url_path="bulk-update")
+    def bulk_update(self, request):
+        selection = BulkUpdateSerializer(data=request.data)
+        selection.is_valid(raise_exception=True)
+        res = update_entries(self.get_bulk_queryset(request), selection.validated_data["patch"])
+        job_id = None
+        if res["rescrape"]:
+            job_id = rescrape_entries.delay(
+                res["rescrape"], force_refresh=request.query_params.get("force_refresh", "").lower() == "true"
+            ).id
+        return Response(
+            {
+                "entries": len(res["entries"]),
+                "persons": len(res["persons"]),
+                "rescraped": len(res["rescrape"]),
+                "success": job_id,
+            }
+        )
+
+    @extend_schema(
+        description="""Resolves GNDs to research persons and their list entries with two queries. results maps
+        every GND found to its persons, missing lists the GNDs without person.
+        """,
+        request=GndLookupSerializer,
+        responses=inline_serializer(
+            name="GndLookupResponse",
+            fields={
+                "results": serializers.DictField(child=serializers.ListField(child=serializers.DictField())),
+                "missing": serializers.ListField(child=serializers.CharField()),
+            },
+        ),
+    )
+    @action(detail=False, methods=["post"], url_path="gnd-lookup", filter_backends=[], pagination_class=None)
+    def gnd_lookup(self, request):
+        serializer = GndLookupSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results, missing = lookup_gnds(serializer.validated_data["gnds"])
+        return Response({"results": results, "missing": missing})
+
 
 """     def get(self, request, crawlerid):
         scrape_id = db.scrape.find_one({"celery_id": crawlerid})
@@ -294,3 +454,69 @@ class ListViewset(viewsets.ModelViewSet):
     serializer_class = ListSerializer
     filter_fields = ["title", "editor"]
     permission_classes = [IsAuthenticated]
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients negotiate text/event-stream, the stream itself is a StreamingHttpResponse"""
+    media_type = "text/event-stream"
+    format = "event-stream"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # only errors are rendered, as a single message
+        return f"event: error\ndata: {json.dumps(data)}\n\n".encode()
+
+
+@extend_schema(
+    description="""Endpoint that reports the progress of a list upload, the job id is the one returned
+        by POSTing to the lemmaresearch endpoint.
+        """,
+)
+class ResearchJobViewset(viewsets.ReadOnlyModelViewSet):
+
+    queryset = ResearchJob.objects.prefetch_related(
+        Prefetch("chunks", queryset=ResearchJobChunk.objects.only("id", "job_id", "index", "failed_rows"))
+    ).order_by("-created")
+    serializer_class = ResearchJobSerializer
+    lookup_field = "job_id"
+    filter_fields = ["list"]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user_id=self.request.user.pk)
+
+    @extend_schema(
+        description="""Per lemma and per source progress of the job, the events after the given event id.
+        With "Accept: text/event-stream" they are sent as Server-Sent Events, the stream ends after the
+        events available and EventSource reconnects with Last-Event-ID. Otherwise the request returns
+        right away, or waits up to timeout seconds for events (short long-poll).
+        """,
+        parameters=[
+            OpenApiParameter("after", OpenApiTypes.INT, description="id of the last event seen"),
+            OpenApiParameter("timeout", OpenApiTypes.INT, description="seconds to wait, capped at a few seconds"),
+        ],
+        responses=inline_serializer(
+            name="ResearchJobEvents",
+            fields={
+                "events": serializers.ListField(child=serializers.DictField()),
+                "cursor": serializers.IntegerField(),
+                "state": serializers.DictField(),
+            },
+        ),
+    )
+    @action(detail=True, renderer_classes=list(api_settings.DEFAULT_RENDERER_CLASSES) + [EventStreamRenderer])
+    def events(self, request, job_id=None):
+        job = self.get_object()
+        try:
+            after = int(request.META.get("HTTP_LAST_EVENT_ID") or request.query_params.get("after") or 0)
+            timeout = float(request.query_params.get("timeout", LONG_POLL_TIMEOUT))
+            if not math.isfinite(timeout):
+                raise ValueError(timeout)
+        except ValueError:
+            return Response({"detail": "after and timeout must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(request.accepted_renderer, EventStreamRenderer):
+            res = StreamingHttpResponse(event_stream(job, after), content_type="text/event-stream")
+            res["Cache-Control"] = "no-cache"
+            res["X-Accel-Buffering"] = "no"
+            return res
+        events, state = wait_for_events(job, after, timeout)
+        return Response({"events": events, "cursor": events[-1]["id"] if events else after, "state": state})
@@ -0,0 +1,217 @@
+"""Benchmarks for the research pipeline.
+
+Run them with ``python manage.py research_benchmark <case>``. Every case runs inside a
+transaction that is rolled back afterwards, so no synthetic data is left in the database.
+"""
+import random
+import time
+import typing
+
+from django.contrib.postgres.search import SearchVector
+from django.db import connection, transaction
+
+from .columns import NameMatcher, obv_columns, recompute_list_columns
+from .models import IRSPerson, List, ListEntry, ScrapeResult
+from .search import search_persons
+from .serializers import ListEntrySerializer
+from .tasks import ingest_lemmas, normalize_lemma
+
+BENCHMARKS: typing.Dict[str, typing.Callable] = {}
+
+
+def benchmark(name: str, default_sizes: typing.List[int]):
+    """Registers a benchmark case under name"""
+    def register(func):
+        func.default_sizes = default_sizes
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+class _Rollback(Exception):
+    pass
+
+
+def run_benchmark(name: str, sizes: typing.Optional[typing.List[int]], write: typing.Callable[[str], None]):
+    func = BENCHMARKS[name]
+    try:
+        with transaction.atomic():
+            func(sizes or func.default_sizes, write)
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def synthetic_lemmas(n: int, seed: int = 0) -> typing.List[dict]:
+    """Creates n lemmas shaped like a frontend upload, roughly 10% of them duplicates"""
+    rnd = random.Random(seed)
+    lemmas = []
+    for idx in range(n):
+        num = rnd.randrange(int(n * 0.9) + 1)
+        lemmas.append(
+            {
+                "id": idx + 1,
+                "firstName": f"Vorname{num}",
+                "lastName": f"Nachname{num % 997}",
+                "dateOfBirth": f"{1800 + num % 150}-01-01",
+                "gnd": [f"{100000000 + num}"],
+                "selected": False,
+                "Spalte": f"Wert {idx}",
+            }
+        )
+    return lemmas
+
+
+def _rate(n: int, seconds: float) -> str:
+    return f"{n} rows in {seconds:.2f}s ({n / seconds:.0f} rows/s)"
+
+
+def _legacy_ingest(lemmas: typing.List[dict], list_id: int):
+    """Per lemma get_or_create/create as the scrape task did before bulk ingestion"""
+    for idx, ent in enumerate(lemmas):
+        ent_dict, list_entry_dict, _ = normalize_lemma(idx, ent)
+        pers, created = IRSPerson.objects.get_or_create(**ent_dict)
+        ListEntry.objects.create(person_id=pers.pk, list_id=list_id, **list_entry_dict)
+
+
+@benchmark("ingest", default_sizes=[1000, 10000, 50000])
+def bench_ingest(sizes: typing.List[int], write: typing.Callable[[str], None]):
+    for size in sizes:
+        for label, func in (("per-row", _legacy_ingest), ("bulk", ingest_lemmas)):
+            lemmas = synthetic_lemmas(size)
+            lst = List.objects.create(title=f"benchmark {label} {size}")
+            start = time.perf_counter()
+            func(lemmas, lst.pk)
+            write(f"ingest {label:>8} {_rate(size, time.perf_counter() - start)}")
+
+
+def synthetic_payloads(seed: int = 0) -> typing.Dict[str, typing.Any]:
+    """Raw scrape results of a typical person: 50 OBV records and a 20kB wikipedia article"""
+    rnd = random.Random(seed)
+    return {
+        "obv": [
+            {"title": [f"Titel {rnd.random()}"], "creator": [f"Nachname{x}, Vorname"], "subject": ["Thema"] * 5}
+            for x in range(50)
+        ],
+        "wikipedia": {"edits_count": 120, "number_of_editors": 40, "txt": "Text " * 4000},
+        "wikidata": {"pLabel": "Person", "date_of_birth": "1800-01-01T00:00:00Z"},
+    }
+
+
+@benchmark("list", default_sizes=[100, 1000])
+def bench_list(sizes: typing.List[int], write: typing.Callable[[str], None]):
+    """Serializing the entries of a list as LemmaResearchView does, with and without loading the raw payloads
+
+    Loading the payloads along with the entries is what every list request did while they
+    were stored inline in ListEntry.scrape.
+    """
+    for size in sizes:
+        lst = List.objects.create(title=f"benchmark list {size}")
+        ingested = ingest_lemmas(synthetic_lemmas(size), lst.pk)
+        payloads = synthetic_payloads()
+        ScrapeResult.objects.bulk_create(
+            ScrapeResult(list_entry=entry, source=source, payload=payload)
+            for _, _, _, entry in ingested
+            for source, payload in payloads.items()
+        )
+        for label, qs in (
+            ("inline", ListEntry.objects.filter(list=lst).prefetch_related("scrape_results")),
+            ("separate", ListEntry.objects.filter(list=lst)),
+        ):
+            start = time.perf_counter()
+            entries = list(qs)
+            ListEntrySerializer(entries, many=True).data
+            write(f"list {label:>8} {_rate(size, time.perf_counter() - start)}")
+
+
+def synthetic_obv_records(n: int, seed: int = 0) -> typing.List[dict]:
+    """n pnx display records with up to 8 creators each, drawn from a pool of 200 names"""
+    rnd = random.Random(seed)
+    names = [f"Nachname{x}, Vorname{x}, 1800-1870 [VerfasserIn]$$QNachname{x}, Vorname{x}" for x in range(200)]
+    return [{"creator": rnd.sample(names, rnd.randint(1, 8))} for _ in range(n)]
+
+
+def _legacy_obv_columns(records: typing.List[dict], pers_name: str) -> dict:
+    """Substring matching and list membership dedup as create_columns did before columns.obv_columns"""
+    counts_author = counts_topic = 0
+    list_co_authors = []
+    lst_topic_authors = []
+    for ent in records:
+        test_author = False
+        test_coauthor = []
+        for c1 in ent["creator"]:
+            if pers_name in c1:
+                counts_author += 1
+                test_author = True
+            else:
+                test_coauthor.append(c1)
+        for c3 in test_coauthor:
+            target = list_co_authors if test_author else lst_topic_authors
+            if c3 not in target:
+                target.append(c3)
+        if not test_author:
+            counts_topic += 1
+    return {"count_author": counts_author, "list_coauthors": list_co_authors, "list_topic_authors": lst_topic_authors}
+
+
+@benchmark("columns", default_sizes=[100, 1000])
+def bench_columns(sizes: typing.List[int], write: typing.Callable[[str], None]):
+    """OBV column statistics of list entries with 500 records each, per entry and for a whole list"""
+    records = synthetic_obv_records(500)
+    for size in sizes:
+        for label, func in (
+            ("legacy", lambda: _legacy_obv_columns(records, "Nachname1")),
+            ("engine", lambda: obv_columns(records, NameMatcher("Nachname1", "Vorname1"))),
+        ):
+            start = time.perf_counter()
+            for _ in range(size):
+                func()
+            write(f"columns {label:>8} {_rate(size, time.perf_counter() - start)}")
+        lst = List.objects.create(title=f"benchmark columns {size}")
+        ScrapeResult.objects.bulk_create(
+            ScrapeResult(list_entry=entry, source="obv", payload=records)
+            for _, _, _, entry in ingest_lemmas(synthetic_lemmas(size), lst.pk)
+        )
+        start = time.perf_counter()
+        recompute_list_columns(lst.pk)
+        write(f"columns {'list':>8} {_rate(size, time.perf_counter() - start)}")
+
+
+def synthetic_persons(n: int, seed: int = 0) -> typing.List[IRSPerson]:
+    """n persons with alternative names, a profession and a bio note of about 40 words"""
+    rnd = random.Random(seed)
+    words = [f"wort{x}" for x in range(5000)]
+    return [
+        IRSPerson(
+            name=f"Nachname{rnd.randrange(n // 10 + 1)}",
+            first_name=f"Vorname{rnd.randrange(2000)}",
+            alternative_names=[{"firstName": f"Vorname{rnd.randrange(2000)}", "lastName": f"Name{idx}"}],
+            profession_detail=f"Beruf{rnd.randrange(300)}",
+            bio_note=" ".join(rnd.choices(words, k=40)),
+        )
+        for idx in range(n)
+    ]
+
+
+@benchmark("search", default_sizes=[500000])
+def bench_search(sizes: typing.List[int], write: typing.Callable[[str], None]):
+    """Latency of the search filter with the stored search document and with the document built per query"""
+    for size in sizes:
+        persons = synthetic_persons(size)
+        start = time.perf_counter()
+        for i in range(0, size, 10000):
+            IRSPerson.objects.bulk_create(persons[i:i + 10000])
+        write(f"search {'insert':>8} {_rate(size, time.perf_counter() - start)}")
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {IRSPerson._meta.db_table}")
+        queries = ["Nachname17", "Vorname5 Nachname3", "Beruf42", "wort123 wort456", "Name999"]
+        inline = SearchVector("name", "first_name", "alternative_names", "profession_detail", "bio_note", config="simple")
+        for label, func in (
+            ("inline", lambda q: IRSPerson.objects.annotate(document=inline).filter(document=q)),
+            ("stored", lambda q: search_persons(IRSPerson.objects.all(), q)),
+        ):
+            start = time.perf_counter()
+            for q in queries:
+                list(func(q).values_list("pk", flat=True)[:50])
+            seconds = (time.perf_counter() - start) / len(queries)
+            write(f"search {label:>8} {size} persons: {seconds * 1000:.1f}ms per query")
@@ -0,0 +1,151 @@
+"""Set based writes of many list entries for the bulk actions of LemmaResearchView.
+
+The entries are selected by a queryset (ids or the filters of the endpoint) and written
+with UPDATE ... WHERE statements, a constant number of queries whatever the number of
+entries. Only rows that actually change are written, they get a new last_updated and a
+ListEntryChange, so the delta sync sees the change.
+"""
+import typing
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .expressions import JSONBSet
+from .models import IRSPerson, List, ListEntry, ListEntryChange, gnd_uri
+from .serializers import ListEntrySerializer
+
+BULK_ENTRY_FIELDS = ("selected", "list", "columns_user", "gnd")
+"""keys of ListEntrySerializer besides the person fields update_entries accepts"""
+
+
+def set_deleted(queryset, deleted: bool = True) -> typing.List[int]:
+    """Soft deletes (or restores) the list entries of queryset
+
+    Args:
+        queryset (QuerySet): the ListEntry objects
+        deleted (bool, optional): delete or restore. Defaults to True.
+
+    Returns:
+        List[int]: pks of the entries changed
+    """
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    table = connection.ops.quote_name(ListEntry._meta.db_table)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET deleted = %s, last_updated = %s WHERE id IN ({sql}) AND deleted <> %s RETURNING id",
+                [deleted, timezone.now(), *params, deleted],
+            )
+            pks = [row[0] for row in cursor.fetchall()]
+        if deleted:
+            ListEntryChange.log(pks, deleted=True)
+        else:
+            # the clients dropped the entries, they get them again in full
+            ListEntryChange.log(pks)
+    return pks
+
+
+def _list_id(value) -> typing.Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, dict) and isinstance(value.get("id"), int) and List.objects.filter(pk=value["id"]).exists():
+        return value["id"]
+    raise ValidationError({"list": 'expected null or {"id": <pk of an existing list>}'})
+
+
+def _gnds(value) -> typing.List[str]:
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(gnd, str) and gnd.strip() for gnd in value):
+        raise ValidationError({"gnd": "expected a list of GND identifiers"})
+    return list(dict.fromkeys(gnd.strip() for gnd in value))
+
+
+def update_entries(queryset, patch: dict) -> typing.Dict[str, typing.List[int]]:
+    """Applies the same patch to all list entries of queryset
+
+    The patch has the keys of ListEntrySerializer and is validated once. selected and list are
+    set, columns_user is merged into the user columns of the entries (keys not in the patch
+    are kept), person fields and gnd are set on the persons of the entries. Entries and persons
+    that already have the values are not written.
+
+    Args:
+        queryset (QuerySet): the ListEntry objects
+        patch (dict): the values as in a PATCH of a single entry
+
+    Raises:
+        ValidationError: the patch is invalid or has keys that can not be bulk updated
+
+    Returns:
+        Dict[str, List[int]]: pks of the "entries" and "persons" changed and of the entries to
+            "rescrape" because their GNDs changed
+    """
+    serializer = ListEntrySerializer(data=patch, partial=True)
+    person_keys = {name for name, field in serializer.fields.items() if field.source.startswith("person.")}
+    unknown = set(patch) - person_keys - set(BULK_ENTRY_FIELDS)
+    if unknown:
+        raise ValidationError({key: "can not be bulk updated" for key in unknown})
+    serializer.is_valid(raise_exception=True)
+    values = serializer.validated_data
+    now = timezone.now()
+    updates = {}
+    differs = Q()
+    if "selected" in patch:
+        updates["selected"] = values["selected"]
+        differs |= ~Q(selected=values["selected"])
+    if "columns_user" in patch:
+        columns = "columns_user"
+        for key, value in (values["columns_user"] or {}).items():
+            columns = JSONBSet(columns, key, value)
+        updates["columns_user"] = columns
+        differs |= ~Q(columns_user__contains=values["columns_user"] or {}) | Q(columns_user__isnull=True)
+    if "list" in patch:
+        updates["list_id"] = _list_id(patch["list"])
+        differs |= ~Q(list_id=updates["list_id"])
+    person_values = values.get("person", {})
+    gnds = _gnds(patch["gnd"]) if "gnd" in patch else None
+    res = {"entries": [], "persons": [], "rescrape": []}
+    with transaction.atomic():
+        rows = list(queryset.order_by().values_list("pk", "list_id", "person_id"))
+        if updates:
+            changed = list(
+                ListEntry.objects.filter(pk__in=[row[0] for row in rows]).filter(differs).values_list("pk", "list_id")
+            )
+            ListEntry.objects.filter(pk__in=[row[0] for row in changed]).update(**updates, last_updated=now)
+            res["entries"] = [row[0] for row in changed]
+            fields = [key for key in ("selected", "columns_user") if key in patch]
+            if "list" in patch:
+                moved = [row for row in changed if row[1] != updates["list_id"]]
+                ListEntryChange.log([row[0] for row in moved])
+                for old_list_id in {row[1] for row in moved if row[1] is not None}:
+                    ListEntryChange.log([row[0] for row in moved if row[1] == old_list_id], deleted=True, list_id=old_list_id)
+                changed = [row for row in changed if row[1] == updates["list_id"]]
+            if fields:
+                ListEntryChange.log([row[0] for row in changed], fields)
+        person_ids = {row[2] for row in rows}
+        persons = set()
+        if person_values:
+            qs = IRSPerson.objects.filter(pk__in=person_ids).exclude(**person_values)
+            persons.update(qs.values_list("pk", flat=True))
+            IRSPerson.objects.filter(pk__in=persons).update(**person_values)
+        if gnds is not None:
+            gnd_changed = []
+            for pk, uris, old in IRSPerson.objects.filter(pk__in=person_ids).values_list("pk", "uris", "gnds"):
+                if set(old) != set(gnds):
+                    uris = [uri for uri in uris or [] if "d-nb.info" not in uri] + [gnd_uri(gnd) for gnd in gnds]
+                    gnd_changed.append(IRSPerson(pk=pk, uris=uris))
+            IRSPerson.objects.bulk_update(gnd_changed, ["uris"])
+            persons.update(p.pk for p in gnd_changed)
+            gnd_persons = {p.pk for p in gnd_changed}
+            res["rescrape"] = sorted(row[0] for row in rows if row[2] in gnd_persons)
+        if persons:
+            # the persons are shared by the entries of all lists they were uploaded to
+            entries = ListEntry.objects.filter(person_id__in=persons)
+            entries.update(last_updated=now)
+            ListEntryChange.log(
+                entries.values_list("pk", flat=True), [key for key in patch if key in person_keys or key == "gnd"]
+            )
+        res["persons"] = sorted(persons)
+    return res
@@ -0,0 +1,251 @@
+"""Derived columns (columns_scrape) of the scrape results of a list entry.
+
+The OBV columns count the works a person authored, their co-authors, the works about the
+person and the authors of those. Creator and contributor strings of the pnx records look
+like "Schubert, Franz, 1797-1828 [KomponistIn]$$QSchubert, Franz"; they are normalized
+once ("schubert, franz") and compared by surname and forename against the name and the
+alternative names of the person, so short surnames do not match longer names containing
+them. Co-authors and topic authors are deduplicated by their normalized form.
+"""
+import functools
+import multiprocessing
+import re
+import typing
+import unicodedata
+
+from django.db import connections
+from django.utils import timezone
+
+from .models import ListEntry, ListEntryChange, ScrapeResult
+
+_ROLE = re.compile(r"\[[^\]]*\]|\([^)]*\)")
+_DATES = re.compile(r",?\s*(ca\.\s*)?\d{3,4}\??\s*-\s*(\d{3,4}\??)?|,?\s*(geb\.|gest\.)\s*\d{3,4}")
+_SPACE = re.compile(r"\s+")
+_NOT_NAME = re.compile(r"[^\w,\s'-]")
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_name(name: str) -> str:
+    """Display part of a creator string without roles, life dates and punctuation, casefolded
+
+    Args:
+        name (str): e.g. "Schubert, Franz, 1797-1828 [KomponistIn]$$QSchubert, Franz"
+
+    Returns:
+        str: e.g. "schubert, franz"
+    """
+    name = name.split("$$")[0]
+    name = _ROLE.sub(" ", name)
+    name = _DATES.sub(" ", name)
+    name = unicodedata.normalize("NFC", name).casefold()
+    name = _NOT_NAME.sub(" ", name)
+    name = ", ".join(p for p in (_SPACE.sub(" ", part).strip() for part in name.split(",")) if p)
+    return name
+
+
+def split_name(normalized: str) -> typing.Tuple[str, str]:
+    """(surname, forenames) of a normalized name, "Franz Schubert" style names are split at the last space"""
+    if "," in normalized:
+        surname, forenames = normalized.split(",", 1)
+        return surname.strip(), forenames.split(",")[0].strip()
+    if " " in normalized:
+        forenames, surname = normalized.rsplit(" ", 1)
+        return surname, forenames
+    return normalized, ""
+
+
+def _forenames_match(forenames: str, first_names: str) -> bool:
+    """True if the forenames of a creator are compatible with the known first names (initials allowed)"""
+    if not forenames or not first_names:
+        return True
+    a, b = forenames.replace(".", " ").split(), first_names.replace(".", " ").split()
+    if not a or not b:
+        return True
+    if len(a[0]) == 1 or len(b[0]) == 1:
+        return a[0][0] == b[0][0]
+    return a[0] == b[0]
+
+
+class NameMatcher:
+    """Matches normalized creator names against the name and the alternative names of a person
+
+    Args:
+        name (str): surname of the person
+        first_name (str, optional): forenames of the person. Defaults to "".
+        alternative_names (list, optional): further names, dicts with firstName/lastName
+            (or first_name/last_name). Defaults to None.
+    """
+
+    def __init__(self, name: str, first_name: str = "", alternative_names: typing.Optional[typing.List[dict]] = None):
+        self.names: typing.Dict[str, typing.List[str]] = {}
+        self._add(name, first_name)
+        for alt in alternative_names or []:
+            self._add(
+                alt.get("lastName", alt.get("last_name")) or "", alt.get("firstName", alt.get("first_name")) or ""
+            )
+        self._cache: typing.Dict[str, bool] = {}
+
+    def _add(self, name: str, first_name: str) -> None:
+        surname = normalize_name(name or "")
+        if surname and surname != "-":
+            first = normalize_name(first_name or "")
+            self.names.setdefault(surname, []).append("" if first == "-" else first)
+
+    def matches(self, normalized: str) -> bool:
+        """True if the normalized creator name is a name of the person"""
+        res = self._cache.get(normalized)
+        if res is None:
+            surname, forenames = split_name(normalized)
+            res = any(_forenames_match(forenames, first) for first in self.names.get(surname, []))
+            self._cache[normalized] = res
+        return res
+
+
+def obv_columns(records: typing.List[dict], matcher: NameMatcher) -> dict:
+    """Counts of authored works, co-authors and works about the person in the OBV records
+
+    A work with a creator matching the person is authored by the person, its other creators
+    are co-authors. Other works with creators or contributors are about the person, their
+    creators and contributors (except the person) are topic authors.
+
+    Args:
+        records (List[dict]): pnx display records of the OBV search
+        matcher (NameMatcher): the names of the person
+
+    Returns:
+        dict: the obv columns
+    """
+    # (normalized name, display name, is the person) per distinct creator string
+    seen: typing.Dict[str, typing.Tuple[str, str, bool]] = {}
+    counts_author = 0
+    counts_topic = 0
+    co_authors: typing.Dict[str, str] = {}
+    topic_authors: typing.Dict[str, str] = {}
+    for ent in records:
+        if "creator" in ent:
+            names, is_creator = ent["creator"], True
+        elif "contributor" in ent:
+            names, is_creator = ent["contributor"], False
+        else:
+            continue
+        own = 0
+        others = []
+        for name in names:
+            info = seen.get(name)
+            if info is None:
+                norm = normalize_name(name)
+                info = seen[name] = (norm, name.split("$$")[0].strip(), matcher.matches(norm))
+            if info[2]:
+                own += 1
+            elif info[0]:
+                others.append(info)
+        if is_creator and own:
+            counts_author += own
+            target = co_authors
+        else:
+            counts_topic += 1
+            target = topic_authors
+        for norm, display, _ in others:
+            if norm not in target:
+                target[norm] = display
+    return {
+        "count_obv": len(records),
+        "count_author": counts_author,
+        "count_coauthor": len(co_authors),
+        "list_coauthors": list(co_authors.values()),
+        "count_topic": counts_topic,
+        "count_topic_authors": len(topic_authors),
+        "list_topic_authors": list(topic_authors.values()),
+    }
+
+
+def scrape_columns(kind: str, scrape: typing.Any, matcher: NameMatcher) -> typing.Any:
+    """columns_scrape value of kind for the scrape result of kind"""
+    if kind == "obv":
+        return obv_columns(scrape or [], matcher)
+    return scrape
+
+
+def _entry_columns(job: tuple) -> typing.Tuple[int, dict]:
+    """(pk, columns_scrape) of one list entry, runs in the worker processes of recompute_columns"""
+    pk, person, columns, results = job
+    matcher = NameMatcher(*person)
+    columns = dict(columns or {})
+    for source, payload in results.items():
+        columns[source] = scrape_columns(source, payload, matcher)
+    return pk, columns
+
+
+def _recompute_chunk(chunk: typing.List[tuple], kinds, map_func, dry_run: bool) -> typing.List[typing.Tuple[int, dict, dict]]:
+    results = {}
+    qs = ScrapeResult.objects.filter(list_entry_id__in=[row[0] for row in chunk])
+    if kinds:
+        qs = qs.filter(source__in=kinds)
+    for pk, source, payload in qs.values_list("list_entry_id", "source", "payload"):
+        results.setdefault(pk, {})[source] = payload
+    old = {pk: columns or {} for pk, *_, columns in chunk}
+    jobs = [(pk, person, columns, results.get(pk, {})) for pk, *person, columns in chunk]
+    changed = [(pk, old[pk], new) for pk, new in map_func(_entry_columns, jobs) if new != old[pk]]
+    if changed and not dry_run:
+        now = timezone.now()
+        # last_updated too, so clients following modified_after or the cursor see the new columns
+        ListEntry.objects.bulk_update(
+            [ListEntry(pk=pk, columns_scrape=new, last_updated=now) for pk, _, new in changed],
+            ["columns_scrape", "last_updated"],
+        )
+        ListEntryChange.log([pk for pk, _, _ in changed], ["columns_scrape"])
+    return changed
+
+
+def recompute_columns(
+    entries,
+    kinds: typing.Optional[typing.List[str]] = None,
+    chunk_size: int = 500,
+    workers: int = 0,
+    dry_run: bool = False,
+) -> typing.Iterator[typing.Tuple[int, dict, dict]]:
+    """Recomputes columns_scrape of list entries from their ScrapeResult rows
+
+    The entries are streamed in chunks of chunk_size. Per chunk the results are loaded with
+    one query, the columns are computed (in a pool of worker processes if workers > 1) and
+    the changed entries are written back with one bulk_update.
+
+    Args:
+        entries (QuerySet): the ListEntry objects to recompute
+        kinds (List[str], optional): only recompute these sources. Defaults to all.
+        chunk_size (int, optional): entries per chunk. Defaults to 500.
+        workers (int, optional): number of worker processes, 0 or 1 computes in process. Defaults to 0.
+        dry_run (bool, optional): do not write anything. Defaults to False.
+
+    Yields:
+        Tuple[int, dict, dict]: pk, old and new columns_scrape of every entry that changed
+    """
+    rows = entries.order_by("pk").values_list(
+        "pk", "person__name", "person__first_name", "person__alternative_names", "columns_scrape"
+    )
+    pool = None
+    map_func = map
+    if workers > 1:
+        # the workers must not share the connections of this process: they are closed and
+        # multiprocessing.Pool forks all workers right away, before the first query reopens one
+        connections.close_all()
+        pool = multiprocessing.get_context("fork").Pool(processes=workers)
+        map_func = functools.partial(pool.map, chunksize=max(chunk_size // (workers * 4), 1))
+    try:
+        chunk = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield from _recompute_chunk(chunk, kinds, map_func, dry_run)
+                chunk = []
+        if chunk:
+            yield from _recompute_chunk(chunk, kinds, map_func, dry_run)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def recompute_list_columns(list_id: int, chunk_size: int = 500, workers: int = 0) -> int:
+    """Recomputes columns_scrape of all list entries of a list, returns the number of entries changed"""
+    return sum(1 for _ in recompute_columns(ListEntry.objects.filter(list_id=list_id), chunk_size=chunk_size, workers=workers))
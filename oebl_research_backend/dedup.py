@@ -0,0 +1,151 @@
+"""Coalescing of scrapes by GND, within one upload and across in-flight jobs.
+
+Every GND is claimed with a ScrapeClaim row by the dispatch that scrapes it. List entries
+of the same upload sharing the GND are added to the claim right away, entries of other
+uploads dispatched while the claim is held join it instead of scraping again. Scraper
+results are written to all list entries of the claim (see fan_out_targets), when the
+claim is released entries that joined late get the results they missed copied over.
+
+Claims older than RESEARCH_SCRAPE_CLAIM_TIMEOUT seconds are considered abandoned (e.g.
+the worker died) and are taken over by the next dispatch of the GND, together with the
+entries waiting on them. The periodic
+sweep_scrape_claims task expires them (see expire_claims) and dispatches their list entries
+again, so entries waiting on an abandoned claim do not depend on another upload of the GND.
+"""
+import datetime
+import typing
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .columns import NameMatcher, scrape_columns
+from .expressions import JSONBSet
+from .models import ListEntry, ListEntryChange, ScrapeClaim, ScrapeCounter, ScrapeResult
+
+CLAIM_TIMEOUT = 3600
+
+
+def _expired() -> datetime.datetime:
+    timeout = getattr(settings, "RESEARCH_SCRAPE_CLAIM_TIMEOUT", CLAIM_TIMEOUT)
+    return timezone.now() - datetime.timedelta(seconds=timeout)
+
+
+def claim_gnds(
+    gnds: typing.Dict[str, typing.List[int]], claim_id: str
+) -> typing.Tuple[typing.List[str], typing.Dict[str, typing.List[int]]]:
+    """Claims gnds for the dispatch claim_id, joins the claims other dispatches hold
+
+    Args:
+        gnds (Dict[str, List[int]]): list entry ids keyed by the GND they need
+        claim_id (str): id of the dispatch
+
+    Returns:
+        Tuple[List[str], Dict[str, List[int]]]: GNDs to scrape and the list entries that joined claims of other dispatches
+    """
+    with transaction.atomic():
+        # the entries waiting on abandoned claims wait on the new claim of their GND
+        expired = list(
+            ScrapeClaim.objects.select_for_update()
+            .filter(gnd__in=gnds.keys(), created__lt=_expired())
+            .values_list("pk", "gnd", "listentry_ids")
+        )
+        ScrapeClaim.objects.filter(pk__in=[pk for pk, _, _ in expired]).delete()
+        gnds = {gnd: list(ids) for gnd, ids in gnds.items()}
+        for _, gnd, ids in expired:
+            gnds[gnd].extend(pk for pk in ids if pk not in gnds[gnd])
+        ScrapeClaim.objects.bulk_create(
+            [ScrapeClaim(gnd=gnd, claim_id=claim_id, listentry_ids=ids) for gnd, ids in gnds.items()],
+            ignore_conflicts=True,
+        )
+        claimed = []
+        joined = {}
+        for claim in ScrapeClaim.objects.select_for_update().filter(gnd__in=gnds.keys()):
+            if claim.claim_id == claim_id:
+                claimed.append(claim.gnd)
+            else:
+                joined[claim.gnd] = gnds[claim.gnd]
+                claim.listentry_ids += [pk for pk in gnds[claim.gnd] if pk not in claim.listentry_ids]
+                claim.save(update_fields=["listentry_ids"])
+    return claimed, joined
+
+
+def expire_claims() -> typing.List[int]:
+    """Deletes the abandoned claims
+
+    Returns:
+        List[int]: the list entries of the claims, they have to be dispatched again
+    """
+    with transaction.atomic():
+        claims = list(
+            ScrapeClaim.objects.select_for_update(skip_locked=True)
+            .filter(created__lt=_expired())
+            .values_list("pk", "listentry_ids")
+        )
+        ScrapeClaim.objects.filter(pk__in=[pk for pk, _ in claims]).delete()
+    return sorted({pk for _, ids in claims for pk in ids})
+
+
+def fan_out_targets(listentry_ids: typing.List[int]) -> typing.List[int]:
+    """listentry_ids and the list entries waiting on the claims they belong to"""
+    targets = list(listentry_ids)
+    for ids in ScrapeClaim.objects.filter(listentry_ids__overlap=listentry_ids).values_list("listentry_ids", flat=True):
+        targets.extend(x for x in ids if x not in targets)
+    return targets
+
+
+def release_claims(
+    claim_id: str, gnds: typing.List[str]
+) -> typing.Tuple[typing.List[int], typing.Dict[int, typing.List[str]]]:
+    """Releases the claims of claim_id on gnds and copies the results to the entries that joined late
+
+    Returns:
+        Tuple[List[int], Dict[int, List[str]]]: all list entries that waited on the claims and the
+            scrape kinds copied, keyed by the id of the list entry they were copied to
+    """
+    with transaction.atomic():
+        claims = list(ScrapeClaim.objects.select_for_update().filter(claim_id=claim_id, gnd__in=gnds))
+        ScrapeClaim.objects.filter(pk__in=[c.pk for c in claims]).delete()
+    waiting = []
+    copied = {}
+    for claim in claims:
+        waiting.extend(pk for pk in claim.listentry_ids[1:] if pk not in waiting)
+        results = {}
+        for pk, source, payload in ScrapeResult.objects.filter(list_entry_id__in=claim.listentry_ids).values_list(
+            "list_entry_id", "source", "payload"
+        ):
+            results.setdefault(pk, {})[source] = payload
+        leader = results.get(claim.listentry_ids[0], {})
+        persons = {
+            pk: person
+            for pk, *person in ListEntry.objects.filter(pk__in=claim.listentry_ids[1:]).values_list(
+                "pk", "person__name", "person__first_name", "person__alternative_names"
+            )
+        }
+        for pk in claim.listentry_ids[1:]:
+            if pk not in persons:
+                continue
+            kinds = [kind for kind, res in leader.items() if res and not results.get(pk, {}).get(kind)]
+            if not kinds:
+                continue
+            columns = "columns_scrape"
+            for kind in kinds:
+                ScrapeResult.upsert([pk], kind, leader[kind])
+                columns = JSONBSet(columns, kind, scrape_columns(kind, leader[kind], NameMatcher(*persons[pk])))
+            ListEntry.objects.filter(pk=pk).update(columns_scrape=columns, last_updated=timezone.now())
+            copied[pk] = kinds
+    ListEntryChange.log(copied.keys(), ["columns_scrape"])
+    return waiting, copied
+
+
+def record_saved(saved: typing.Dict[str, int]) -> None:
+    """Adds the number of requests saved per source to the ScrapeCounter rows"""
+    saved = {source: n for source, n in saved.items() if n}
+    ScrapeCounter.objects.bulk_create([ScrapeCounter(source=source) for source in saved], ignore_conflicts=True)
+    for source, n in saved.items():
+        ScrapeCounter.objects.filter(source=source).update(requests_saved=F("requests_saved") + n)
+
+
+def requests_saved() -> typing.Dict[str, int]:
+    return dict(ScrapeCounter.objects.values_list("source", "requests_saved"))
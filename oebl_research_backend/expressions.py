@@ -0,0 +1,28 @@
+"""Postgres jsonb expressions for partial updates of JSONFields.
+
+They let a single key of a JSON document be replaced inside the UPDATE statement, without
+loading the row and without touching the other keys:
+
+    ListEntry.objects.filter(pk=pk).update(columns_scrape=JSONBSet("columns_scrape", "obv", cols))
+"""
+import json
+import typing
+
+from django.db.models import Func, JSONField, Value
+from django.db.models.functions import Cast, Coalesce
+
+
+def jsonb_value(value: typing.Any) -> Cast:
+    return Cast(Value(json.dumps(value)), JSONField())
+
+
+class JSONBSet(Func):
+    """jsonb_set(field, '{key}', value): sets key of the document in field, a NULL document counts as {}"""
+    function = "jsonb_set"
+    template = "%(function)s(%(expressions)s, true)"
+    output_field = JSONField()
+
+    def __init__(self, field: str, key: str, value: typing.Any, **extra):
+        if not hasattr(value, "resolve_expression"):
+            value = jsonb_value(value)
+        super().__init__(Coalesce(field, jsonb_value({})), Value([key]), value, **extra)
@@ -0,0 +1,50 @@
+"""Lookup of research persons and their list entries by GND for the gnd-lookup endpoint.
+
+IRSPerson.gnds holds the bare GND identifiers of the d-nb.info uris of a person, set by a
+database trigger (see migration 0029) and served by a GIN index, so any number of GNDs is
+resolved with one && (overlap) query for the persons and one for their list entries.
+"""
+import typing
+
+from django.conf import settings
+
+from .models import IRSPerson, ListEntry
+
+LIMIT = 10000
+"""default maximum number of GNDs per lookup, see RESEARCH_GND_LOOKUP_LIMIT"""
+
+
+def get_limit() -> int:
+    return getattr(settings, "RESEARCH_GND_LOOKUP_LIMIT", LIMIT)
+
+
+def lookup_gnds(gnds: typing.List[str]) -> typing.Tuple[typing.Dict[str, typing.List[dict]], typing.List[str]]:
+    """Persons with any of the GNDs and their list entries that are not deleted
+
+    Args:
+        gnds (List[str]): bare GND identifiers, e.g. "118610031"
+
+    Returns:
+        Tuple[Dict[str, List[dict]], List[str]]: the persons of every GND found and the GNDs not found
+    """
+    gnds = list(dict.fromkeys(gnds))
+    persons = {
+        pk: {"id": pk, "firstName": first_name, "lastName": name, "gnd": person_gnds, "listEntries": []}
+        for pk, first_name, name, person_gnds in IRSPerson.objects.filter(gnds__overlap=gnds)
+        .order_by("pk")
+        .values_list("pk", "first_name", "name", "gnds")
+    }
+    entries = (
+        ListEntry.objects.filter(person__gnds__overlap=gnds, deleted=False)
+        .order_by("pk")
+        .values_list("pk", "list_id", "person_id")
+    )
+    for pk, list_id, person_id in entries:
+        persons[person_id]["listEntries"].append({"id": pk, "listId": list_id})
+    wanted = set(gnds)
+    results = {}
+    for person in persons.values():
+        for gnd in person["gnd"]:
+            if gnd in wanted:
+                results.setdefault(gnd, []).append(person)
+    return results, [gnd for gnd in gnds if gnd not in results]
@@ -0,0 +1,146 @@
+"""Pooled HTTP session shared by all scrapers of a worker process.
+
+Every worker process keeps one ScrapeSession with keep-alive connection pools, default
+timeouts, exponential backoff on 429/5xx and the per source rate limits of rate_limit. Tests (or benchmarks) can swap the session
+with use_session() to talk to a local fake server. Only idempotent requests are retried on a
+status, POSTs (the frontend webhooks) are sent once and retried by the notification outbox.
+"""
+import contextlib
+import os
+import threading
+import time
+import typing
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (5, 60)
+"""(connect, read) timeout in seconds used when a request does not set one"""
+RETRY_STATUS = (429, 500, 502, 503, 504)
+RETRY_METHODS = frozenset(["HEAD", "GET", "OPTIONS"])
+"""methods retried on RETRY_STATUS or read errors, POSTs are not idempotent"""
+
+
+class HostStats:
+    """Thread safe per host counters of requests, retries, errors and latency"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: typing.Dict[str, typing.Dict[str, float]] = {}
+
+    def record(self, host: str, latency: float, retries: int = 0, error: bool = False) -> None:
+        with self._lock:
+            stats = self._hosts.setdefault(
+                host, {"requests": 0, "retries": 0, "errors": 0, "latency_total": 0.0, "latency_max": 0.0}
+            )
+            stats["requests"] += 1
+            stats["retries"] += retries
+            stats["errors"] += int(error)
+            stats["latency_total"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+
+    def snapshot(self) -> typing.Dict[str, typing.Dict[str, float]]:
+        """Returns a copy of the counters including the mean latency per host"""
+        with self._lock:
+            res = {}
+            for host, stats in self._hosts.items():
+                res[host] = dict(stats, latency_mean=stats["latency_total"] / stats["requests"])
+            return res
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hosts = {}
+
+
+class ScrapeSession(requests.Session):
+    """requests.Session with pooled keep-alive connections, default timeouts, retries and statistics
+
+    Args:
+        timeout (tuple, optional): default (connect, read) timeout. Defaults to DEFAULT_TIMEOUT.
+        retries (int, optional): maximum number of retries per request. Defaults to 3.
+        backoff_factor (float, optional): exponential backoff factor between retries. Defaults to 0.5.
+        pool_maxsize (int, optional): number of kept-alive connections per host. Defaults to 10.
+        throttle (callable, optional): called with the host before every request, used for rate limiting.
+            Defaults to None.
+    """
+
+    def __init__(
+        self,
+        timeout=DEFAULT_TIMEOUT,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_maxsize: int = 10,
+        throttle: typing.Optional[typing.Callable[[str], float]] = None,
+    ):
+        super().__init__()
+        self.timeout = timeout
+        self.throttle = throttle
+        self.stats = HostStats()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=RETRY_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        if self.throttle is not None:
+            self.throttle(host)
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException:
+            self.stats.record(host, time.perf_counter() - start, error=True)
+            raise
+        retries = getattr(response.raw, "retries", None)
+        self.stats.record(
+            host,
+            time.perf_counter() - start,
+            retries=len(retries.history) if retries is not None else 0,
+            error=response.status_code >= 400,
+        )
+        return response
+
+
+_override: typing.Optional[requests.Session] = None
+_session: typing.Optional[ScrapeSession] = None
+_session_pid: typing.Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns the session of the current worker process (or the one injected with use_session)
+
+    The session is created lazily and re-created after a fork, so celery prefork workers never
+    share pooled sockets with their parent.
+    """
+    global _session, _session_pid
+    if _override is not None:
+        return _override
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            from .rate_limit import throttle_host
+            _session = ScrapeSession(throttle=throttle_host)
+            _session_pid = os.getpid()
+        return _session
+
+
+@contextlib.contextmanager
+def use_session(session: requests.Session):
+    """Makes get_session return session inside the with block"""
+    global _override
+    previous = _override
+    _override = session
+    try:
+        yield session
+    finally:
+        _override = previous
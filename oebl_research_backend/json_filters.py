@@ -0,0 +1,140 @@
+"""Filters on the JSONB columns columns_user and columns_scrape of ListEntry.
+
+The columns_user and columns_scrape filters of the lemmaresearch endpoint take a JSON object
+of conditions. Keys are paths into the column separated by "__", optionally followed by an
+operator of OPERATORS:
+
+    {"obv__count_author__gte": 3, "wikidata__pLabel": "Franz Schubert", "notiz__exists": true}
+
+- no operator / contains: the value at the path equals (contains) the given JSON value,
+  filtered with @> and served by the GIN jsonb_path_ops index of the column
+- gt, gte, lt, lte: numeric comparison of the value at the path, values that are not
+  numbers never match. NUMERIC_INDEXES have expression indexes (see migration 0028).
+- exists: the path exists (true) or not (false), filtered with the jsonpath @? operator,
+  which is also served by the GIN index
+
+Everything else is rejected with a 400, so no arbitrary lookups reach the ORM. A last
+segment naming another lookup of JSONField (e.g. icontains, in, isnull) is rejected as well
+instead of being taken as a key, which would silently match nothing.
+"""
+import json
+import re
+import typing
+
+from django.db.models import BooleanField, F, FloatField, Func, JSONField, Q
+from django.db.models.fields.json import KeyTransform
+from rest_framework.exceptions import ValidationError
+
+OPERATORS = ("contains", "gt", "gte", "lt", "lte", "exists")
+UNSUPPORTED_LOOKUPS = frozenset(JSONField.get_lookups()) | frozenset(KeyTransform.get_lookups())
+"""lookups of JSONField and its keys, a last segment naming one that is not in OPERATORS is rejected"""
+MAX_CONDITIONS = 20
+MAX_KEY_LENGTH = 100
+NUMERIC_INDEXES = {
+    "columns_scrape": [
+        ("obv", "count_obv"),
+        ("obv", "count_author"),
+        ("obv", "count_topic"),
+        ("wikipedia", "edits_count"),
+    ],
+}
+"""paths of the numeric values with an expression index, keep in sync with the migrations"""
+
+_CONTROL = re.compile(r"[\x00-\x1f]")
+
+
+class JSONNumber(Func):
+    """Value at path of a JSONB column as double precision, NULL if it is not a number"""
+    output_field = FloatField()
+
+    def __init__(self, field: str, path: typing.Sequence[str]):
+        self.path = list(path)
+        super().__init__(F(field))
+
+    def as_sql(self, compiler, connection):
+        column, params = compiler.compile(self.source_expressions[0])
+        sql = f"CASE WHEN jsonb_typeof({column} #> %s) = 'number' THEN ({column} #>> %s)::double precision END"
+        return sql, params + [self.path] + params + [self.path]
+
+
+class JSONPathExists(Func):
+    """True if path exists in a JSONB column (jsonpath @?)"""
+    output_field = BooleanField()
+
+    def __init__(self, field: str, path: typing.Sequence[str]):
+        self.path = list(path)
+        super().__init__(F(field))
+
+    def as_sql(self, compiler, connection):
+        column, params = compiler.compile(self.source_expressions[0])
+        # keys are quoted, so they may contain any character
+        jsonpath = "$" + "".join('."' + key.replace("\\", "\\\\").replace('"', '\\"') + '"' for key in self.path)
+        return f"{column} @? %s::jsonpath", params + [jsonpath]
+
+
+def _nest(path: typing.Sequence[str], value) -> dict:
+    for key in reversed(path):
+        value = {key: value}
+    return value
+
+
+def _number(key: str, value) -> float:
+    if isinstance(value, bool):
+        raise ValidationError({key: "expected a number"})
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValidationError({key: "expected a number"})
+
+
+def _boolean(key: str, value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ValidationError({key: "expected true or false"})
+
+
+def parse_condition(field: str, key: str, value, name: str) -> typing.Tuple[Q, typing.Dict[str, Func]]:
+    """Q object of one condition and the annotations (named name) it filters on, see the module docstring
+
+    Raises:
+        ValidationError: the key or the value are not allowed
+    """
+    parts = key.split("__")
+    operator = parts.pop() if len(parts) > 1 and parts[-1] in OPERATORS else None
+    if operator is None and len(parts) > 1 and parts[-1] in UNSUPPORTED_LOOKUPS:
+        raise ValidationError({key: f"unsupported operator, use one of {', '.join(OPERATORS)}"})
+    if not parts or any(not part or len(part) > MAX_KEY_LENGTH or _CONTROL.search(part) for part in parts):
+        raise ValidationError({key: "invalid key"})
+    if operator in (None, "contains"):
+        return Q(**{f"{field}__contains": _nest(parts, value)}), {}
+    if operator == "exists":
+        exists = JSONPathExists(field, parts)
+        if _boolean(key, value):
+            return Q(exists), {}
+        return ~Q(exists) | Q(**{f"{field}__isnull": True}), {}
+    return Q(**{f"{name}__{operator}": _number(key, value)}), {name: JSONNumber(field, parts)}
+
+
+def filter_json_field(queryset, field: str, value: str):
+    """Applies the JSON object of conditions in value to the JSONB column field
+
+    Raises:
+        ValidationError: value is not a JSON object of allowed conditions
+    """
+    try:
+        conditions = json.loads(value)
+    except ValueError:
+        raise ValidationError({field: "expected a JSON object"})
+    if not isinstance(conditions, dict):
+        raise ValidationError({field: "expected a JSON object"})
+    if len(conditions) > MAX_CONDITIONS:
+        raise ValidationError({field: f"at most {MAX_CONDITIONS} conditions are allowed"})
+    q = Q()
+    annotations = {}
+    for idx, (key, val) in enumerate(conditions.items()):
+        condition, annotation = parse_condition(field, key, val, f"{field}_condition_{idx}")
+        q &= condition
+        annotations.update(annotation)
+    return queryset.annotate(**annotations).filter(q)
@@ -0,0 +1,84 @@
+import datetime
+import os
+
+from django.core.management.base import BaseCommand
+
+from oebl_research_backend.columns import recompute_columns
+from oebl_research_backend.models import ListEntry
+
+
+def describe_diff(old: dict, new: dict) -> list:
+    """Human readable changes between two columns_scrape values"""
+    changes = []
+    for kind in sorted(set(old) | set(new)):
+        before, after = old.get(kind), new.get(kind)
+        if before == after:
+            continue
+        if isinstance(before, dict) and isinstance(after, dict):
+            for key in sorted(set(before) | set(after)):
+                if before.get(key) != after.get(key):
+                    b, a = before.get(key), after.get(key)
+                    if isinstance(b, list) or isinstance(a, list):
+                        changes.append(f"{kind}.{key}: {len(b or [])} -> {len(a or [])} entries")
+                    else:
+                        changes.append(f"{kind}.{key}: {b} -> {a}")
+        else:
+            changes.append(f"{kind}: changed")
+    return changes
+
+
+class Command(BaseCommand):
+
+    help = "Recompute columns_scrape of list entries from their stored scrape results"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--list', type=int, nargs='+', dest='lists',
+            help="Only entries of these lists (pks)."
+        )
+        parser.add_argument(
+            '--since', type=datetime.date.fromisoformat,
+            help="Only entries last updated on or after this date (YYYY-MM-DD)."
+        )
+        parser.add_argument(
+            '--until', type=datetime.date.fromisoformat,
+            help="Only entries last updated before this date (YYYY-MM-DD)."
+        )
+        parser.add_argument(
+            '--kind', nargs='+', choices=["obv", "wikipedia", "wikidata"], dest='kinds',
+            help="Only recompute the columns of these sources."
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Number of worker processes, defaults to the number of CPUs."
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help="Entries loaded and written per chunk."
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Report the changes without writing them."
+        )
+
+    def handle(self, *args, **kwargs):
+        entries = ListEntry.objects.all()
+        if kwargs['lists']:
+            entries = entries.filter(list_id__in=kwargs['lists'])
+        if kwargs['since']:
+            entries = entries.filter(last_updated__date__gte=kwargs['since'])
+        if kwargs['until']:
+            entries = entries.filter(last_updated__date__lt=kwargs['until'])
+        changed = 0
+        for pk, old, new in recompute_columns(
+            entries,
+            kinds=kwargs['kinds'],
+            chunk_size=kwargs['chunk_size'],
+            workers=kwargs['workers'],
+            dry_run=kwargs['dry_run'],
+        ):
+            changed += 1
+            if kwargs['dry_run']:
+                self.stdout.write(f"ListEntry {pk}: {'; '.join(describe_diff(old, new))}")
+        action = "would change" if kwargs['dry_run'] else "changed"
+        self.stdout.write(self.style.SUCCESS(f"{action} columns_scrape of {changed} list entries"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from oebl_research_backend.benchmarks import BENCHMARKS, run_benchmark
+
+
+class Command(BaseCommand):
+
+    help = "Run a benchmark of the research pipeline on synthetic data (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'case', type=str,
+            help=f"Benchmark to run, one of {', '.join(sorted(BENCHMARKS))}"
+        )
+        parser.add_argument(
+            '--sizes', type=int, nargs='+',
+            help="Number of synthetic rows, defaults depend on the benchmark."
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['case'] not in BENCHMARKS:
+            raise CommandError(f"Unknown benchmark {kwargs['case']}, use one of {', '.join(sorted(BENCHMARKS))}")
+        run_benchmark(kwargs['case'], kwargs['sizes'], self.stdout.write)
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.14 on 2026-10-17 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0017_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeCacheEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('source', models.CharField(db_index=True, max_length=50)),
+                ('query', models.JSONField()),
+                ('response', models.JSONField(null=True)),
+                ('size', models.PositiveIntegerField()),
+                ('fetched', models.DateTimeField()),
+                ('last_accessed', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.14 on 2026-10-17 11:47
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0018_scrapecacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeClaim',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gnd', models.CharField(max_length=255, unique=True)),
+                ('claim_id', models.CharField(db_index=True, max_length=36)),
+                ('listentry_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScrapeCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50, unique=True)),
+                ('requests_saved', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.14 on 2026-10-17 12:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0019_scrapeclaim_scrapecounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50)),
+                ('payload', models.JSONField(null=True)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('list_entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scrape_results', to='oebl_research_backend.listentry')),
+            ],
+            options={
+                'unique_together': {('list_entry', 'source')},
+            },
+        ),
+    ]
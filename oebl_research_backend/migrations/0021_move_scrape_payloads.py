@@ -0,0 +1,44 @@
+# Generated by Django 3.1.14 on 2026-10-17 12:33
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def move_scrape_payloads(apps, schema_editor):
+    """Creates a ScrapeResult row for every non empty source in ListEntry.scrape"""
+    ListEntry = apps.get_model('oebl_research_backend', 'ListEntry')
+    ScrapeResult = apps.get_model('oebl_research_backend', 'ScrapeResult')
+    batch = []
+    entries = ListEntry.objects.filter(scrape__isnull=False).values_list('pk', 'scrape')
+    for pk, scrape in entries.iterator(chunk_size=BATCH_SIZE):
+        for source, payload in scrape.items():
+            if payload:
+                batch.append(ScrapeResult(list_entry_id=pk, source=source, payload=payload))
+        if len(batch) >= BATCH_SIZE:
+            ScrapeResult.objects.bulk_create(batch)
+            batch = []
+    ScrapeResult.objects.bulk_create(batch)
+
+
+def restore_scrape_payloads(apps, schema_editor):
+    ListEntry = apps.get_model('oebl_research_backend', 'ListEntry')
+    ScrapeResult = apps.get_model('oebl_research_backend', 'ScrapeResult')
+    scrapes = {}
+    for pk, source, payload in ScrapeResult.objects.values_list('list_entry_id', 'source', 'payload').iterator(chunk_size=BATCH_SIZE):
+        scrapes.setdefault(pk, {'obv': [], 'wikipedia': [], 'wikidata': []})[source] = payload
+    entries = ListEntry.objects.in_bulk(list(scrapes))
+    for pk, entry in entries.items():
+        entry.scrape = scrapes[pk]
+    ListEntry.objects.bulk_update(entries.values(), ['scrape'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0020_scraperesult'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_scrape_payloads, restore_scrape_payloads),
+    ]
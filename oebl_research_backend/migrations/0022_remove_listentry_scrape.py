@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-17 12:34
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0021_move_scrape_payloads'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='listentry',
+            name='scrape',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.14 on 2026-10-17 13:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0022_remove_listentry_scrape'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('list_entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='oebl_research_backend.listentry')),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.14 on 2026-10-17 14:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0023_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listentry',
+            name='research_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entries', to='oebl_research_backend.researchjob'),
+        ),
+        migrations.CreateModel(
+            name='ResearchJobEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='oebl_research_backend.researchjob')),
+                ('list_entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='oebl_research_backend.listentry')),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='researchjobevent',
+            index=models.Index(fields=['job', 'id'], name='oebl_resear_job_id_597b34_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-17 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0024_researchjobevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listentry',
+            index=models.Index(fields=['last_updated', 'id'], name='oebl_resear_last_up_96e5c5_idx'),
+        ),
+    ]
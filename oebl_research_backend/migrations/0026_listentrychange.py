@@ -0,0 +1,40 @@
+# Generated by Django 3.1.14 on 2026-10-17 15:40
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0025_listentry_last_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListEntryChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fields', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), blank=True, null=True, size=None)),
+                ('deleted', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('list', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='oebl_research_backend.list')),
+                ('list_entry', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='oebl_research_backend.listentry')),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='listentrychange',
+            index=models.Index(fields=['list', 'id'], name='oebl_resear_list_id_adda2d_idx'),
+        ),
+        # the log starts with every existing entry, so a sync without token returns whole lists
+        migrations.RunSQL(
+            "INSERT INTO oebl_research_backend_listentrychange (list_entry_id, list_id, fields, deleted, created) "
+            "SELECT id, list_id, NULL, false, now() FROM oebl_research_backend_listentry "
+            "WHERE list_id IS NOT NULL AND NOT deleted ORDER BY id",
+            migrations.RunSQL.noop,
+        ),
+    ]
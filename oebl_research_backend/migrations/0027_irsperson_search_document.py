@@ -0,0 +1,51 @@
+# Generated by Django 3.1.14 on 2026-10-17 16:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_DOCUMENT_TRIGGER = """
+CREATE FUNCTION oebl_research_backend_irsperson_search_document() RETURNS trigger AS $$
+BEGIN
+    NEW.search_document :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.first_name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(jsonb_path_query_array(NEW.alternative_names, '$[*].*')::text, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.profession_detail, '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(NEW.bio_note, '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER oebl_research_backend_irsperson_search_document
+BEFORE INSERT OR UPDATE OF name, first_name, alternative_names, profession_detail, bio_note
+ON oebl_research_backend_irsperson
+FOR EACH ROW EXECUTE FUNCTION oebl_research_backend_irsperson_search_document();
+"""
+
+DROP_SEARCH_DOCUMENT_TRIGGER = """
+DROP TRIGGER oebl_research_backend_irsperson_search_document ON oebl_research_backend_irsperson;
+DROP FUNCTION oebl_research_backend_irsperson_search_document();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0026_listentrychange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='irsperson',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='irsperson',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='oebl_resear_search__482521_gin'),
+        ),
+        migrations.RunSQL(SEARCH_DOCUMENT_TRIGGER, DROP_SEARCH_DOCUMENT_TRIGGER),
+        # fires the trigger for the existing persons
+        migrations.RunSQL("UPDATE oebl_research_backend_irsperson SET name = name", migrations.RunSQL.noop),
+    ]
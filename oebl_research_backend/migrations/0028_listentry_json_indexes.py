@@ -0,0 +1,40 @@
+# Generated by Django 3.1.14 on 2026-10-17 17:05
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+# expression indexes of the numeric filters, see json_filters.JSONNumber and NUMERIC_INDEXES
+NUMERIC_INDEXES = [
+    ('columns_scrape', 'obv', 'count_obv'),
+    ('columns_scrape', 'obv', 'count_author'),
+    ('columns_scrape', 'obv', 'count_topic'),
+    ('columns_scrape', 'wikipedia', 'edits_count'),
+]
+
+
+def create_numeric_index(field, *path):
+    name = f"listentry_{'_'.join(path)}_idx"
+    path = "ARRAY[" + ", ".join(f"'{key}'" for key in path) + "]"
+    return migrations.RunSQL(
+        f"CREATE INDEX {name} ON oebl_research_backend_listentry "
+        f"((CASE WHEN jsonb_typeof({field} #> {path}) = 'number' THEN ({field} #>> {path})::double precision END))",
+        f"DROP INDEX {name}",
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0027_irsperson_search_document'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listentry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['columns_scrape'], name='listentry_columns_scrape_gin', opclasses=['jsonb_path_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='listentry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['columns_user'], name='listentry_columns_user_gin', opclasses=['jsonb_path_ops']),
+        ),
+    ] + [create_numeric_index(*index) for index in NUMERIC_INDEXES]
@@ -0,0 +1,50 @@
+# Generated by Django 3.1.14 on 2026-10-17 17:35
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+GNDS_TRIGGER = """
+CREATE FUNCTION oebl_research_backend_irsperson_gnds() RETURNS trigger AS $$
+BEGIN
+    NEW.gnds := ARRAY(
+        SELECT m[1]
+        FROM unnest(NEW.uris) WITH ORDINALITY AS u(uri, n), regexp_matches(u.uri, '(?:^|/)gnd/([^/]+)', 'g') AS m
+        WHERE strpos(u.uri, 'd-nb.info') > 0
+        ORDER BY u.n
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER oebl_research_backend_irsperson_gnds
+BEFORE INSERT OR UPDATE OF uris
+ON oebl_research_backend_irsperson
+FOR EACH ROW EXECUTE FUNCTION oebl_research_backend_irsperson_gnds();
+"""
+
+DROP_GNDS_TRIGGER = """
+DROP TRIGGER oebl_research_backend_irsperson_gnds ON oebl_research_backend_irsperson;
+DROP FUNCTION oebl_research_backend_irsperson_gnds();
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0028_listentry_json_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='irsperson',
+            name='gnds',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='irsperson',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['gnds'], name='oebl_resear_gnds_e302f9_gin'),
+        ),
+        migrations.RunSQL(GNDS_TRIGGER, DROP_GNDS_TRIGGER),
+        # fires the trigger for the existing persons
+        migrations.RunSQL("UPDATE oebl_research_backend_irsperson SET uris = uris", migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.1.14 on 2026-10-17 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0029_irsperson_gnds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='researchjob',
+            name='finished',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # jobs whose chunks are all ingested
+        migrations.RunSQL(
+            """
+            UPDATE oebl_research_backend_researchjob j
+            SET finished = (SELECT max(c.finished) FROM oebl_research_backend_researchjobchunk c WHERE c.job_id = j.id)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM oebl_research_backend_researchjobchunk c WHERE c.job_id = j.id AND c.finished IS NULL
+            )
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='researchjob',
+            name='fingerprint',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='researchjob',
+            constraint=models.UniqueConstraint(condition=models.Q(finished__isnull=True), fields=('fingerprint',), name='researchjob_unfinished_fingerprint'),
+        ),
+    ]
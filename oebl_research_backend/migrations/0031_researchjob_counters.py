@@ -0,0 +1,54 @@
+# Generated by Django 3.1.14 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0030_researchjob_finished'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='researchjob',
+            name='chunks_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='researchjob',
+            name='entries_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='researchjob',
+            name='total_entries',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # keep the first done event per entry and count what is there
+        migrations.RunSQL(
+            """
+            DELETE FROM oebl_research_backend_researchjobevent a
+            USING oebl_research_backend_researchjobevent b
+            WHERE a.source = 'done' AND b.source = 'done' AND a.job_id = b.job_id
+                AND a.list_entry_id = b.list_entry_id AND a.id > b.id;
+            UPDATE oebl_research_backend_researchjob j SET
+                chunks_done = (
+                    SELECT count(*) FROM oebl_research_backend_researchjobchunk c
+                    WHERE c.job_id = j.id AND c.finished IS NOT NULL
+                ),
+                total_entries = (
+                    SELECT count(*) FROM oebl_research_backend_listentry l WHERE l.research_job_id = j.id
+                ),
+                entries_done = (
+                    SELECT count(*) FROM oebl_research_backend_researchjobevent e
+                    WHERE e.job_id = j.id AND e.source = 'done'
+                );
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='researchjobevent',
+            constraint=models.UniqueConstraint(condition=models.Q(source='done'), fields=('job', 'list_entry'), name='researchjobevent_done_once'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-17 19:05
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0031_researchjob_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='listentrychange',
+            name='oebl_resear_list_id_adda2d_idx',
+        ),
+        # the logged changes are committed, 0 keeps them ordered by id before all new ones
+        migrations.AddField(
+            model_name='listentrychange',
+            name='txid',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='listentrychange',
+            index=models.Index(fields=['list', 'txid', 'id'], name='oebl_resear_list_id_a2bfd0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listentrychange',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['created'], name='oebl_resear_created_d1b3be_brin'),
+        ),
+    ]
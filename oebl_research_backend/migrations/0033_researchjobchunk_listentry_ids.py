@@ -0,0 +1,19 @@
+# Generated by Django 3.1.14 on 2026-10-17 19:30
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oebl_research_backend', '0032_listentrychange_txid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='researchjobchunk',
+            name='listentry_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, null=True, size=None),
+        ),
+    ]
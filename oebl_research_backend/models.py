@@ -1,10 +1,15 @@
+import json
 import typing
-from django.db import models
+from django.db import connection, models
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db.models.deletion import SET_NULL
 from oebl_irs_workflow.models import Lemma as ResearchPerson, Editor
 from django.conf import settings
+from django.utils import timezone
 import os
+import uuid
 
 
 CHOICES_GENDER = (
@@ -67,6 +72,22 @@ class GideonLegacyLiterature(typing.TypedDict):
     value: str
 
 
+def gnd_uri(gnd: str) -> str:
+    return f"https://d-nb.info/gnd/{gnd}/"
+
+
+def gnds_from_uris(uris: typing.Optional[typing.List[str]]) -> typing.List[str]:
+    """GND identifiers of the d-nb.info URIs in uris, same as the IRSPerson.gnds trigger (migration 0029)"""
+    res = []
+    for uri in uris or []:
+        if "d-nb.info" in uri:
+            parts = uri.split("/")
+            for idx, part in enumerate(parts[:-1]):
+                if part == "gnd" and parts[idx + 1]:
+                    res.append(parts[idx + 1])
+    return res
+
+
 class IRSPerson(models.Model):
     """IRSPerson Model
 
@@ -102,10 +123,22 @@ class IRSPerson(models.Model):
     """Literate about this person stored as zoteroKeys"""
     notes = models.TextField(null=True, blank=True)
     """A field to add additional iformation to be shared, that do not fit in the main data model."""
+    search_document = SearchVectorField(null=True, editable=False)
+    """Weighted tsvector of the names, profession and bio note, set by a database trigger (see search)"""
+    gnds: typing.List[str] = ArrayField(base_field=models.TextField(), default=list, blank=True, editable=False)
+    """Bare GND identifiers of the d-nb.info uris, set by a database trigger on every write of uris"""
+
+    class Meta:
+        indexes = [GinIndex(fields=["search_document"]), GinIndex(fields=["gnds"])]
 
     def __str__(self):
         return f"{self.name}, {self.first_name}"
 
+    def save(self, *args, **kwargs):
+        # the trigger sets the column, this keeps the instance in sync with it
+        self.gnds = gnds_from_uris(self.uris)
+        super().save(*args, **kwargs)
+
 
 class List(models.Model):
     title = models.CharField(max_length=255)
@@ -124,16 +157,30 @@ class ListEntry(models.Model):
     list = models.ForeignKey(List, on_delete=models.SET_NULL, null=True, blank=True)
     columns_scrape = models.JSONField(null=True, blank=True)
     columns_user = models.JSONField(null=True, blank=True)
-    scrape = models.JSONField(null=True, blank=True)
     deleted = models.BooleanField(default=False)
     attachements = ArrayField(models.FileField(get_attachements_path), null=True, blank=True)
     works = ArrayField(models.URLField(), null=True, blank=True)
     references = ArrayField(models.URLField(), null=True, blank=True)
+    research_job = models.ForeignKey("ResearchJob", on_delete=models.SET_NULL, null=True, blank=True, related_name="entries")
+    """Job of the upload the entry was created by"""
     _update_scrape_triggered = False
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["last_updated", "id"]),
+            # containment and jsonpath filters, see json_filters
+            GinIndex(fields=["columns_scrape"], opclasses=["jsonb_path_ops"], name="listentry_columns_scrape_gin"),
+            GinIndex(fields=["columns_user"], opclasses=["jsonb_path_ops"], name="listentry_columns_user_gin"),
+        ]
+
     def __str__(self):
         return f"{str(self.person)} - scrape {str(self.last_updated)}"
 
+    @property
+    def scrape(self) -> dict:
+        """Raw scrape results keyed by source, stored in ScrapeResult rows"""
+        return {res.source: res.payload for res in self.scrape_results.all()}
+
     def get_dict(self):
         res = {}
         res["name"] = getattr(self.person, "name", None)
@@ -141,3 +188,257 @@ class ListEntry(models.Model):
         res["start_date"] = getattr(self.person, "date_of_birth", None)
         res["end_date"] = getattr(self.person, "date_of_death", None)
         return res
+
+
+class ScrapeResult(models.Model):
+    """Raw result of a scrape source for a list entry, kept out of the ListEntry row"""
+    list_entry = models.ForeignKey(ListEntry, on_delete=models.CASCADE, related_name="scrape_results")
+    source = models.CharField(max_length=50)
+    payload = models.JSONField(null=True)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [("list_entry", "source")]
+
+    def __str__(self):
+        return f"{self.list_entry_id} - {self.source}"
+
+    @classmethod
+    def upsert(cls, listentry_ids: typing.List[int], source: str, payload, append: bool = False) -> typing.Dict[int, typing.Any]:
+        """Sets (or appends to) the payload of source for all listentry_ids with one INSERT ... ON CONFLICT
+
+        Args:
+            listentry_ids (List[int]): pks of the list entries, pks that do not exist are skipped
+            source (str): e.g. "obv"
+            payload: the result
+            append (bool, optional): append payload to the array stored so far. Defaults to False.
+
+        Returns:
+            Dict[int, Any]: the payloads after the write keyed by list entry pk
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        if append:
+            payload = [payload]
+            update = f"COALESCE({table}.payload, '[]'::jsonb) || EXCLUDED.payload"
+        else:
+            update = "EXCLUDED.payload"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (list_entry_id, source, payload, last_updated) "
+                f"SELECT id, %s, %s::jsonb, now() FROM {connection.ops.quote_name(ListEntry._meta.db_table)} "
+                f"WHERE id = ANY(%s) "
+                f"ON CONFLICT (list_entry_id, source) DO UPDATE SET payload = {update}, last_updated = EXCLUDED.last_updated "
+                f"RETURNING list_entry_id, payload",
+                [source, json.dumps(payload), list(listentry_ids)],
+            )
+            return {pk: json.loads(res) if isinstance(res, str) else res for pk, res in cursor.fetchall()}
+
+
+class ResearchJob(models.Model):
+    """Progress record of a list upload, the upload is processed in chunks of ResearchJobChunk"""
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    fingerprint = models.CharField(max_length=64)
+    """sha256 of the upload, used to resume a re-submitted upload while the job is not finished"""
+    list = models.ForeignKey(List, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    total_chunks = models.PositiveIntegerField()
+    chunks_done = models.PositiveIntegerField(default=0)
+    total_entries = models.PositiveIntegerField(default=0)
+    """list entries created by the ingested chunks"""
+    entries_done = models.PositiveIntegerField(default=0)
+    """list entries with a "done" event, the counters are kept so polling the progress does not count"""
+    wiki = models.BooleanField(default=True)
+    created = models.DateTimeField(auto_now_add=True)
+    last_updated = models.DateTimeField(auto_now=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    """set when the last chunk is finished, a later upload of the same lemmas starts a new job"""
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fingerprint"], condition=models.Q(finished__isnull=True), name="researchjob_unfinished_fingerprint"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.job_id} ({str(self.list)})"
+
+
+class ResearchJobChunk(models.Model):
+    job = models.ForeignKey(ResearchJob, on_delete=models.CASCADE, related_name="chunks")
+    index = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField()
+    """Position of the first lemma of the chunk in the upload"""
+    lemmas = models.JSONField(null=True, blank=True)
+    """Payload of the chunk, cleared once the chunk is ingested"""
+    listentry_ids = ArrayField(models.IntegerField(), null=True, blank=True)
+    """list entries created from the chunk, they are dispatched again if the chunk is retried after ingesting"""
+    dispatched = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    """set once the scrapes of the entries are dispatched"""
+    failed_rows = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        unique_together = [("job", "index")]
+        ordering = ["job", "index"]
+
+    def __str__(self):
+        return f"{self.job_id} - chunk {self.index}"
+
+
+class RateLimitBucket(models.Model):
+    """State of the token bucket of a scrape source, see rate_limit.TokenBucket"""
+    source = models.CharField(max_length=50, unique=True)
+    tokens = models.FloatField()
+    updated = models.FloatField()
+    """unix timestamp of the last refill"""
+
+    def __str__(self):
+        return f"{self.source}: {self.tokens:.2f} tokens"
+
+
+class ScrapeCacheEntry(models.Model):
+    """Recorded response of a scrape source, see scrape_cache"""
+    key = models.CharField(max_length=64, unique=True)
+    """sha256 of the source and the normalized query"""
+    source = models.CharField(max_length=50, db_index=True)
+    query = models.JSONField()
+    response = models.JSONField(null=True)
+    size = models.PositiveIntegerField()
+    """size of the serialized response in bytes"""
+    fetched = models.DateTimeField()
+    last_accessed = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.source}: {self.query}"
+
+
+class ScrapeClaim(models.Model):
+    """In-flight scrape of a GND, list entries needing the same GND wait for it, see dedup"""
+    gnd = models.CharField(max_length=255, unique=True)
+    claim_id = models.CharField(max_length=36, db_index=True)
+    """id of the dispatch that scrapes the GND"""
+    listentry_ids = ArrayField(models.IntegerField(), default=list)
+    """list entries the results are written to, the first one is the one dispatched"""
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.gnd} ({len(self.listentry_ids)} list entries)"
+
+
+class ScrapeCounter(models.Model):
+    """Number of requests to a scrape source saved by coalescing scrapes of the same GND"""
+    source = models.CharField(max_length=50, unique=True)
+    requests_saved = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.source}: {self.requests_saved} requests saved"
+
+
+class NotificationOutbox(models.Model):
+    """Finished list entry the frontend has not been notified about yet, see notifications"""
+    list_entry = models.ForeignKey(ListEntry, on_delete=models.CASCADE)
+    created = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ["pk"]
+
+    def __str__(self):
+        return f"{self.list_entry_id} ({self.attempts} attempts)"
+
+
+class ResearchJobEvent(models.Model):
+    """Progress of a research job: a source (or "done") finished for a list entry, see progress"""
+    job = models.ForeignKey(ResearchJob, on_delete=models.CASCADE, related_name="events")
+    list_entry = models.ForeignKey(ListEntry, on_delete=models.CASCADE)
+    source = models.CharField(max_length=50)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["pk"]
+        indexes = [models.Index(fields=["job", "id"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["job", "list_entry"], condition=models.Q(source="done"), name="researchjobevent_done_once"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.job_id} - {self.list_entry_id}: {self.source}"
+
+    @classmethod
+    def add_done(cls, jobs: typing.Dict[int, int]) -> typing.List[int]:
+        """Adds the done event of the list entries with one INSERT, entries that are already done are skipped
+
+        Args:
+            jobs (Dict[int, int]): research_job_id per list entry pk
+
+        Returns:
+            List[int]: research_job_id of every event added
+        """
+        if not jobs:
+            return []
+        pks = sorted(jobs)
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (job_id, list_entry_id, source, created) "
+                "SELECT job_id, list_entry_id, 'done', now() FROM unnest(%s::integer[], %s::integer[]) AS t(list_entry_id, job_id) "
+                "ORDER BY list_entry_id "
+                "ON CONFLICT (job_id, list_entry_id) WHERE source = 'done' DO NOTHING RETURNING job_id",
+                [pks, [jobs[pk] for pk in pks]],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class ListEntryChange(models.Model):
+    """Change log of the list entries for the sync endpoint of LemmaResearchView, see sync"""
+    id = models.BigAutoField(primary_key=True)
+    """sequence number of the change, orders the changes of a transaction"""
+    txid = models.BigIntegerField()
+    """txid_current() of the transaction that logged the change, sync tokens hold the last (txid, id) a client has seen"""
+    list_entry = models.ForeignKey(ListEntry, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    list = models.ForeignKey(List, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name="+")
+    fields = ArrayField(models.CharField(max_length=50), null=True, blank=True)
+    """changed fields of ListEntrySerializer, null if the entry was created"""
+    deleted = models.BooleanField(default=False)
+    """the entry was deleted or moved out of list"""
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["pk"]
+        indexes = [models.Index(fields=["list", "txid", "id"]), BrinIndex(fields=["created"])]
+
+    def __str__(self):
+        return f"{self.pk}: {self.list_entry_id} ({'deleted' if self.deleted else ', '.join(self.fields or ['created'])})"
+
+    @classmethod
+    def log(
+        cls,
+        listentry_ids: typing.Iterable[int],
+        fields: typing.Optional[typing.List[str]] = None,
+        deleted: bool = False,
+        list_id: typing.Optional[int] = None,
+    ) -> None:
+        """Logs a change of the list entries with one INSERT ... SELECT, in the transaction of the change
+
+        Args:
+            listentry_ids (Iterable[int]): pks of the changed list entries
+            fields (List[str], optional): the changed fields of ListEntrySerializer. Defaults to None (all).
+            deleted (bool, optional): the entries were deleted. Defaults to False.
+            list_id (int, optional): log the change for this list instead of the current list of the
+                entries, used to remove moved entries from their old list. Defaults to None.
+        """
+        listentry_ids = list(listentry_ids)
+        if not listentry_ids:
+            return
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (list_entry_id, list_id, fields, deleted, created, txid) "
+                f"SELECT id, {'list_id' if list_id is None else '%s'}, %s, %s, now(), txid_current() "
+                f"FROM {connection.ops.quote_name(ListEntry._meta.db_table)} WHERE id = ANY(%s)",
+                ([] if list_id is None else [list_id]) + [fields, deleted, listentry_ids],
+            )
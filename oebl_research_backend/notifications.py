@@ -0,0 +1,130 @@
+"""Batched notifications of the frontend about finished list entries.
+
+Finished list entries are written to the NotificationOutbox table by notify. The first
+entry of a window schedules flush_notifications RESEARCH_NOTIFY_WINDOW seconds later (or
+right away once RESEARCH_NOTIFY_BATCH_SIZE entries are waiting), which then sends all
+waiting entries with one POST per batch to FRONTEND_POST_FINISHED. Failed POSTs are
+retried with exponential backoff. As the outbox is stored in the database, notifications
+survive worker restarts; every worker flushes the outbox when it starts.
+
+Whether a flush is scheduled is only guessed from due rows waiting, which is wrong once a
+countdown task was lost or the lease of a crashed flush expired. The celery beat therefore
+runs flush_notifications every minute as a backstop (CELERY_beat_schedule), so no due row
+waits longer than that.
+
+Rows being sent are leased by moving their next_attempt into the future, so concurrent
+flushes never send the same rows and rows of a worker that died are sent again later.
+"""
+import datetime
+import os
+import typing
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .http_session import get_session
+from .models import ListEntry, NotificationOutbox
+from .serializers import ListEntrySerializer
+
+WINDOW = 5
+"""default seconds entries are buffered, see RESEARCH_NOTIFY_WINDOW"""
+BATCH_SIZE = 500
+"""default maximum number of entries per POST, see RESEARCH_NOTIFY_BATCH_SIZE"""
+RETRY_BACKOFF = 10
+"""seconds before the first retry, doubled with every further attempt"""
+RETRY_BACKOFF_MAX = 3600
+LEASE = 300
+"""seconds rows being sent are hidden from other flushes"""
+
+
+def get_window() -> float:
+    return getattr(settings, "RESEARCH_NOTIFY_WINDOW", WINDOW)
+
+
+def get_batch_size() -> int:
+    return getattr(settings, "RESEARCH_NOTIFY_BATCH_SIZE", BATCH_SIZE)
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait after the given number of failed attempts"""
+    return min(RETRY_BACKOFF * 2 ** max(attempts - 1, 0), RETRY_BACKOFF_MAX)
+
+
+def notify(listentry_id) -> None:
+    """Queues notifications about finished list entries
+
+    Args:
+        listentry_id (int or list): pk(s) of the finished list entries
+    """
+    from .tasks import flush_notifications
+
+    if isinstance(listentry_id, int):
+        listentry_id = [listentry_id]
+    if not listentry_id:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        # rows that are due already wait for a scheduled flush
+        scheduled = NotificationOutbox.objects.filter(next_attempt__lte=now).exists()
+        NotificationOutbox.objects.bulk_create(
+            [NotificationOutbox(list_entry_id=pk, next_attempt=now) for pk in dict.fromkeys(listentry_id)]
+        )
+        if NotificationOutbox.objects.filter(next_attempt__lte=now).count() >= get_batch_size():
+            transaction.on_commit(lambda: flush_notifications.delay())
+        elif not scheduled:
+            transaction.on_commit(lambda: flush_notifications.apply_async(countdown=get_window()))
+
+
+def post_list_entries(listentry_ids: typing.List[int]):
+    """POSTs the serialized list entries to the frontend"""
+    header = {"X-Secret": os.environ.get("FRONTEND_CORS_TOKEN", "")}
+    obj_data = ListEntrySerializer(ListEntry.objects.filter(pk__in=listentry_ids), many=True).data
+    return get_session().post(
+        os.environ.get(
+            "FRONTEND_POST_FINISHED",
+            "https://oebl-research.acdh-dev.oeaw.ac.at/message/import-lemmas",
+        ),
+        headers=header,
+        json=obj_data,
+    )
+
+
+def send_pending(batch_size: typing.Optional[int] = None) -> typing.Tuple[int, typing.Optional[float]]:
+    """Sends one batch of due notifications
+
+    Args:
+        batch_size (int, optional): maximum number of entries. Defaults to RESEARCH_NOTIFY_BATCH_SIZE or BATCH_SIZE.
+
+    Returns:
+        Tuple[int, Optional[float]]: number of entries sent and, if the POST failed, the seconds until the retry
+    """
+    if batch_size is None:
+        batch_size = get_batch_size()
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt__lte=now)
+            .values_list("pk", "list_entry_id", "attempts")[:batch_size]
+        )
+        NotificationOutbox.objects.filter(pk__in=[r[0] for r in rows]).update(
+            next_attempt=now + datetime.timedelta(seconds=LEASE)
+        )
+    if not rows:
+        return 0, None
+    try:
+        res = post_list_entries(list(dict.fromkeys(r[1] for r in rows)))
+        failed = res.status_code >= 300
+    except Exception as e:
+        print(f"posting {len(rows)} finished list entries failed: {e}")
+        failed = True
+    if not failed:
+        NotificationOutbox.objects.filter(pk__in=[r[0] for r in rows]).delete()
+        return len(rows), None
+    delay = retry_delay(max(r[2] for r in rows) + 1)
+    NotificationOutbox.objects.filter(pk__in=[r[0] for r in rows]).update(
+        attempts=F("attempts") + 1, next_attempt=timezone.now() + datetime.timedelta(seconds=delay)
+    )
+    return 0, delay
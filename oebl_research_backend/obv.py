@@ -0,0 +1,201 @@
+"""Client for the OBV primo search API used by get_obv_records.
+
+The OBV search requires a guest JWT. The token is kept in the Django cache until shortly
+before it expires (or until the API answers 401), so consecutive searches do not fetch
+a new token each time. Result pages after the first one are fetched concurrently by a
+small thread pool, the pooled session applies the OBV rate limit to every page request.
+"""
+import base64
+import json
+import math
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .http_session import get_session
+
+OBV_TOKEN_URL = "https://search.obvsg.at/primo_library/libweb/webservices/rest/v1/guestJwt/OBV?isGuest=true&lang=de_DE&targetUrl=https%3A%2F%2Fsearch.obvsg.at%2Fprimo-explore%2Fsearch%3Fvid%3DOBV&viewId=OBV"
+OBV_SEARCH_URL = "https://search.obvsg.at/primo_library/libweb/webservices/rest/primo-explore/v1/pnxs"
+TOKEN_CACHE_KEY = "oebl_research_backend:obv_guest_jwt"
+TOKEN_DEFAULT_TTL = 600
+"""seconds a token is kept if it does not carry an exp claim"""
+TOKEN_REFRESH_MARGIN = 60
+"""seconds before expiry a token is refreshed"""
+PAGE_WORKERS = 4
+"""default number of threads fetching result pages, see RESEARCH_OBV_PAGE_WORKERS"""
+
+
+class TokenStats:
+    """Per process counters of token cache hits, misses and refreshes after a 401"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.unauthorized = 0
+
+    def incr(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def snapshot(self) -> typing.Dict[str, float]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "unauthorized": self.unauthorized, "hit_rate": self.hit_rate}
+
+
+token_stats = TokenStats()
+
+
+def get_token_expiry(token: str) -> typing.Optional[float]:
+    """Reads the exp claim of a JWT (without verifying it), None if there is none"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class ObvTokenError(Exception):
+    """The token endpoint did not answer with a JWT"""
+    pass
+
+
+def get_obv_token(force_refresh: bool = False) -> str:
+    """Returns the cached OBV guest JWT, fetches a new one if there is none or it is about to expire
+
+    Args:
+        force_refresh (bool, optional): ignore the cached token. Defaults to False.
+
+    Raises:
+        ObvTokenError: the token request failed or did not return a string, nothing is cached
+
+    Returns:
+        str: the JWT
+    """
+    if not force_refresh:
+        token = cache.get(TOKEN_CACHE_KEY)
+        if token is not None:
+            token_stats.incr("hits")
+            return token
+    token_stats.incr("misses")
+    response = get_session().get(OBV_TOKEN_URL)
+    try:
+        response.raise_for_status()
+        token = response.json()
+    except (requests.HTTPError, ValueError) as e:
+        raise ObvTokenError(f"OBV token request failed: {e}") from e
+    if not isinstance(token, str):
+        raise ObvTokenError(f"OBV token request returned {type(token).__name__} instead of a JWT")
+    expiry = get_token_expiry(token)
+    if expiry is None:
+        ttl = TOKEN_DEFAULT_TTL
+    else:
+        ttl = expiry - time.time() - TOKEN_REFRESH_MARGIN
+    if ttl > 0:
+        cache.set(TOKEN_CACHE_KEY, token, ttl)
+    return token
+
+
+def obv_get(params: dict, url: str = OBV_SEARCH_URL):
+    """GET request against the OBV API with the cached token, retried once with a new token on 401"""
+    session = get_session()
+    response = session.get(url, headers={"authorization": f"Bearer {get_obv_token()}"}, params=params)
+    if response.status_code == 401:
+        token_stats.incr("unauthorized")
+        response = session.get(
+            url, headers={"authorization": f"Bearer {get_obv_token(force_refresh=True)}"}, params=params
+        )
+    return response
+
+
+def obv_search_params(gnd: str, limit: int = 50, offset: int = 0) -> dict:
+    """Query parameters of an OBV search for all records mentioning gnd"""
+    return {
+        "blendFacetsSeparately": "false",
+        "getMore": "0",
+        "inst": "OBV",
+        "lang": "de_DE",
+        "limit": limit,
+        "mode": "advanced",
+        "newspapersActive": "false",
+        "newspapersSearch": "false",
+        "offset": offset,
+        "pcAvailability": "false",
+        "q": f"any,contains,{gnd},AND",
+        "qExclude": "",
+        "qInclude": "",
+        "refEntryActive": "false",
+        "rtaLinks": "false",
+        "scope": "OBV_Gesamt",
+        "skipDelivery": "Y",
+        "sort": "rank",
+        "tab": "default_tab",
+        "vid": "OBV",
+    }
+
+
+class ObvPageError(Exception):
+    """A result page after the first could not be fetched, the records of the GND are incomplete"""
+    pass
+
+
+def _fetch_page(params: dict) -> typing.List[dict]:
+    """pnx display records of one result page
+
+    Raises:
+        ObvPageError: the page could not be fetched
+    """
+    try:
+        response = obv_get(params)
+        if response.status_code != 200:
+            raise ObvPageError(f"OBV page at offset {params['offset']} failed with {response.status_code}")
+        return [r["pnx"]["display"] for r in response.json()["docs"]]
+    finally:
+        # the rate limit runs queries in this thread, close its connection when done
+        connections.close_all()
+
+
+def search_obv_records(gnd: str, limit: int = 50, max_workers: typing.Optional[int] = None) -> typing.Optional[typing.List[dict]]:
+    """Fetches all OBV records mentioning gnd
+
+    The first page tells the total number of records, the remaining pages are then fetched
+    concurrently and merged in page order.
+
+    Args:
+        gnd (str): GND id to search for
+        limit (int, optional): records per page. Defaults to 50.
+        max_workers (int, optional): threads fetching pages. Defaults to RESEARCH_OBV_PAGE_WORKERS or PAGE_WORKERS.
+
+    Raises:
+        ObvPageError: one of the remaining pages could not be fetched, so no partial result is returned
+
+    Returns:
+        Optional[List[dict]]: pnx display records, None if the first page could not be fetched
+    """
+    response = obv_get(obv_search_params(gnd, limit=limit))
+    if response.status_code != 200:
+        return None
+    res = response.json()
+    fin = [r["pnx"]["display"] for r in res["docs"]]
+    pages = math.ceil(int(res["info"]["total"]) / limit)
+    if pages <= 1:
+        return fin
+    if max_workers is None:
+        max_workers = getattr(settings, "RESEARCH_OBV_PAGE_WORKERS", PAGE_WORKERS)
+    params = [obv_search_params(gnd, limit=limit, offset=limit * pg) for pg in range(1, pages)]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(params))) as executor:
+        for page in executor.map(_fetch_page, params):
+            fin.extend(page)
+    return fin
@@ -0,0 +1,179 @@
+"""Progress of research jobs for the events endpoint of ResearchJobViewset.
+
+Whenever a scraper wrote its result for list entries and whenever list entries are finished,
+one ResearchJobEvent per entry is added for the job the entry was created by. The events are
+append only and ordered by pk, so clients follow a job by asking for the events after the
+last pk they have seen (the Last-Event-ID of Server-Sent Events). Reading them is one indexed
+query per poll, the state of the job is read from the counters of ResearchJob, which are
+updated when chunks are ingested and entries are done. No broker or cache is involved.
+
+Requests never wait long: the request threads of the API are few, so the events endpoint is
+a short-poll (a long-poll is capped at RESEARCH_PROGRESS_LONG_POLL_MAX seconds) and the event
+stream ends after the events available, telling EventSource clients to reconnect after
+RESEARCH_PROGRESS_POLL_INTERVAL seconds. Events of old jobs are removed by prune_events.
+
+A job is finished once all of its chunks are ingested and every entry has a DONE event.
+"""
+import datetime
+import json
+import math
+import time
+import typing
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ListEntry, ResearchJob, ResearchJobEvent
+
+DONE = "done"
+"""source of the event added when all scrapers finished for a list entry"""
+POLL_INTERVAL = 2
+"""default seconds between two reads of the events, see RESEARCH_PROGRESS_POLL_INTERVAL"""
+LONG_POLL_TIMEOUT = 0
+"""default seconds a poll waits for events"""
+LONG_POLL_TIMEOUT_MAX = 5
+"""default maximum seconds a poll waits for events, see RESEARCH_PROGRESS_LONG_POLL_MAX"""
+EVENTS_LIMIT = 1000
+"""maximum number of events returned per read"""
+EVENT_RETENTION = 7
+"""default days the events of a job are kept, see RESEARCH_PROGRESS_EVENT_RETENTION"""
+
+
+def get_poll_interval() -> float:
+    return getattr(settings, "RESEARCH_PROGRESS_POLL_INTERVAL", POLL_INTERVAL)
+
+
+def get_long_poll_max() -> float:
+    return getattr(settings, "RESEARCH_PROGRESS_LONG_POLL_MAX", LONG_POLL_TIMEOUT_MAX)
+
+
+def add_events(jobs: typing.Dict[int, typing.Optional[int]], source: str) -> int:
+    """Adds an event for every list entry with a research job
+
+    DONE is added once per entry (see ResearchJobEvent.add_done) and counted in entries_done
+    of the jobs.
+
+    Args:
+        jobs (Dict[int, Optional[int]]): research_job_id per list entry pk
+        source (str): the source written for the entries or DONE
+
+    Returns:
+        int: number of events added
+    """
+    jobs = {pk: job_id for pk, job_id in jobs.items() if job_id}
+    if source != DONE:
+        return len(ResearchJobEvent.objects.bulk_create(
+            [ResearchJobEvent(job_id=job_id, list_entry_id=pk, source=source) for pk, job_id in sorted(jobs.items())]
+        ))
+    added = Counter(ResearchJobEvent.add_done(jobs))
+    for job_id, count in sorted(added.items()):
+        ResearchJob.objects.filter(pk=job_id).update(entries_done=F("entries_done") + count)
+    return sum(added.values())
+
+
+def record_progress(listentry_ids: typing.Iterable[int], source: str) -> int:
+    """Adds an event for every list entry that belongs to a research job, see add_events"""
+    return add_events(
+        dict(
+            ListEntry.objects.filter(pk__in=list(listentry_ids), research_job__isnull=False).values_list(
+                "pk", "research_job_id"
+            )
+        ),
+        source,
+    )
+
+
+def job_events(job: ResearchJob, after: int = 0, limit: int = EVENTS_LIMIT) -> typing.List[dict]:
+    """Events of the job with a pk greater than after, oldest first"""
+    return [
+        {"id": pk, "listEntry": list_entry_id, "source": source, "created": created.isoformat()}
+        for pk, list_entry_id, source, created in ResearchJobEvent.objects.filter(job=job, pk__gt=after)
+        .order_by("pk")
+        .values_list("pk", "list_entry_id", "source", "created")[:limit]
+    ]
+
+
+def job_state(job: ResearchJob) -> dict:
+    """Chunks ingested and entries done of the job, as loaded"""
+    return {
+        "totalChunks": job.total_chunks,
+        "chunksFinished": job.chunks_done,
+        "entries": job.total_entries,
+        "entriesDone": job.entries_done,
+        "finished": job.chunks_done >= job.total_chunks and job.entries_done >= job.total_entries,
+    }
+
+
+def wait_for_events(
+    job: ResearchJob,
+    after: int = 0,
+    timeout: float = LONG_POLL_TIMEOUT,
+    interval: float = 1,
+) -> typing.Tuple[typing.List[dict], dict]:
+    """Reads the events after the given pk, waiting up to timeout seconds if there are none
+
+    Returns right away if the job is finished, timeout is capped at RESEARCH_PROGRESS_LONG_POLL_MAX
+    and non-finite values do not wait.
+    Only the events are read while waiting, the job is reloaded once at the end.
+
+    Returns:
+        Tuple[List[dict], dict]: the events and the state of the job
+    """
+    timeout = min(timeout, get_long_poll_max()) if math.isfinite(timeout) else 0
+    state = job_state(job)
+    if state["finished"] or timeout <= 0:
+        return job_events(job, after), state
+    deadline = time.monotonic() + timeout
+    while True:
+        events = job_events(job, after)
+        if events or time.monotonic() >= deadline:
+            break
+        time.sleep(interval)
+    job.refresh_from_db(fields=["chunks_done", "total_entries", "entries_done"])
+    return events, job_state(job)
+
+
+def _sse(event: str, data: dict, event_id: typing.Optional[int] = None) -> str:
+    msg = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return msg if event_id is None else f"id: {event_id}\n{msg}"
+
+
+def event_stream(job: ResearchJob, after: int = 0) -> typing.Iterator[str]:
+    """Server-Sent Events of the job
+
+    Every event after the given pk is sent as a "progress" message with its pk as id, followed by
+    a "state" message, then the stream ends. The first message sets the reconnection time of
+    EventSource to RESEARCH_PROGRESS_POLL_INTERVAL, clients reconnect with the Last-Event-ID of
+    the last event and close the EventSource once the state is finished.
+
+    Args:
+        job (ResearchJob): the job
+        after (int, optional): pk of the last event the client has seen. Defaults to 0.
+
+    Yields:
+        str: the messages
+    """
+    yield f"retry: {int(get_poll_interval() * 1000)}\n\n"
+    while True:
+        events = job_events(job, after)
+        for event in events:
+            yield _sse("progress", event, event["id"])
+        if len(events) < EVENTS_LIMIT:
+            break
+        after = events[-1]["id"]
+    yield _sse("state", job_state(job))
+
+
+def prune_events(days: typing.Optional[float] = None) -> int:
+    """Deletes the events of jobs created more than days (RESEARCH_PROGRESS_EVENT_RETENTION) ago
+
+    Returns:
+        int: number of events deleted
+    """
+    if days is None:
+        days = getattr(settings, "RESEARCH_PROGRESS_EVENT_RETENTION", EVENT_RETENTION)
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    deleted, _ = ResearchJobEvent.objects.filter(job__created__lt=cutoff).delete()
+    return deleted
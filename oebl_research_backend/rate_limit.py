@@ -0,0 +1,110 @@
+"""Token bucket rate limits per scrape source, shared by all celery workers.
+
+The bucket state lives in RateLimitBucket rows of the project database, which every worker
+already shares, so the global request rate per source stays capped no matter how many
+workers scrape concurrently. Limits are configured per source with RESEARCH_RATE_LIMITS:
+
+    RESEARCH_RATE_LIMITS = {
+        "obv": {"rate": 1.0, "burst": 3, "hosts": ["search.obvsg.at"]},
+    }
+
+rate is the number of requests per second, burst the size of the bucket.
+"""
+import time
+import typing
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import RateLimitBucket
+
+DEFAULT_RATE_LIMITS = {
+    "obv": {"rate": 1.0, "burst": 3, "hosts": ["search.obvsg.at"]},
+    "wikipedia": {"rate": 5.0, "burst": 10, "hosts": ["de.wikipedia.org"]},
+    "wikidata": {"rate": 2.0, "burst": 5, "hosts": ["query.wikidata.org"]},
+}
+
+
+def get_rate_limits() -> typing.Dict[str, dict]:
+    """DEFAULT_RATE_LIMITS updated with the per source values of settings.RESEARCH_RATE_LIMITS"""
+    limits = {source: dict(conf) for source, conf in DEFAULT_RATE_LIMITS.items()}
+    for source, conf in getattr(settings, "RESEARCH_RATE_LIMITS", {}).items():
+        limits.setdefault(source, {}).update(conf)
+    return limits
+
+
+class TokenBucket:
+    """Token bucket of one source, state stored in the database
+
+    Args:
+        source (str): name of the source, e.g. "obv"
+        rate (float): tokens added per second
+        burst (int): maximum number of tokens in the bucket
+        clock (callable, optional): returns the current time in seconds. Defaults to time.time.
+        sleep (callable, optional): used to wait for tokens. Defaults to time.sleep.
+    """
+
+    def __init__(self, source: str, rate: float, burst: int, clock=time.time, sleep=time.sleep, **kwargs):
+        self.source = source
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+
+    def try_acquire(self) -> float:
+        """Takes a token if one is available
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until the next token is available
+        """
+        with transaction.atomic():
+            now = self.clock()
+            bucket, created = RateLimitBucket.objects.select_for_update().get_or_create(
+                source=self.source, defaults={"tokens": self.burst, "updated": now}
+            )
+            tokens = min(self.burst, bucket.tokens + max(now - bucket.updated, 0) * self.rate)
+            if tokens >= 1:
+                wait = 0.0
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            RateLimitBucket.objects.filter(pk=bucket.pk).update(tokens=tokens, updated=now)
+        return wait
+
+    def acquire(self) -> float:
+        """Blocks until a token was taken
+
+        Returns:
+            float: seconds spent waiting
+        """
+        waited = 0.0
+        wait = self.try_acquire()
+        while wait > 0:
+            self.sleep(wait)
+            waited += wait
+            wait = self.try_acquire()
+        return waited
+
+
+def get_bucket(source: str) -> typing.Optional[TokenBucket]:
+    """TokenBucket for source, None if no limit is configured"""
+    conf = get_rate_limits().get(source)
+    if not conf or not conf.get("rate"):
+        return None
+    return TokenBucket(source, **conf)
+
+
+def acquire(source: str) -> float:
+    """Blocks until the rate limit of source allows another request, returns the seconds waited"""
+    bucket = get_bucket(source)
+    if bucket is None:
+        return 0.0
+    return bucket.acquire()
+
+
+def throttle_host(host: str) -> float:
+    """Applies the rate limit of the source that host belongs to (if any)"""
+    for source, conf in get_rate_limits().items():
+        if host in conf.get("hosts", []):
+            return acquire(source)
+    return 0.0
@@ -0,0 +1,146 @@
+"""Persistent cache of responses of the external scrape sources.
+
+Responses are stored in ScrapeCacheEntry rows keyed by the sha256 of the source and the
+normalized query, so the same GND scraped again (another list, the update path, ...) is
+served from the database. Configuration:
+
+- RESEARCH_SCRAPE_CACHE_TTL: seconds a response stays fresh, an int or a dict per source
+- RESEARCH_SCRAPE_CACHE_MAX_SIZE: bytes kept in total, least recently used entries are evicted beyond
+- RESEARCH_SCRAPE_CACHE_EVICT_EVERY: eviction (a sum over the whole table) runs after every nth store of
+  a worker process, so the cache may exceed the max size by the last n responses
+- RESEARCH_SCRAPE_CACHE_OFFLINE: replay mode, only recorded responses are served (regardless of
+  their age) and nothing is fetched, used to benchmark the pipeline without network
+"""
+import datetime
+import hashlib
+import json
+import typing
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import ScrapeCacheEntry
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+DEFAULT_EVICT_EVERY = 100
+
+_stores_since_evict = 0
+
+
+class ScrapeCacheMiss(Exception):
+    """Raised in offline mode for responses that were never recorded"""
+    pass
+
+
+def is_offline() -> bool:
+    return getattr(settings, "RESEARCH_SCRAPE_CACHE_OFFLINE", False)
+
+
+def get_ttl(source: str) -> int:
+    ttl = getattr(settings, "RESEARCH_SCRAPE_CACHE_TTL", DEFAULT_TTL)
+    if isinstance(ttl, dict):
+        return ttl.get(source, DEFAULT_TTL)
+    return ttl
+
+
+def cache_key(source: str, query: dict) -> str:
+    """sha256 over the source and the normalized (key sorted, compact) query"""
+    normalized = json.dumps(query, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{source}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def lookup_many(source: str, queries: typing.List[dict], force_refresh: bool = False) -> typing.Dict[int, typing.Any]:
+    """Cached responses for queries of source
+
+    Args:
+        source (str): e.g. "obv"
+        queries (List[dict]): the queries
+        force_refresh (bool, optional): ignore cached responses (unless offline). Defaults to False.
+
+    Returns:
+        Dict[int, Any]: the responses keyed by the index of their query, misses are left out
+    """
+    if force_refresh and not is_offline():
+        return {}
+    keys = {cache_key(source, query): idx for idx, query in enumerate(queries)}
+    entries = ScrapeCacheEntry.objects.filter(key__in=keys.keys())
+    if not is_offline():
+        entries = entries.filter(fetched__gte=timezone.now() - datetime.timedelta(seconds=get_ttl(source)))
+    res = {}
+    for key, response in entries.values_list("key", "response"):
+        res[keys[key]] = response
+    if res:
+        ScrapeCacheEntry.objects.filter(key__in=[k for k, idx in keys.items() if idx in res]).update(
+            last_accessed=timezone.now()
+        )
+    return res
+
+
+def store(source: str, query: dict, response: typing.Any) -> None:
+    """Records the response of query, every RESEARCH_SCRAPE_CACHE_EVICT_EVERY stores evicts entries beyond the max size"""
+    global _stores_since_evict
+    now = timezone.now()
+    ScrapeCacheEntry.objects.update_or_create(
+        key=cache_key(source, query),
+        defaults={
+            "source": source,
+            "query": query,
+            "response": response,
+            "size": len(json.dumps(response, default=str)),
+            "fetched": now,
+            "last_accessed": now,
+        },
+    )
+    _stores_since_evict += 1
+    if _stores_since_evict >= getattr(settings, "RESEARCH_SCRAPE_CACHE_EVICT_EVERY", DEFAULT_EVICT_EVERY):
+        _stores_since_evict = 0
+        evict()
+
+
+def evict(max_size: typing.Optional[int] = None) -> int:
+    """Deletes least recently used entries until the cache holds at most max_size bytes
+
+    Returns:
+        int: number of deleted entries
+    """
+    if max_size is None:
+        max_size = getattr(settings, "RESEARCH_SCRAPE_CACHE_MAX_SIZE", DEFAULT_MAX_SIZE)
+    total = ScrapeCacheEntry.objects.aggregate(total=Sum("size"))["total"] or 0
+    if total <= max_size:
+        return 0
+    delete = []
+    for pk, size in ScrapeCacheEntry.objects.order_by("last_accessed").values_list("pk", "size").iterator():
+        if total <= max_size:
+            break
+        delete.append(pk)
+        total -= size
+    ScrapeCacheEntry.objects.filter(pk__in=delete).delete()
+    return len(delete)
+
+
+def cached(source: str, query: dict, fetch: typing.Callable[[], typing.Any], force_refresh: bool = False) -> typing.Any:
+    """Returns the cached response of query or fetches and records it
+
+    Args:
+        source (str): e.g. "obv"
+        query (dict): everything the response depends on
+        fetch (callable): fetches the response, None responses are not recorded
+        force_refresh (bool, optional): fetch even if a fresh response is cached. Defaults to False.
+
+    Raises:
+        ScrapeCacheMiss: in offline mode if the response was never recorded
+
+    Returns:
+        Any: the response
+    """
+    hit = lookup_many(source, [query], force_refresh=force_refresh)
+    if hit:
+        return hit[0]
+    if is_offline():
+        raise ScrapeCacheMiss(f"no recorded {source} response for {query}")
+    response = fetch()
+    if response is not None:
+        store(source, query, response)
+    return response
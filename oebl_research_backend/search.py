@@ -0,0 +1,54 @@
+"""Full text search of research lemmas.
+
+IRSPerson.search_document is a tsvector of the name and first name (weight A), the
+alternative names (B), the profession (C) and the bio note (D). A database trigger (see
+migration 0027) sets it on every insert or update of these fields, including bulk_create
+and queryset updates, and a GIN index serves the @@ matches. Names are indexed with the
+"simple" configuration, without stemming or stop words, so the config of the queries has
+to be the same.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F
+
+SEARCH_CONFIG = "simple"
+
+
+def search_query(value: str) -> SearchQuery:
+    """Query for search_document, value in web search syntax ("quoted phrases", or, -not)"""
+    return SearchQuery(value, config=SEARCH_CONFIG, search_type="websearch")
+
+
+def search_persons(queryset, value: str, prefix: str = ""):
+    """Filters queryset by the search document of the person, ranked best first
+
+    Args:
+        queryset (QuerySet): IRSPerson objects or objects related to them
+        value (str): the search terms
+        prefix (str, optional): path to the person, e.g. "person__" for ListEntry. Defaults to "".
+
+    Returns:
+        QuerySet: the matching objects annotated with search_rank
+    """
+    query = search_query(value)
+    return (
+        queryset.filter(**{f"{prefix}search_document": query})
+        .annotate(search_rank=SearchRank(F(f"{prefix}search_document"), query))
+        .order_by("-search_rank", "pk")
+    )
+
+
+def search_field(queryset, field_name: str, value: str):
+    """Filters queryset by the words of a single text field of the person
+
+    The GIN index on the search document selects the candidates, only their field is parsed.
+    All words have to match (no web search syntax), so every match of the field is a match of
+    the search document.
+    """
+    prefix = field_name.rsplit("__", 1)[0] + "__" if "__" in field_name else ""
+    document = f"{field_name.replace('__', '_')}_document"
+    query = SearchQuery(value, config=SEARCH_CONFIG)
+    return (
+        queryset.filter(**{f"{prefix}search_document": query})
+        .annotate(**{document: SearchVector(field_name, config=SEARCH_CONFIG)})
+        .filter(**{document: query})
+    )
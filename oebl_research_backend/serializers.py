@@ -7,7 +7,8 @@ from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 from typing import List as ListType
 
-from .models import ListEntry, List, SecondaryLiterature, ProfessionGroup
+from . import gnd_lookup
+from .models import ListEntry, List, SecondaryLiterature, ProfessionGroup, ResearchJob
 
 gndType = ListType[str]
 
@@ -245,16 +246,7 @@ class ListEntrySerializer(serializers.ModelSerializer):
         return instance
 
     def get_gnd(self, object) -> gndType:
-        if object.person.uris is not None:
-            res = []
-            for uri in object.person.uris:
-                if "d-nb.info" in uri:
-                    gnd_split = uri.split("/")
-                    for idx, part in enumerate(gnd_split):
-                        if part == "gnd": 
-                            res.append(gnd_split[idx+1])
-            return res
-        return []
+        return object.person.gnds
 
     class Meta:
         model = ListEntry
@@ -284,3 +276,61 @@ class ListEntrySerializer(serializers.ModelSerializer):
             "religion",
             "notes",
         ]
+
+
+class ResearchJobSerializer(serializers.ModelSerializer):
+    jobId = serializers.UUIDField(source="job_id", read_only=True)
+    listId = serializers.IntegerField(source="list_id", read_only=True)
+    totalChunks = serializers.IntegerField(source="total_chunks", read_only=True)
+    chunksDone = serializers.IntegerField(source="chunks_done", read_only=True)
+    failedRows = serializers.SerializerMethodField(method_name="get_failed_rows")
+    finished = serializers.SerializerMethodField(method_name="get_finished")
+
+    def get_failed_rows(self, object) -> typing.List[dict]:
+        res = []
+        for chunk in object.chunks.all():
+            res.extend(chunk.failed_rows)
+        return res
+
+    def get_finished(self, object) -> bool:
+        return object.chunks_done == object.total_chunks
+
+    class Meta:
+        model = ResearchJob
+        fields = [
+            "jobId",
+            "listId",
+            "totalChunks",
+            "chunksDone",
+            "failedRows",
+            "finished",
+            "created",
+            "last_updated",
+        ]
+
+
+class BulkSelectionSerializer(serializers.Serializer):
+    """Selects list entries for a bulk action, either by their ids or by the filters of the lemmaresearch endpoint"""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = serializers.DictField(required=False, allow_empty=False)
+
+    def validate(self, attrs):
+        if ("ids" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError("either ids or filter is required")
+        return attrs
+
+
+class GndLookupSerializer(serializers.Serializer):
+    """GNDs to resolve to research persons, see gnd_lookup"""
+    gnds = serializers.ListField(child=serializers.CharField(max_length=32), allow_empty=False)
+
+    def validate_gnds(self, value):
+        limit = gnd_lookup.get_limit()
+        if len(value) > limit:
+            raise serializers.ValidationError(f"at most {limit} GNDs per lookup are allowed")
+        return value
+
+
+class BulkUpdateSerializer(BulkSelectionSerializer):
+    """Selected list entries and the fields to set on all of them, see bulk.update_entries"""
+    patch = serializers.DictField(allow_empty=False)
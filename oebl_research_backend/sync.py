@@ -0,0 +1,190 @@
+"""Delta sync of the list entries of a list for the sync endpoint of LemmaResearchView.
+
+Every write of a list entry adds a ListEntryChange row with the changed fields of
+ListEntrySerializer (see ListEntryChange.log). A client syncs a list by sending the token of
+its last sync and gets the entries changed since then: only the changed fields of live
+entries and tombstones ({"id": .., "deleted": true}) for entries that were deleted or moved
+to another list. Several changes of an entry are merged into one record.
+
+Ids are taken when a change is logged, not when its transaction commits, so a change with a
+lower id can become visible after a client read past it. The changes are therefore read in
+(txid, id) order and only below the horizon of running transactions
+(txid_snapshot_xmin(txid_current_snapshot())): every transaction with a lower txid has
+finished, so no change can appear behind a position a client was given. Changes of
+transactions still running are sent with a later sync.
+
+The token is signed and holds the list and the last (txid, id) sent. A client without token
+or with a token older than RESEARCH_SYNC_RETENTION days, the age of the changes kept by
+prune_changes, gets the whole list in pages of live entries with reset set: the client drops
+its copy of the list first. The delta sync continues from the horizon the full sync started at.
+"""
+import datetime
+import typing
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ListEntry, ListEntryChange
+from .serializers import ListEntrySerializer
+
+LIMIT = 1000
+"""default maximum number of changes read per sync, see RESEARCH_SYNC_LIMIT"""
+RETENTION = 30
+"""default days the changes are kept and sync tokens are valid, see RESEARCH_SYNC_RETENTION"""
+TOKEN_SALT = "oebl_research_backend.sync"
+
+
+class InvalidSyncToken(Exception):
+    pass
+
+
+def get_limit() -> int:
+    return getattr(settings, "RESEARCH_SYNC_LIMIT", LIMIT)
+
+
+def get_retention() -> datetime.timedelta:
+    return datetime.timedelta(days=getattr(settings, "RESEARCH_SYNC_RETENTION", RETENTION))
+
+
+def make_token(list_id: int, txid: int, seq: int, entry: typing.Optional[int] = None) -> str:
+    data = {"list": list_id, "txid": txid, "seq": seq}
+    if entry is not None:
+        data["entry"] = entry
+    return signing.dumps(data, salt=TOKEN_SALT)
+
+
+def read_token(token: typing.Optional[str], list_id: int) -> typing.Optional[dict]:
+    """Position of the token, None if the client needs a full sync
+
+    Returns:
+        Optional[dict]: txid and seq of the last change sent and entry, the last list entry sent
+        during a full sync. None without token or if the token expired.
+
+    Raises:
+        InvalidSyncToken: the token is not signed by this server or belongs to another list
+    """
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=get_retention())
+    except signing.SignatureExpired:
+        return None
+    except signing.BadSignature:
+        raise InvalidSyncToken("invalid sync token")
+    if data.get("list") != list_id:
+        raise InvalidSyncToken("the sync token belongs to another list")
+    if "txid" not in data:
+        # issued before changes were read by transaction
+        return None
+    return data
+
+
+def get_horizon() -> int:
+    """txid below which all transactions have finished"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return cursor.fetchone()[0]
+
+
+def changes_since(
+    list_id: int, txid: int = 0, seq: int = 0, limit: typing.Optional[int] = None
+) -> typing.Tuple[typing.List[dict], int, int, bool]:
+    """Merged changes of the entries of a list after the change (txid, seq), below the horizon
+
+    Args:
+        list_id (int): pk of the List
+        txid (int, optional): txid of the last change the client has seen. Defaults to 0.
+        seq (int, optional): id of the last change the client has seen. Defaults to 0.
+        limit (int, optional): maximum number of changes read. Defaults to RESEARCH_SYNC_LIMIT or LIMIT.
+
+    Returns:
+        Tuple[List[dict], int, int, bool]: the change records, txid and id of the last change read
+        and whether there are more
+    """
+    if limit is None:
+        limit = get_limit()
+    rows = list(
+        ListEntryChange.objects.filter(list_id=list_id, txid__lt=get_horizon())
+        .filter(Q(txid__gt=txid) | Q(txid=txid, pk__gt=seq))
+        .order_by("txid", "pk")
+        .values_list("txid", "pk", "list_entry_id", "fields", "deleted")[:limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], txid, seq, False
+    # changed fields per entry, None if the client needs the whole entry
+    fields: typing.Dict[int, typing.Optional[set]] = {}
+    for _, _, pk, changed, deleted in rows:
+        if changed is None or deleted or fields.get(pk, set()) is None:
+            fields[pk] = None
+        else:
+            fields.setdefault(pk, set()).update(changed)
+    live = {
+        x["id"]: x
+        for x in ListEntrySerializer(
+            ListEntry.objects.filter(pk__in=fields.keys(), list_id=list_id, deleted=False).select_related("person", "list"),
+            many=True,
+        ).data
+    }
+    changes = []
+    for pk, changed in fields.items():
+        if pk not in live:
+            changes.append({"id": pk, "deleted": True})
+        elif changed is None:
+            changes.append(live[pk])
+        else:
+            changes.append(
+                {key: value for key, value in live[pk].items() if key in changed or key in ("id", "deleted", "last_updated")}
+            )
+    return changes, rows[-1][0], rows[-1][1], more
+
+
+def list_entries(list_id: int, after: int = 0, limit: typing.Optional[int] = None) -> typing.Tuple[typing.List[dict], bool]:
+    """The live entries of a list with a pk greater than after, for a full sync
+
+    Returns:
+        Tuple[List[dict], bool]: the entries and whether there are more
+    """
+    if limit is None:
+        limit = get_limit()
+    entries = list(
+        ListEntry.objects.filter(list_id=list_id, deleted=False, pk__gt=after)
+        .select_related("person", "list")
+        .order_by("pk")[:limit + 1]
+    )
+    return ListEntrySerializer(entries[:limit], many=True).data, len(entries) > limit
+
+
+def sync_list(list_id: int, token: typing.Optional[str] = None) -> dict:
+    """Response of the sync endpoint: the changes since token, or the next page of a full sync
+
+    Raises:
+        InvalidSyncToken: see read_token
+    """
+    position = read_token(token, list_id)
+    reset = position is None
+    if reset:
+        position = {"txid": get_horizon(), "seq": 0, "entry": 0}
+    if "entry" in position:
+        changes, more = list_entries(list_id, position["entry"])
+        entry = changes[-1]["id"] if more else None
+        # the delta sync continues with the changes from the horizon on, which are sent again
+        token = make_token(list_id, position["txid"], 0, entry)
+    else:
+        changes, txid, seq, more = changes_since(list_id, position["txid"], position["seq"])
+        token = make_token(list_id, txid, seq)
+    return {"changes": changes, "token": token, "more": more, "reset": reset}
+
+
+def prune_changes() -> int:
+    """Deletes the changes older than RESEARCH_SYNC_RETENTION, tokens of that age expire
+
+    Returns:
+        int: number of changes deleted
+    """
+    deleted, _ = ListEntryChange.objects.filter(created__lt=timezone.now() - get_retention()).delete()
+    return deleted
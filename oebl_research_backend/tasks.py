@@ -1,21 +1,35 @@
 from celery import shared_task, current_task, group, chord, chain
-from SPARQLWrapper import SPARQLWrapper, JSON
+from celery.signals import worker_ready
 import datetime
-from lxml import html
-import requests
-import time
-import random
 import os
 import math
 from dateutil.parser import parse as parse_date
-from typing import Union
+from typing import Tuple, Union
+import hashlib
+import json
 import re
+import typing
+import uuid
 
 from django.conf import settings
-from .models import IRSPerson, List, ListEntry
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import IRSPerson, List, ListEntry, ListEntryChange, ResearchJob, ResearchJobChunk, ScrapeResult, gnd_uri, gnds_from_uris
 from apis_core.helper_functions.RDFParser import RDFParser
 from oebl_irs_workflow.models import Lemma, LemmaStatus, IssueLemma, Issue
 from .serializers import ListEntrySerializer
+from .expressions import JSONBSet
+from .dedup import claim_gnds, expire_claims, fan_out_targets, record_saved, release_claims
+from .columns import NameMatcher, scrape_columns
+from .http_session import get_session
+from .notifications import notify, send_pending
+from .progress import DONE, add_events, prune_events, record_progress
+from .scrape_cache import ScrapeCacheMiss, cached
+from .sync import prune_changes
+from .obv import ObvPageError, ObvTokenError, search_obv_records, token_stats as obv_token_stats
+from .wikipedia import get_wikipedia_statistics
+from .wikidata import BATCH_SIZE as WIKIDATA_BATCH_SIZE, query_wikidata_cached
 from oebl_irs_workflow.serializers import IssueLemmaSerializer
 
 
@@ -39,21 +53,28 @@ def create_child_from_parent_model(child_cls, parent_obj, init_values: dict):
 
 @shared_task(time_limit=500)
 def post_results(ccc, listentry_id=[]):
-    if isinstance(listentry_id, int):
-        listentry_id = [listentry_id]
-    list_entry = ListEntry.objects.filter(pk__in=listentry_id)
-    header = {"X-Secret": os.environ.get("FRONTEND_CORS_TOKEN", "")}
-    obj_data = ListEntrySerializer(list_entry, many=True).data
-    res = requests.post(
-        os.environ.get(
-            "FRONTEND_POST_FINISHED",
-            "https://oebl-research.acdh-dev.oeaw.ac.at/message/import-lemmas",
-        ),
-        headers=header,
-        json=obj_data,
-    )
+    notify(listentry_id)
+    return f"Queued notification for {listentry_id}"
 
-    return f"Posted result for {listentry_id} to frontend resulted in {res.status_code}"
+
+@shared_task(time_limit=500)
+def flush_notifications():
+    """Sends the notifications waiting in the outbox in batches, see notifications"""
+    sent = 0
+    while True:
+        count, retry_in = send_pending()
+        sent += count
+        if retry_in is not None:
+            flush_notifications.apply_async(countdown=retry_in)
+            break
+        if count == 0:
+            break
+    return f"Posted {sent} finished list entries to frontend"
+
+
+@worker_ready.connect
+def flush_notifications_on_start(sender=None, **kwargs):
+    flush_notifications.delay()
 
 
 @shared_task(time_limit=500)
@@ -63,7 +84,7 @@ def post_results_issuelemma(issuelemma_id):
     issuelemma_entry = IssueLemma.objects.filter(pk__in=issuelemma_id)
     header = {"X-Secret": os.environ.get("FRONTEND_CORS_TOKEN", "")}
     obj_data = IssueLemmaSerializer(issuelemma_entry, many=True).data
-    res = requests.post(
+    res = get_session().post(
         os.environ.get(
             "FRONTEND_POST_FINISHED_ISSUELEMMA",
             "https://oebl-research.acdh-dev.oeaw.ac.at/message/import-issue-lemmas",
@@ -75,58 +96,54 @@ def post_results_issuelemma(issuelemma_id):
     return f"Posted result for IssueLemmas {issuelemma_id} to frontend resulted in {res.status_code}"
 
 
+def write_scrape(listentry_id, kind: str, entries, multi: bool = False) -> int:
+    """Stores a scraper result in ScrapeResult and its derived columns in ListEntry.columns_scrape
+
+    The result is upserted with one statement (see ScrapeResult.upsert), only the kind key of
+    columns_scrape is replaced (jsonb_set), so results of other sources written concurrently
+    are kept and the rows are never loaded. The result is written to listentry_id and the
+    entries waiting on its claim (see dedup), the change is logged for the sync endpoint and
+    the progress of their research jobs is recorded (see progress).
+
+    Args:
+        listentry_id (int or list): pk(s) of the list entries
+        kind (str): source of the result, one of scrapes_names
+        entries: the result
+        multi (bool, optional): append to the results of kind instead of replacing them. Defaults to False.
+
+    Returns:
+        int: number of list entries written
+    """
+    if isinstance(listentry_id, int):
+        listentry_id = [listentry_id]
+    with transaction.atomic():
+        payloads = ScrapeResult.upsert(fan_out_targets(listentry_id), kind, entries, append=multi)
+        # the obv columns depend on the names of the person, one update per person (and payload)
+        groups = {}
+        jobs = {}
+        for pk, job_id, *person in ListEntry.objects.filter(pk__in=payloads.keys()).values_list(
+            "pk", "research_job_id", "person_id", "person__name", "person__first_name", "person__alternative_names"
+        ):
+            jobs[pk] = job_id
+            groups.setdefault((person[0], pk if multi else None), (person, []))[1].append(pk)
+        for person, pks in groups.values():
+            matcher = NameMatcher(*person[1:])
+            ListEntry.objects.filter(pk__in=pks).update(
+                columns_scrape=JSONBSet("columns_scrape", kind, scrape_columns(kind, payloads[pks[0]], matcher)),
+                last_updated=timezone.now(),
+            )
+        ListEntryChange.log(payloads.keys(), ["columns_scrape"])
+        add_events(jobs, kind)
+    return len(payloads)
+
+
 @shared_task(time_limit=500)
 def create_columns(listentry_id, kind="obv"):
-    list_entry = ListEntry.objects.get(pk=listentry_id)
-    cols = dict()
-    if kind == "obv":
-        pers_name = list_entry.person.name
-        cols["count_obv"] = len(list_entry.scrape["obv"])
-        counts_author = 0
-        counts_coauthor = 0
-        list_co_authors = []
-        counts_topic = 0
-        counts_topic_authors = 0
-        lst_topic_authors = []
-        for ent in list_entry.scrape["obv"]:
-            test_author = False
-            test_coauthor = []
-            if "creator" in ent.keys():
-                for c1 in ent["creator"]:
-                    if pers_name in c1:
-                        counts_author += 1
-                        test_author = True
-                    else:
-                        test_coauthor.append(c1)
-                if test_author:
-                    if len(test_coauthor) > 0:
-                        for c3 in test_coauthor:
-                            if c3 not in list_co_authors:
-                                list_co_authors.append(c3)
-                                counts_coauthor += 1
-                else:
-                    if len(test_coauthor) > 0:
-                        for c3 in test_coauthor:
-                            if c3 not in lst_topic_authors:
-                                lst_topic_authors.append(c3)
-                                counts_topic_authors += 1
-                    counts_topic += 1
-            elif "contributor" in ent.keys():
-                counts_topic += 1
-                for c2 in ent["contributor"]:
-                    if pers_name not in c2 and c2 not in lst_topic_authors:
-                        counts_topic_authors += 1
-                        lst_topic_authors.append(c2)
-        cols["count_author"] = counts_author
-        cols["count_coauthor"] = counts_coauthor
-        cols["list_coauthors"] = list_co_authors
-        cols["count_topic"] = counts_topic
-        cols["count_topic_authors"] = counts_topic_authors
-        cols["list_topic_authors"] = lst_topic_authors
-        list_entry.columns_scrape["obv"] = cols
-    else:
-        list_entry.columns_scrape[kind] = list_entry.scrape[kind]
-    list_entry.save()
+    list_entry = ListEntry.objects.select_related("person").get(pk=listentry_id)
+    res = ScrapeResult.objects.filter(list_entry=list_entry, source=kind).values_list("payload", flat=True).first()
+    matcher = NameMatcher(list_entry.person.name, list_entry.person.first_name, list_entry.person.alternative_names)
+    list_entry.columns_scrape[kind] = scrape_columns(kind, res, matcher)
+    list_entry.save(update_fields=["columns_scrape", "last_updated"])
 
     return f"created scrape columns for {listentry_id}"
 
@@ -135,168 +152,119 @@ def create_columns(listentry_id, kind="obv"):
 def create_entries(
     entries, listentry_id, scrape_id, *args, kind="obv", multi=True, **kwargs
 ):
-    list_entry = ListEntry.objects.get(pk=listentry_id)
-    if multi:
-        list_entry.scrape[kind].append(entries)
-    else:
-        list_entry.scrape[kind] = entries
-    list_entry.save()
-    create_columns.delay(listentry_id, kind)
+    write_scrape(listentry_id, kind, entries, multi=multi)
     return f"created scrape entries for {scrape_id} / {kind}"
 
 
-@shared_task(
-    time_limit=1000, queue="limited_queue", routing_key="limited_queue.get_obv"
-)
+@shared_task(time_limit=1000)
 def get_obv_records(
-    gnd, name, pers_id, listentry_id, scrape_id, *args, limit=50, **kwargs
+    gnd, name, pers_id, listentry_id, scrape_id, *args, limit=50, force_refresh=False, **kwargs
 ):
     print(f"searching obv: {gnd}")
-    token = requests.get(
-        "https://search.obvsg.at/primo_library/libweb/webservices/rest/v1/guestJwt/OBV?isGuest=true&lang=de_DE&targetUrl=https%3A%2F%2Fsearch.obvsg.at%2Fprimo-explore%2Fsearch%3Fvid%3DOBV&viewId=OBV"
-    ).json()
-
-    url = "https://search.obvsg.at/primo_library/libweb/webservices/rest/primo-explore/v1/pnxs"
-
-    querystring = {
-        "blendFacetsSeparately": "false",
-        "getMore": "0",
-        "inst": "OBV",
-        "lang": "de_DE",
-        "limit": limit,
-        "mode": "advanced",
-        "newspapersActive": "false",
-        "newspapersSearch": "false",
-        "offset": "0",
-        "pcAvailability": "false",
-        "q": f"any,contains,{gnd},AND",
-        "qExclude": "",
-        "qInclude": "",
-        "refEntryActive": "false",
-        "rtaLinks": "false",
-        "scope": "OBV_Gesamt",
-        "skipDelivery": "Y",
-        "sort": "rank",
-        "tab": "default_tab",
-        "vid": "OBV",
-    }
-    headers = {"authorization": f"Bearer {token}"}
-    response = requests.request("GET", url, headers=headers, params=querystring)
-    if response.status_code == 200:
-        res = response.json()
-        fin = []
-        for r in res["docs"]:
-            fin.append(r["pnx"]["display"])
-        res_nb = int(res["info"]["total"])
-        pages = math.ceil(res_nb / limit)
-        if pages < 1:
-            pages = 1
-        pg = 1
-        while pg <= pages:
-            querystring["offset"] = limit * (pg - 1)
-            response = requests.request("GET", url, headers=headers, params=querystring)
-            if response.status_code == 200:
-                res = response.json()
-                for r in res["docs"]:
-                    fin.append(r["pnx"]["display"])
-            pg += 1
-            time.sleep(random.randrange(2, 5))
-        create_entries.delay(fin, listentry_id, scrape_id, multi=False)
-    time.sleep(random.randrange(2, 8))
-
-    return f"obv resolved for {gnd}"
+    try:
+        fin = cached(
+            "obv",
+            {"gnd": gnd, "limit": limit},
+            lambda: search_obv_records(gnd, limit=limit),
+            force_refresh=force_refresh,
+        )
+    except (ScrapeCacheMiss, ObvPageError, ObvTokenError) as e:
+        return str(e)
+    if fin is not None:
+        write_scrape(listentry_id, "obv", fin)
+
+    return f"obv resolved for {gnd} (token cache {obv_token_stats.snapshot()})"
 
 
 @shared_task(time_limit=1000)
 def get_wikipedia_entry(
-    url, gnd, name, pers_id, listentry_id, scrape_id, *args, **kwargs
+    url, gnd, name, pers_id, listentry_id, scrape_id, *args, mode=None, force_refresh=False, **kwargs
 ):
+    if mode is None:
+        mode = getattr(settings, "RESEARCH_WIKIPEDIA_MODE", "api")
     try:
-        url_version_hist = f"https://de.wikipedia.org/w/index.php?title={url.split('/')[-1]}&offset=&limit=500&action=history"
-        vers_hist_page = requests.get(url_version_hist)
-        tree_vers_hist = html.fromstring(vers_hist_page.content)
-        vers_hist_entries = tree_vers_hist.xpath('//*[@id="pagehistory"]/ul/li')
-        count_vers = len(vers_hist_entries)
-        count_editors = [
-            x.xpath('.//span[@class="history-user"]/a/@href')[0]
-            for x in vers_hist_entries
-        ]
-        count_editors = len(list(dict.fromkeys(count_editors)))
-        next_link = tree_vers_hist.xpath('//*[@id="mw-content-text"]/a[@rel="next"]')
-        print(next_link)
-        while len(next_link) > 0:
-            vers_hist_page = requests.get(
-                "https://de.wikipedia.org" + next_link[0].get("href")
-            )
-            print(vers_hist_page)
-            tree_vers_hist = html.fromstring(vers_hist_page.content)
-            vers_hist_entries = tree_vers_hist.xpath('//*[@id="pagehistory"]/ul/li')
-            count_vers += len(vers_hist_entries)
-            count_editors_1 = [
-                x.xpath('.//span[@class="history-user"]/a/@href')[0]
-                for x in vers_hist_entries
-            ]
-            count_editors += len(list(dict.fromkeys(count_editors_1)))
-            next_link = tree_vers_hist.xpath(
-                '//*[@id="mw-content-text"]/a[@rel="next"]'
-            )
-            print(next_link)
-        print(count_vers)
-    except Exception as e:
-        print(e)
-        count_editors = "Not available"
-        count_vers = "Not available"
-    page = requests.get(url)
-    tree = html.fromstring(page.content)
-    txt = tree.xpath('.//div[@class="mw-parser-output"]')[0].text_content()
-    fin = {"edits_count": count_vers, "number_of_editors": count_editors, "txt": txt}
-    create_entries.delay(fin, listentry_id, scrape_id, kind="wikipedia", multi=False)
+        fin = cached(
+            "wikipedia",
+            {"url": url, "mode": mode},
+            lambda: get_wikipedia_statistics(url, mode=mode),
+            force_refresh=force_refresh,
+        )
+    except ScrapeCacheMiss as e:
+        return str(e)
+    write_scrape(listentry_id, "wikipedia", fin)
 
     return f"wikipedia resolved for {url}"
 
 
-@shared_task(time_limit=1000)
-def get_wikidata_records(gnd, name, pers_id, listentry_id, scrape_id, *args, **kwargs):
-    query = f"""
-    SELECT ?p ?pLabel ?date_of_birth ?date_of_death ?ndb ?loc ?viaf ?wiki_de ?parlAT ?wienWiki (GROUP_CONCAT(?ausz2;SEPARATOR=", ") AS ?auszeichnungen)
-        WHERE {{
-          ?p wdt:P227 "{gnd}".
-          OPTIONAL {{ ?p wdt:P7902 ?ndb }}
-          OPTIONAL {{ ?p wdt:P244 ?loc }}
-          OPTIONAL {{ ?p wdt:P2280 ?parlAT }}
-          OPTIONAL {{ ?p wdt:P7842 ?wienWiki }}
-          OPTIONAL {{ ?p wdt:P569 ?date_of_birth }}
-          OPTIONAL {{ ?p wdt:P570 ?date_of_death }}
-          OPTIONAL {{ ?p wdt:P214 ?viaf }}
-          OPTIONAL {{ ?wiki_de schema:about ?p .
-            ?wiki_de schema:inLanguage "de" .
-            ?wiki_de schema:isPartOf <https://de.wikipedia.org/> }}
-          OPTIONAL {{ ?p wdt:P166 ?ausz2 }}
-             SERVICE wikibase:label {{
-             bd:serviceParam wikibase:language "[AUTO_LANGUAGE], de" .
-           }}
-          }}
-        GROUP BY ?p ?pLabel ?date_of_birth ?date_of_death ?ndb ?loc ?viaf ?wiki_de ?parlAT ?wienWiki
+@shared_task(time_limit=2000)
+def get_wikipedia_entries(entries, scrape_id, *args, force_refresh=False, **kwargs):
+    """Scrapes the wikipedia articles of many list entries, chained after the wikidata scrape in dispatch_scrapes
+
+    Running inside the chord of the batch, the results are written while the claims on the GNDs
+    are held, so they reach every entry waiting on the claims. A failed article is skipped
+    instead of failing the chord.
+
+    Args:
+        entries (list): (url, gnd, name, pers_id, listentry_id) of every article
+        scrape_id (str): id of the job the scrapes belong to
+        force_refresh (bool, optional): bypass the scrape cache. Defaults to False.
     """
-    sparqlwd = SPARQLWrapper("https://query.wikidata.org/sparql")
-    sparqlwd.setQuery(query)
-    sparqlwd.setReturnFormat(JSON)
-    results = sparqlwd.query().convert()
-    fin = dict()
-    if len(results["results"]["bindings"]) > 0:
-        for k, v in results["results"]["bindings"][0].items():
-            fin[k] = v["value"]
-        create_entries.delay(fin, listentry_id, scrape_id, kind="wikidata", multi=False)
+    failed = []
+    for url, gnd, name, pers_id, listentry_id in entries:
+        try:
+            get_wikipedia_entry(url, gnd, name, pers_id, listentry_id, scrape_id, force_refresh=force_refresh)
+        except Exception as e:
+            failed.append(f"{url}: {e}")
+    return f"wikipedia resolved for {len(entries) - len(failed)} of {len(entries)} articles, failed: {failed}"
+
+
+@shared_task(time_limit=1000)
+def get_wikidata_records(gnd, name, pers_id, listentry_id, scrape_id, *args, force_refresh=False, **kwargs):
+    results, failed = query_wikidata_cached([gnd], force_refresh=force_refresh)
+    fin = results.get(gnd)
+    if fin:
+        write_scrape(listentry_id, "wikidata", fin)
         if "wiki_de" in fin.keys() and kwargs["include_wikipedia"]:
-            get_wikipedia_entry.delay(
-                fin["wiki_de"], gnd, name, pers_id, listentry_id, scrape_id
+            # in this task, so the article is written before the claim on the GND is released
+            return get_wikipedia_entries(
+                [(fin["wiki_de"], gnd, name, pers_id, listentry_id)], scrape_id, force_refresh=force_refresh
             )
     return f"wikidata resolved for {gnd}"
 
 
+@shared_task(time_limit=1000)
+def get_wikidata_records_batch(entries, scrape_id, *args, include_wikipedia=True, force_refresh=False, **kwargs):
+    """Resolves the GNDs of many list entries with batched SPARQL queries
+
+    Args:
+        entries (list): (gnd, name, pers_id, listentry_id) of every list entry
+        scrape_id (str): id of the job the scrapes belong to
+        include_wikipedia (bool, optional): collect the german wikipedia articles. Defaults to True.
+        force_refresh (bool, optional): bypass the scrape cache. Defaults to False.
+
+    Returns:
+        list: (url, gnd, name, pers_id, listentry_id) of the wikipedia articles for get_wikipedia_entries,
+            which dispatch_scrapes chains after this task
+    """
+    results, failed = query_wikidata_cached([entry[0] for entry in entries], force_refresh=force_refresh)
+    articles = []
+    for gnd, name, pers_id, listentry_id in entries:
+        fin = results.get(gnd)
+        if not fin:
+            continue
+        write_scrape(listentry_id, "wikidata", fin)
+        if "wiki_de" in fin.keys() and include_wikipedia:
+            articles.append((fin["wiki_de"], gnd, name, pers_id, listentry_id))
+    print(f"wikidata resolved {len(results)} of {len(entries)} GNDs, {len(failed)} failed")
+    return articles
+
+
 default_scrapes = [get_wikidata_records, get_obv_records]
 scrapes_names = ["obv", "wikipedia", "wikidata"]
+scrape_sources = {get_obv_records.name: "obv", get_wikidata_records.name: "wikidata"}
 system_cols = ["id", "gnd", "firstName", "lastName", "dateOfBirth", "dateOfDeath"]
+INGEST_BATCH_SIZE = 1000
+RESEARCH_CHUNK_SIZE = 250
 
 
 def normalize_date(date: Union[str, None]) -> Union[datetime.date, None]:
@@ -310,6 +278,236 @@ def normalize_date(date: Union[str, None]) -> Union[datetime.date, None]:
             return None
 
 
+def normalize_lemma(idx: int, ent: dict) -> Tuple[dict, dict, typing.List[str]]:
+    """Splits an uploaded lemma into the kwargs for IRSPerson and ListEntry
+
+    Args:
+        idx (int): position of the lemma in the upload, used as fallback source_id
+        ent (dict): the lemma as posted by the frontend
+
+    Returns:
+        Tuple[dict, dict, List[str]]: person kwargs, list entry kwargs and the GNDs of the lemma
+    """
+    ent_dict = {
+        "first_name": ent.get("firstName", "-"),
+        "name": ent.get("lastName", "-"),
+        "date_of_birth": normalize_date(ent.get("dateOfBirth", None)),
+        "date_of_death": normalize_date(ent.get("dateOfDeath", None)),
+        "gender": ent.get("gender", None),
+        "alternative_names": ent.get("alternativeNames", []),
+        "uris": [],
+    }
+    gnds = []
+    if "gnd" in ent.keys():
+        if isinstance(ent["gnd"], str):
+            ent["gnd"] = [ent["gnd"]]
+        for g in ent["gnd"]:
+            ent_dict["uris"].append(f"https://d-nb.info/gnd/{g}/")
+            gnds.append(g)
+    list_entry_dict = dict()
+    dict_user_cols = {}
+    for k, v in ent.items():
+        if k not in system_cols:
+            dict_user_cols[k] = v
+    list_entry_dict["columns_user"] = dict_user_cols
+    if "id" in ent.keys():
+        list_entry_dict["source_id"] = ent["id"] if ent["id"] > 0 else idx
+    else:
+        list_entry_dict["source_id"] = idx
+    list_entry_dict["selected"] = ent.get("selected", False)
+    list_entry_dict["columns_scrape"] = {
+        "obv": [],
+        "wikipedia": [],
+        "wikidata": [],
+    }
+    return ent_dict, list_entry_dict, gnds
+
+
+def _person_key(values: dict) -> tuple:
+    """Hashable key over all fields used to match an uploaded lemma to an existing IRSPerson"""
+    key = []
+    for field in ("first_name", "name", "date_of_birth", "date_of_death", "gender", "alternative_names", "uris"):
+        value = values[field]
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        elif isinstance(value, (list, dict)):
+            value = json.dumps(value, sort_keys=True)
+        key.append(value)
+    return tuple(key)
+
+
+def ingest_lemmas(
+    lemmas: typing.List[dict],
+    list_id: int,
+    batch_size: int = INGEST_BATCH_SIZE,
+    offset: int = 0,
+    failed_rows: typing.Optional[typing.List[dict]] = None,
+    research_job_id: typing.Optional[int] = None,
+) -> typing.List[tuple]:
+    """Creates IRSPerson and ListEntry objects for an upload with a constant number of queries per batch
+
+    All lemmas are normalized up front, existing persons are resolved with set based lookups
+    (same semantics as IRSPerson.objects.get_or_create on all fields) and the missing persons as well
+    as the list entries are written with bulk_create.
+
+    Args:
+        lemmas (List[dict]): lemmas as posted by the frontend
+        list_id (int): pk of the List the entries are added to
+        batch_size (int, optional): size of the lookup and insert batches. Defaults to INGEST_BATCH_SIZE.
+        offset (int, optional): position of the first lemma in the whole upload. Defaults to 0.
+        failed_rows (List[dict], optional): if given, lemmas that can not be normalized are skipped
+            and reported in this list instead of raising. Defaults to None.
+        research_job_id (int, optional): pk of the ResearchJob the entries are created by, used
+            to report their progress (see progress). Defaults to None.
+
+    Returns:
+        List[tuple]: (gnds, lemma, person, list_entry) for every ingested lemma in upload order
+    """
+    normalized = []
+    for idx, ent in enumerate(lemmas, start=offset):
+        try:
+            normalized.append((ent, normalize_lemma(idx, ent)))
+        except Exception as e:
+            if failed_rows is None:
+                raise
+            failed_rows.append({"row": idx, "error": str(e)})
+    persons = {}
+    names = list({ent_dict["name"] for _, (ent_dict, _, _) in normalized})
+    for i in range(0, len(names), batch_size):
+        for pers in IRSPerson.objects.filter(name__in=names[i:i + batch_size]).order_by("pk"):
+            persons.setdefault(_person_key(pers.__dict__), pers)
+    new_persons = []
+    for _, (ent_dict, _, _) in normalized:
+        key = _person_key(ent_dict)
+        if key not in persons:
+            # bulk_create does not call save, the trigger sets gnds in the database only
+            persons[key] = IRSPerson(gnds=gnds_from_uris(ent_dict["uris"]), **ent_dict)
+            new_persons.append(persons[key])
+    with transaction.atomic():
+        IRSPerson.objects.bulk_create(new_persons, batch_size=batch_size)
+        entries = []
+        for _, (ent_dict, list_entry_dict, _) in normalized:
+            entries.append(
+                ListEntry(
+                    person=persons[_person_key(ent_dict)],
+                    list_id=list_id,
+                    research_job_id=research_job_id,
+                    **list_entry_dict,
+                )
+            )
+        ListEntry.objects.bulk_create(entries, batch_size=batch_size)
+        ListEntryChange.log([entry.pk for entry in entries])
+    return [
+        (gnds, ent, entry.person, entry)
+        for (ent, (_, _, gnds)), entry in zip(normalized, entries)
+    ]
+
+
+def _lemma_name(ent: dict) -> str:
+    return f"{ent.get('lastName', '-')}, {ent.get('firstName', '-')}"
+
+
+@shared_task(time_limit=500)
+def release_scrape_claims(ccc, claim_id, gnds, listentry_id):
+    """Chord callback of dispatch_scrapes: releases the claims on gnds and notifies the frontend
+
+    All entries that waited on the claims are finished together with listentry_id, those that
+    joined while the claims were held get the results they missed copied first.
+    """
+    waiting, copied = release_claims(claim_id, gnds)
+    finished = list(listentry_id) + [pk for pk in waiting if pk not in listentry_id]
+    record_progress(finished, DONE)
+    notify(finished)
+    return f"released {len(gnds)} GNDs of {claim_id}, copied results to {len(copied)} list entries"
+
+
+def dispatch_scrapes(
+    ingested: typing.List[tuple], scrape_id: str, scrapes=default_scrapes, wiki: bool = True, force_refresh: bool = False
+):
+    """Starts the scrapers for ingested lemmas with exactly one GND and notifies the others right away
+
+    Scrapes are coalesced by GND (see dedup): every GND is scraped once for all list entries
+    of the upload that share it, GNDs currently scraped by another job are not scraped again,
+    the entries wait for that job instead. The requests saved are counted per source.
+
+    If get_wikidata_records is among the scrapes, wikidata is resolved for batches of
+    RESEARCH_WIKIDATA_BATCH_SIZE GNDs with get_wikidata_records_batch, followed by
+    get_wikipedia_entries for the articles found. Every batch is one chord of the wikidata (and
+    wikipedia) chain and the other scrapers per GND, releasing the claims and notifying the
+    frontend about the batch when done, so every source is written before its claims are released.
+
+    Args:
+        ingested (List[tuple]): (gnds, lemma, person, list_entry) as returned by ingest_lemmas
+        scrape_id (str): id of the job the scrapes belong to
+        scrapes (list, optional): scraper tasks to run. Defaults to default_scrapes.
+        wiki (bool, optional): whether to include wikipedia. Defaults to True.
+        force_refresh (bool, optional): bypass the scrape cache. Defaults to False.
+    """
+    by_gnd = {}
+    obj_save = []
+    for gnds, ent, pers, list_entry in ingested:
+        if len(gnds) == 1:
+            by_gnd.setdefault(gnds[0], []).append((ent, pers, list_entry))
+        else:
+            obj_save.append(list_entry)
+    if len(obj_save) > 0:
+        record_progress([x.pk for x in obj_save], DONE)
+        notify([x.pk for x in obj_save])
+    claim_id = str(uuid.uuid4())
+    claimed, joined = claim_gnds({gnd: [x[2].pk for x in entries] for gnd, entries in by_gnd.items()}, claim_id)
+    waiting = sum(len(by_gnd[gnd]) - 1 for gnd in claimed) + sum(len(ids) for ids in joined.values())
+    sources = [scrape_sources.get(scr.name, scr.name) for scr in scrapes]
+    if wiki and get_wikidata_records in scrapes:
+        sources.append("wikipedia")
+    record_saved({source: waiting for source in sources})
+    # (gnd, lemma, person, list entry ids) of the first list entry of every claimed GND
+    obj_scrape = [
+        (gnd, by_gnd[gnd][0][0], by_gnd[gnd][0][1], [x[2].pk for x in by_gnd[gnd]])
+        for gnd in by_gnd
+        if gnd in claimed
+    ]
+    batch_wikidata = get_wikidata_records in scrapes
+    if batch_wikidata:
+        batch_size = getattr(settings, "RESEARCH_WIKIDATA_BATCH_SIZE", WIKIDATA_BATCH_SIZE)
+        scrapes = [scr for scr in scrapes if scr is not get_wikidata_records]
+    else:
+        batch_size = 1
+    header = []
+    for i in range(0, len(obj_scrape), batch_size):
+        batch = obj_scrape[i:i + batch_size]
+        sigs = [
+            scr.s(
+                entry[0],
+                _lemma_name(entry[1]),
+                entry[2].pk,
+                entry[3],
+                scrape_id,
+                include_wikipedia=wiki,
+                force_refresh=force_refresh,
+            )
+            for entry in batch
+            for scr in scrapes
+        ]
+        if batch_wikidata:
+            wikidata = get_wikidata_records_batch.s(
+                [(entry[0], _lemma_name(entry[1]), entry[2].pk, entry[3]) for entry in batch],
+                scrape_id,
+                include_wikipedia=wiki,
+                force_refresh=force_refresh,
+            )
+            if wiki:
+                wikidata = chain(wikidata, get_wikipedia_entries.s(scrape_id, force_refresh=force_refresh))
+            sigs.insert(0, wikidata)
+        header.append(
+            chord(
+                sigs,
+                release_scrape_claims.s(claim_id, [entry[0] for entry in batch], [pk for entry in batch for pk in entry[3]]),
+            )
+        )
+    res = group(header)()
+    return claimed, joined
+
+
 @shared_task(time_limit=2000, bind=True)
 def scrape(
     self,
@@ -320,82 +518,153 @@ def scrape(
     wiki=True,
     update=False,
     gnd_job=False,
+    force_refresh=False,
 ):
     scrape_id = self.request.id
-    obj_scrape = []
-    obj_save = []
-    lst = List.objects.get(pk=list_id)
-    for idx, ent in enumerate(obj["lemmas"]):
-        if not update:
-            test_gnd = False #TODO: move to dedicated serializer function
-            ent_dict = {
-                "first_name": ent.get("firstName", "-"),
-                "name": ent.get("lastName", "-"),
-                "date_of_birth": normalize_date(ent.get("dateOfBirth", None)),
-                "date_of_death": normalize_date(ent.get("dateOfDeath", None)),
-                "gender": ent.get("gender", None),
-                "alternative_names": ent.get("alternativeNames", []),
-                "uris": [],
-            }
-            if "gnd" in ent.keys():
-                gnds = []
-                if isinstance(ent["gnd"], str):
-                    ent["gnd"] = [ent["gnd"]]
-                for g in ent["gnd"]:
-                    ent_dict["uris"].append(f"https://d-nb.info/gnd/{g}/")
-                    gnds.append(g)
-                if len(gnds) == 1:
-                    test_gnd = True
-            list_entry_dict = dict()
-            dict_user_cols = {}
-            for k, v in ent.items():
-                if k not in system_cols:
-                    dict_user_cols[k] = v
-            list_entry_dict["columns_user"] = dict_user_cols
-            if "id" in ent.keys():
-                list_entry_dict["source_id"] = ent["id"] if ent["id"] > 0 else idx
-            else:
-                list_entry_dict["source_id"] = idx
-            pers, created = IRSPerson.objects.get_or_create(**ent_dict)
-            list_entry_dict["person_id"] = pers.pk
-            list_entry_dict["list_id"] = lst.pk
-            list_entry_dict["selected"] = ent.get("selected", False)
-            list_entry_dict["columns_scrape"] = {
-                "obv": [],
-                "wikipedia": [],
-                "wikidata": [],
-            }
-            list_entry_dict["scrape"] = {"obv": [], "wikipedia": [], "wikidata": []}
-            list_entry = ListEntry.objects.create(**list_entry_dict)
-        if update:
-            list_entry = ListEntry.objects.get(pk=update)
-            pers = list_entry.person
-            gnds = gnd_job
-            test_gnd = len(gnds) == 1
-        if test_gnd:
-            obj_scrape.append((gnds[0], ent, pers, list_entry))
-        else:
-            obj_save.append(list_entry)
-    if len(obj_save) > 0:
-        res_obj_save = post_results.delay("test", listentry_id=[x.pk for x in obj_save])
-    res = group(
-        chord(
-            (
-                scr.s(
-                    entry[0],
-                    f"{entry[1].get('lastName', '-')}, {entry[1].get('firstName', '-')}",
-                    entry[2].pk,
-                    entry[3].pk,
-                    scrape_id,
-                    include_wikipedia=wiki,
+    if update:
+        list_entry = ListEntry.objects.get(pk=update)
+        ingested = [(gnd_job, obj["lemmas"][0], list_entry.person, list_entry)]
+    else:
+        lst = List.objects.get(pk=list_id)
+        ingested = ingest_lemmas(obj["lemmas"], lst.pk)
+    dispatch_scrapes(ingested, scrape_id, scrapes=scrapes, wiki=wiki, force_refresh=force_refresh)
+    return f"started job for {user_id}"
+
+
+def _ingested_entries(listentry_ids: typing.List[int]) -> typing.List[tuple]:
+    """(gnds, lemma, person, list_entry) of existing list entries, as returned by ingest_lemmas"""
+    return [
+        (
+            entry.person.gnds,
+            {"firstName": entry.person.first_name, "lastName": entry.person.name},
+            entry.person,
+            entry,
+        )
+        for entry in ListEntry.objects.filter(pk__in=listentry_ids).select_related("person").order_by("pk")
+    ]
+
+
+@shared_task(time_limit=2000, bind=True)
+def rescrape_entries(self, listentry_ids: typing.List[int], force_refresh: bool = False):
+    """Scrapes the list entries again, e.g. after a bulk update changed the GNDs of their persons"""
+    ingested = _ingested_entries(listentry_ids)
+    dispatch_scrapes(ingested, self.request.id, force_refresh=force_refresh)
+    return f"started scrapes of {len(ingested)} list entries"
+
+
+@shared_task(time_limit=500)
+def prune_research_job_events():
+    """Periodic: deletes the progress events of old research jobs, see progress.prune_events"""
+    return f"deleted {prune_events()} research job events"
+
+
+@shared_task(time_limit=500)
+def prune_list_entry_changes():
+    """Periodic: deletes the change log of the sync endpoint older than RESEARCH_SYNC_RETENTION, see sync.prune_changes"""
+    return f"deleted {prune_changes()} list entry changes"
+
+
+@shared_task(time_limit=500)
+def sweep_scrape_claims():
+    """Periodic: dispatches the list entries of abandoned scrape claims again, see dedup.expire_claims"""
+    listentry_ids = expire_claims()
+    if listentry_ids:
+        rescrape_entries.delay(listentry_ids)
+    return f"dispatched {len(listentry_ids)} list entries of abandoned scrape claims again"
+
+
+def upload_fingerprint(obj: dict, list_id: int) -> str:
+    """sha256 over the list and the lemmas of an upload"""
+    payload = json.dumps({"listId": list_id, "lemmas": obj["lemmas"]}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def start_research_job(obj: dict, user_id: int, list_id: int, wiki: bool = True) -> ResearchJob:
+    """Splits an upload into chunks of RESEARCH_CHUNK_SIZE lemmas and dispatches one scrape_chunk task per chunk
+
+    A re-submitted upload (same list and lemmas) resumes the existing job while it is not finished:
+    finished chunks are skipped and only chunks that never finished and are not currently running
+    are dispatched again. Once all chunks of a job are finished, the same upload starts a new job.
+
+    Args:
+        obj (dict): the upload as posted by the frontend
+        user_id (int): pk of the uploading user
+        list_id (int): pk of the List the lemmas are added to
+        wiki (bool, optional): whether to include wikipedia. Defaults to True.
+
+    Returns:
+        ResearchJob: the (new or resumed) job
+    """
+    chunk_size = getattr(settings, "RESEARCH_CHUNK_SIZE", RESEARCH_CHUNK_SIZE)
+    lemmas = obj["lemmas"]
+    with transaction.atomic():
+        job, created = ResearchJob.objects.get_or_create(
+            fingerprint=upload_fingerprint(obj, list_id),
+            finished__isnull=True,
+            defaults={
+                "list_id": list_id,
+                "user_id": user_id,
+                "wiki": wiki,
+                "total_chunks": max(math.ceil(len(lemmas) / chunk_size), 1),
+            },
+        )
+        if created:
+            ResearchJobChunk.objects.bulk_create(
+                ResearchJobChunk(
+                    job=job,
+                    index=idx,
+                    offset=idx * chunk_size,
+                    lemmas=lemmas[idx * chunk_size:(idx + 1) * chunk_size],
                 )
-                for scr in scrapes
-            ),
-            post_results.s(entry[3].pk),
+                for idx in range(job.total_chunks)
+            )
+        stale = timezone.now() - datetime.timedelta(seconds=scrape_chunk.time_limit)
+        pending = list(
+            job.chunks.select_for_update()
+            .filter(finished__isnull=True)
+            .filter(Q(dispatched__isnull=True) | Q(dispatched__lt=stale))
+            .values_list("pk", flat=True)
         )
-        for entry in obj_scrape
-    )()
-    return f"started job for {user_id}"
+        ResearchJobChunk.objects.filter(pk__in=pending).update(dispatched=timezone.now())
+    for chunk_id in pending:
+        scrape_chunk.delay(chunk_id)
+    return job
+
+
+@shared_task(time_limit=2000)
+def scrape_chunk(chunk_id):
+    """Ingests a chunk of a research job and dispatches the scrapes of its entries
+
+    The chunk is ingested in one transaction and finished only after the scrapes are
+    dispatched, so a chunk whose worker died in between is retried (see start_research_job)
+    and dispatches the entries it ingested before again.
+    """
+    failed_rows = []
+    with transaction.atomic():
+        chunk = ResearchJobChunk.objects.select_for_update().select_related("job").get(pk=chunk_id)
+        if chunk.finished is not None:
+            return f"chunk {chunk.index} of job {chunk.job.job_id} already finished"
+        if chunk.listentry_ids is None:
+            ingested = ingest_lemmas(
+                chunk.lemmas, chunk.job.list_id, offset=chunk.offset, failed_rows=failed_rows, research_job_id=chunk.job.pk
+            )
+            chunk.listentry_ids = [entry.pk for _, _, _, entry in ingested]
+            chunk.failed_rows = failed_rows
+            chunk.lemmas = None
+            chunk.save()
+            # the job row is locked with the chunk, so the counters of concurrent chunks add up
+            ResearchJob.objects.filter(pk=chunk.job_id).update(total_entries=F("total_entries") + len(ingested))
+        else:
+            ingested = _ingested_entries(chunk.listentry_ids)
+    dispatch_scrapes(ingested, str(chunk.job.job_id), wiki=chunk.job.wiki)
+    with transaction.atomic():
+        now = timezone.now()
+        if ResearchJobChunk.objects.filter(pk=chunk.pk, finished__isnull=True).update(finished=now):
+            ResearchJob.objects.filter(pk=chunk.job_id).update(chunks_done=F("chunks_done") + 1)
+            ResearchJob.objects.filter(
+                pk=chunk.job_id, finished__isnull=True, chunks_done__gte=F("total_chunks")
+            ).update(finished=now)
+    return f"ingested chunk {chunk.index} of job {chunk.job.job_id} ({len(chunk.failed_rows)} failed rows)"
 
 
 class EntityAlreadyExists(Exception):
@@ -439,13 +708,11 @@ def move_research_lemmas_to_workflow(editor_id, lst_research_lemmas, issue=None)
     #    issue = issue1.pk
     p_list = []
     le_list = []
+    entries = ListEntry.objects.select_related("person").in_bulk(lst_research_lemmas)
     for lm in lst_research_lemmas:
-        le = ListEntry.objects.get(pk=lm)
+        le = entries[lm]
         le_list.append(le.pk)
-        gnd = False
-        for uri in le.person.uris:
-            if "d-nb.info" in uri:
-                gnd = uri
+        gnd = gnd_uri(le.person.gnds[-1]) if le.person.gnds else False
         person_attrb = le.get_dict()
         p_list.append((editor_id, le.person_id, gnd, person_attrb, issue))
     res = chord(
@@ -0,0 +1,98 @@
+"""
+Test oebl_research_backend.columns and tasks.write_scrape
+"""
+from django.test import SimpleTestCase, TestCase as DjangoTestCase
+
+from oebl_research_backend.columns import NameMatcher, normalize_name, obv_columns, recompute_list_columns, scrape_columns
+from oebl_research_backend.models import List, ListEntry, ScrapeResult
+from oebl_research_backend.tasks import ingest_lemmas, write_scrape
+from .test_ingest import create_lemma
+
+
+class ObvColumnsTestCase(SimpleTestCase):
+
+    def test_counts(self):
+        records = [
+            {"creator": ["Schubert, Franz", "Müller, Wilhelm"]},
+            {"creator": ["Schubert, Franz"]},
+            {"creator": ["Kreissle, Heinrich"]},
+            {"contributor": ["Deutsch, Otto Erich", "Schubert, Franz"]},
+        ]
+        cols = obv_columns(records, NameMatcher("Schubert"))
+        self.assertEqual(cols["count_obv"], 4)
+        self.assertEqual(cols["count_author"], 2)
+        self.assertEqual(cols["list_coauthors"], ["Müller, Wilhelm"])
+        self.assertEqual(cols["count_topic"], 2)
+        self.assertEqual(cols["list_topic_authors"], ["Kreissle, Heinrich", "Deutsch, Otto Erich"])
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("Schubert, Franz, 1797-1828 [KomponistIn]$$QSchubert, Franz"), "schubert, franz")
+        self.assertEqual(normalize_name("  MÜLLER,  Wilhelm (Dichter)"), "müller, wilhelm")
+
+    def test_short_surnames_do_not_match_longer_names(self):
+        matcher = NameMatcher("Bach", "Johann Sebastian")
+        self.assertTrue(matcher.matches(normalize_name("Bach, Johann Sebastian, 1685-1750")))
+        self.assertTrue(matcher.matches(normalize_name("Bach, J. S.")))
+        self.assertFalse(matcher.matches(normalize_name("Bacher, Hans")))
+        self.assertFalse(matcher.matches(normalize_name("Bach, Carl Philipp Emanuel")))
+
+    def test_alternative_names(self):
+        matcher = NameMatcher("Lenau", "Nikolaus", [{"firstName": "Nikolaus", "lastName": "Niembsch von Strehlenau"}])
+        cols = obv_columns([{"creator": ["Niembsch von Strehlenau, Nikolaus"]}], matcher)
+        self.assertEqual(cols["count_author"], 1)
+
+    def test_duplicates_are_counted_once(self):
+        records = [
+            {"creator": ["Schubert, Franz", "Müller, Wilhelm, 1794-1827"]},
+            {"creator": ["Schubert, Franz", "MÜLLER, Wilhelm"]},
+        ]
+        cols = obv_columns(records, NameMatcher("Schubert", "Franz"))
+        self.assertEqual(cols["count_coauthor"], 1)
+        self.assertEqual(cols["list_coauthors"], ["Müller, Wilhelm, 1794-1827"])
+
+    def test_other_kinds_are_copied(self):
+        self.assertEqual(scrape_columns("wikidata", {"pLabel": "Person"}, NameMatcher("Person")), {"pLabel": "Person"})
+
+
+class WriteScrapeTestCase(DjangoTestCase):
+
+    def setUp(self) -> None:
+        self.list = List.objects.create(title="Liste")
+        ingested = ingest_lemmas([create_lemma(1, lastName="Schubert")], self.list.pk)
+        self.list_entry = ingested[0][3]
+
+    def test_scrape_and_columns_written_together(self):
+        # savepoint, claims lookup, upsert, person names, update, change log, release savepoint
+        with self.assertNumQueries(7):
+            write_scrape(self.list_entry.pk, "obv", [{"creator": ["Schubert, Vorname 1"]}])
+        self.list_entry.refresh_from_db()
+        self.assertEqual(self.list_entry.scrape["obv"], [{"creator": ["Schubert, Vorname 1"]}])
+        self.assertEqual(self.list_entry.columns_scrape["obv"]["count_author"], 1)
+
+    def test_multi_appends(self):
+        write_scrape(self.list_entry.pk, "obv", {"creator": ["A"]}, multi=True)
+        write_scrape(self.list_entry.pk, "obv", {"creator": ["B"]}, multi=True)
+        self.list_entry.refresh_from_db()
+        self.assertEqual(self.list_entry.columns_scrape["obv"]["count_obv"], 2)
+
+    def test_other_sources_are_kept(self):
+        write_scrape(self.list_entry.pk, "wikidata", {"pLabel": "Franz Schubert"})
+        write_scrape(self.list_entry.pk, "obv", [])
+        self.list_entry.refresh_from_db()
+        self.assertEqual(self.list_entry.scrape["wikidata"], {"pLabel": "Franz Schubert"})
+        self.assertEqual(self.list_entry.columns_scrape["wikidata"], {"pLabel": "Franz Schubert"})
+        self.assertEqual(self.list_entry.columns_scrape["obv"]["count_obv"], 0)
+
+    def test_missing_document(self):
+        ListEntry.objects.filter(pk=self.list_entry.pk).update(columns_scrape=None)
+        write_scrape(self.list_entry.pk, "wikipedia", {"edits_count": 3})
+        self.list_entry.refresh_from_db()
+        self.assertEqual(self.list_entry.scrape, {"wikipedia": {"edits_count": 3}})
+        self.assertEqual(self.list_entry.columns_scrape, {"wikipedia": {"edits_count": 3}})
+
+    def test_recompute_list_columns(self):
+        ScrapeResult.objects.create(list_entry=self.list_entry, source="obv", payload=[{"creator": ["Schubert, V."]}])
+        ListEntry.objects.filter(pk=self.list_entry.pk).update(columns_scrape={})
+        self.assertEqual(recompute_list_columns(self.list.pk), 1)
+        self.list_entry.refresh_from_db()
+        self.assertEqual(self.list_entry.columns_scrape["obv"]["count_author"], 1)
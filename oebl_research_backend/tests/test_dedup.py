@@ -0,0 +1,142 @@
+"""
+Test oebl_research_backend.dedup and the coalescing of scrapes in dispatch_scrapes
+"""
+import datetime
+from unittest import mock
+
+from django.test import TestCase as DjangoTestCase
+from django.utils import timezone
+
+from oebl_research_backend.dedup import claim_gnds, expire_claims, fan_out_targets, release_claims, requests_saved
+from oebl_research_backend.models import List, ScrapeClaim, ScrapeResult
+from oebl_research_backend.progress import DONE
+from oebl_research_backend.tasks import (
+    dispatch_scrapes,
+    get_obv_records,
+    get_wikipedia_entries,
+    ingest_lemmas,
+    release_scrape_claims,
+    sweep_scrape_claims,
+    write_scrape,
+)
+from .test_ingest import create_lemma
+
+
+@mock.patch("oebl_research_backend.tasks.notify")
+@mock.patch("oebl_research_backend.tasks.group")
+class DedupTestCase(DjangoTestCase):
+
+    def setUp(self) -> None:
+        self.list = List.objects.create(title="Liste")
+
+    def ingest(self, *idx) -> list:
+        return ingest_lemmas([create_lemma(x, id=n) for n, x in enumerate(idx)], self.list.pk)
+
+    def test_duplicates_in_upload_are_scraped_once(self, group, notify):
+        ingested = self.ingest(1, 1, 2)
+        claimed, joined = dispatch_scrapes(ingested, "job", scrapes=[get_obv_records], wiki=False)
+        self.assertEqual(sorted(claimed), ["118501", "118502"])
+        header = group.call_args[0][0][0].tasks
+        self.assertEqual(header[0].args[3], [ingested[0][3].pk, ingested[1][3].pk])
+        self.assertEqual(requests_saved(), {"obv": 1})
+
+    def test_in_flight_gnds_are_joined(self, group, notify):
+        first = self.ingest(1)
+        dispatch_scrapes(first, "job 1")
+        second = self.ingest(1, 2)
+        claimed, joined = dispatch_scrapes(second, "job 2")
+        self.assertEqual(claimed, ["118502"])
+        self.assertEqual(joined, {"118501": [second[0][3].pk]})
+        self.assertEqual(
+            ScrapeClaim.objects.get(gnd="118501").listentry_ids, [first[0][3].pk, second[0][3].pk]
+        )
+        self.assertEqual(requests_saved(), {"obv": 1, "wikidata": 1, "wikipedia": 1})
+
+    def test_results_are_fanned_out(self, group, notify):
+        first = self.ingest(1)
+        dispatch_scrapes(first, "job 1")
+        second = self.ingest(1)
+        dispatch_scrapes(second, "job 2")
+        leader, waiting = first[0][3], second[0][3]
+        self.assertEqual(fan_out_targets([leader.pk]), [leader.pk, waiting.pk])
+        self.assertEqual(write_scrape([leader.pk], "obv", [{"title": "Titel"}]), 2)
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.scrape["obv"], [{"title": "Titel"}])
+        self.assertEqual(waiting.columns_scrape["obv"]["count_obv"], 1)
+
+    @mock.patch("oebl_research_backend.tasks.record_progress")
+    def test_joined_entries_are_finished(self, record_progress, group, notify):
+        first = self.ingest(1)
+        dispatch_scrapes(first, "job 1")
+        second = self.ingest(1)
+        dispatch_scrapes(second, "job 2")
+        leader, waiting = first[0][3], second[0][3]
+        # the waiting entry got the results with the leader, there is nothing left to copy
+        write_scrape([leader.pk], "obv", [{"title": "Titel"}])
+        claim_id = ScrapeClaim.objects.get().claim_id
+        release_scrape_claims(None, claim_id, ["118501"], [leader.pk])
+        record_progress.assert_called_once_with([leader.pk, waiting.pk], DONE)
+        notify.assert_called_once_with([leader.pk, waiting.pk])
+
+    def test_release_copies_missed_results(self, group, notify):
+        first = self.ingest(1)
+        dispatch_scrapes(first, "job 1")
+        leader = first[0][3]
+        ScrapeResult.objects.create(list_entry=leader, source="wikidata", payload={"pLabel": "Person"})
+        second = self.ingest(1)
+        claim_id = ScrapeClaim.objects.get().claim_id
+        claim_gnds({"118501": [second[0][3].pk]}, "other")
+        self.assertEqual(
+            release_claims(claim_id, ["118501"]), ([second[0][3].pk], {second[0][3].pk: ["wikidata"]})
+        )
+        self.assertFalse(ScrapeClaim.objects.exists())
+        second[0][3].refresh_from_db()
+        self.assertEqual(second[0][3].scrape["wikidata"], {"pLabel": "Person"})
+        self.assertEqual(second[0][3].columns_scrape["wikidata"], {"pLabel": "Person"})
+
+    def test_wikipedia_is_chained_in_the_chord(self, group, notify):
+        dispatch_scrapes(self.ingest(1), "job")
+        wikidata = group.call_args[0][0][0].tasks[0]
+        self.assertEqual(
+            [sig.task for sig in wikidata.tasks],
+            ["oebl_research_backend.tasks.get_wikidata_records_batch", "oebl_research_backend.tasks.get_wikipedia_entries"],
+        )
+
+    @mock.patch("oebl_research_backend.tasks.get_wikipedia_statistics")
+    def test_wikipedia_reaches_waiting_entries(self, get_wikipedia_statistics, group, notify):
+        get_wikipedia_statistics.side_effect = [Exception("throttled"), {"edits_count": 3, "number_of_editors": 2, "txt": ""}]
+        first = self.ingest(1)
+        dispatch_scrapes(first, "job 1")
+        second = self.ingest(1)
+        dispatch_scrapes(second, "job 2")
+        leader, waiting = first[0][3], second[0][3]
+        articles = [(f"https://de.wikipedia.org/wiki/{x}", "118501", "Name", leader.person_id, [leader.pk]) for x in "AB"]
+        self.assertIn("1 of 2 articles", get_wikipedia_entries(articles, "job 1", force_refresh=True))
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.scrape["wikipedia"]["edits_count"], 3)
+
+    @mock.patch("oebl_research_backend.tasks.rescrape_entries")
+    def test_abandoned_claims_are_dispatched_again(self, rescrape_entries, group, notify):
+        first = self.ingest(1, 2)
+        dispatch_scrapes(first, "job 1")
+        second = self.ingest(1)
+        dispatch_scrapes(second, "job 2")
+        self.assertEqual(expire_claims(), [])
+        ScrapeClaim.objects.filter(gnd="118501").update(created=timezone.now() - datetime.timedelta(hours=2))
+        sweep_scrape_claims()
+        rescrape_entries.delay.assert_called_once_with([first[0][3].pk, second[0][3].pk])
+        self.assertEqual(list(ScrapeClaim.objects.values_list("gnd", flat=True)), ["118502"])
+
+    def test_abandoned_claims_are_taken_over_with_their_entries(self, group, notify):
+        first = self.ingest(1)
+        dispatch_scrapes(first, "job 1")
+        second = self.ingest(1)
+        dispatch_scrapes(second, "job 2")
+        ScrapeClaim.objects.update(created=timezone.now() - datetime.timedelta(hours=2))
+        third = self.ingest(1)
+        claimed, joined = dispatch_scrapes(third, "job 3")
+        self.assertEqual((claimed, joined), (["118501"], {}))
+        claim = ScrapeClaim.objects.get()
+        pks = [third[0][3].pk, first[0][3].pk, second[0][3].pk]
+        self.assertEqual(claim.listentry_ids, pks)
+        self.assertEqual(release_claims(claim.claim_id, ["118501"])[0], pks[1:])
@@ -0,0 +1,96 @@
+"""
+Test IRSPerson.gnds, oebl_research_backend.gnd_lookup and the gnd-lookup endpoint
+"""
+from django.db import connection
+from django.test import TestCase as DjangoTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from oebl_irs_workflow.models import Editor
+from oebl_research_backend.gnd_lookup import lookup_gnds
+from oebl_research_backend.models import IRSPerson, List, ListEntry, gnds_from_uris
+from oebl_research_backend.tasks import ingest_lemmas
+from oebl_irs_workflow.tests.utilities import SetUpUserMixin
+from .test_ingest import create_lemma
+
+
+class GndColumnTestCase(DjangoTestCase):
+
+    def setUp(self) -> None:
+        self.list = List.objects.create(title="Liste")
+        ingested = ingest_lemmas([create_lemma(1), create_lemma(2, gnd=["118502", "118602"])], self.list.pk)
+        self.persons = [x[2] for x in ingested]
+
+    def gnds(self, person: IRSPerson) -> list:
+        return IRSPerson.objects.get(pk=person.pk).gnds
+
+    def test_set_on_insert(self):
+        self.assertEqual(self.gnds(self.persons[0]), ["118501"])
+        self.assertEqual(self.gnds(self.persons[1]), ["118502", "118602"])
+        self.assertEqual(self.persons[1].gnds, ["118502", "118602"])
+
+    def test_set_on_update(self):
+        uris = ["https://www.wikidata.org/entity/Q7312", "http://d-nb.info/gnd/118700", "https://d-nb.info/gnd/"]
+        IRSPerson.objects.filter(pk=self.persons[0].pk).update(uris=uris)
+        self.assertEqual(self.gnds(self.persons[0]), ["118700"])
+        self.assertEqual(gnds_from_uris(uris), ["118700"])
+        person = self.persons[1]
+        person.uris = None
+        person.save()
+        self.assertEqual(person.gnds, [])
+        self.assertEqual(self.gnds(person), [])
+
+    def test_index_is_used(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            sql, params = IRSPerson.objects.filter(gnds__overlap=["118501"]).values("pk").query.sql_with_params()
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        self.assertIn("oebl_resear_gnds_e302f9_gin", plan)
+
+
+class GndLookupTestCase(SetUpUserMixin, APITestCase):
+    user: Editor
+
+    def setUp(self) -> None:
+        self.setUpUser()
+        self.list = List.objects.create(title="Liste", editor=self.user)
+        self.other = List.objects.create(title="Andere Liste", editor=self.user)
+        self.entries = [x[3] for x in ingest_lemmas([create_lemma(idx) for idx in range(1, 6)], self.list.pk)]
+        self.entries += [x[3] for x in ingest_lemmas([create_lemma(1)], self.other.pk)]
+        ListEntry.objects.filter(pk=self.entries[1].pk).update(deleted=True)
+
+    def post(self, data: dict):
+        return self.client.post("/research/api/v1/lemmaresearch/gnd-lookup/", data, format="json")
+
+    def test_lookup(self):
+        with self.assertNumQueries(2):
+            results, missing = lookup_gnds(["118501", "118502", "999", "118501"])
+        self.assertEqual(missing, ["999"])
+        self.assertEqual(
+            results["118501"],
+            [
+                {
+                    "id": self.entries[0].person_id,
+                    "firstName": "Vorname 1",
+                    "lastName": "Nachname 1",
+                    "gnd": ["118501"],
+                    "listEntries": [
+                        {"id": self.entries[0].pk, "listId": self.list.pk},
+                        {"id": self.entries[5].pk, "listId": self.other.pk},
+                    ],
+                }
+            ],
+        )
+        self.assertEqual(results["118502"][0]["listEntries"], [])
+
+    def test_endpoint(self):
+        response = self.post({"gnds": [f"11850{idx}" for idx in range(1, 8)]})
+        self.assertEqual(sorted(response.data["results"]), ["118501", "118502", "118503", "118504", "118505"])
+        self.assertEqual(response.data["missing"], ["118506", "118507"])
+        response = self.client.get("/research/api/v1/lemmaresearch/", {"gnd": "118503"})
+        self.assertEqual([x["id"] for x in response.data["results"]], [self.entries[2].pk])
+
+    @override_settings(RESEARCH_GND_LOOKUP_LIMIT=2)
+    def test_invalid(self):
+        for data in ({}, {"gnds": []}, {"gnds": "118501"}, {"gnds": ["1", "2", "3"]}):
+            self.assertEqual(self.post(data).status_code, 400, data)
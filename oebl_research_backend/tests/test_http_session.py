@@ -0,0 +1,82 @@
+"""
+Test oebl_research_backend.http_session against a local fake server
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from django.test import SimpleTestCase
+
+from oebl_research_backend.http_session import ScrapeSession, get_session, use_session
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Answers with the status codes queued in server.statuses, then with 200"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.server.posts += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+class ScrapeSessionTestCase(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.server = HTTPServer(("127.0.0.1", 0), FakeHandler)
+        self.server.statuses = []
+        self.server.connections = set()
+        self.server.posts = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        self.host = f"127.0.0.1:{self.server.server_port}"
+        self.session = ScrapeSession(backoff_factor=0)
+
+    def tearDown(self) -> None:
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_on_server_errors(self):
+        self.server.statuses = [503, 429]
+        response = self.session.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        stats = self.session.stats.snapshot()[self.host]
+        self.assertEqual(stats["requests"], 1)
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["errors"], 0)
+
+    def test_posts_are_not_retried(self):
+        self.server.statuses = [503]
+        response = self.session.post(self.url, json={"id": 1})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.posts, 1)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.statuses = [500] * 5
+        response = self.session.get(self.url)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.session.stats.snapshot()[self.host]["errors"], 1)
+
+    def test_keeps_connections_alive(self):
+        for _ in range(3):
+            self.session.get(self.url)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_session_can_be_injected(self):
+        with use_session(self.session):
+            self.assertIs(get_session(), self.session)
+        self.assertIsNot(get_session(), self.session)
@@ -0,0 +1,51 @@
+"""
+Test oebl_research_backend.tasks.ingest_lemmas
+"""
+from django.test import TestCase as DjangoTestCase
+
+from oebl_research_backend.models import IRSPerson, List, ListEntry
+from oebl_research_backend.tasks import ingest_lemmas
+
+
+def create_lemma(idx: int, **kwargs) -> dict:
+    lemma = {
+        "id": idx,
+        "firstName": f"Vorname {idx}",
+        "lastName": f"Nachname {idx}",
+        "gnd": [f"11850{idx}"],
+    }
+    lemma.update(kwargs)
+    return lemma
+
+
+class IngestLemmasTestCase(DjangoTestCase):
+
+    def setUp(self) -> None:
+        self.list = List.objects.create(title="Liste")
+
+    def test_creates_persons_and_entries(self):
+        ingested = ingest_lemmas([create_lemma(1), create_lemma(2, Spalte="Wert")], self.list.pk)
+        self.assertEqual(IRSPerson.objects.count(), 2)
+        self.assertEqual(ListEntry.objects.filter(list=self.list).count(), 2)
+        gnds, ent, pers, entry = ingested[1]
+        self.assertEqual(gnds, ["118502"])
+        self.assertEqual(pers.uris, ["https://d-nb.info/gnd/118502/"])
+        self.assertEqual(entry.columns_user, {"Spalte": "Wert"})
+        self.assertEqual(entry.person_id, pers.pk)
+
+    def test_duplicates_in_upload_share_person(self):
+        ingested = ingest_lemmas([create_lemma(1), create_lemma(1, id=2)], self.list.pk)
+        self.assertEqual(IRSPerson.objects.count(), 1)
+        self.assertEqual(ingested[0][2].pk, ingested[1][2].pk)
+        self.assertEqual([x[3].source_id for x in ingested], [1, 2])
+
+    def test_reuses_existing_person(self):
+        ingest_lemmas([create_lemma(1, dateOfBirth="1900-01-02")], self.list.pk)
+        ingest_lemmas([create_lemma(1, dateOfBirth="1900-01-02"), create_lemma(3)], self.list.pk)
+        self.assertEqual(IRSPerson.objects.count(), 2)
+        self.assertEqual(ListEntry.objects.count(), 3)
+
+    def test_query_count_independent_of_upload_size(self):
+        # savepoint, persons, new persons, entries, change log, release savepoint
+        with self.assertNumQueries(6):
+            ingest_lemmas([create_lemma(idx) for idx in range(1, 200)], self.list.pk)
@@ -0,0 +1,101 @@
+"""
+Test oebl_research_backend.json_filters and the columns_user / columns_scrape filters of the lemmaresearch endpoint
+"""
+import json
+
+from django.db import connection
+from django.test import TestCase as DjangoTestCase
+from rest_framework.test import APITestCase
+
+from oebl_irs_workflow.models import Editor
+from oebl_research_backend.json_filters import NUMERIC_INDEXES, filter_json_field
+from oebl_research_backend.models import List, ListEntry
+from oebl_research_backend.tasks import ingest_lemmas
+from oebl_irs_workflow.tests.utilities import SetUpUserMixin
+from .test_ingest import create_lemma
+
+
+def create_entries(list_id: int) -> list:
+    entries = [x[3] for x in ingest_lemmas([create_lemma(idx) for idx in range(1, 5)], list_id)]
+    values = [
+        ({"obv": {"count_author": 5}, "wikidata": {"pLabel": "Franz"}}, {"Notiz": "ok", "Band": 1}),
+        ({"obv": {"count_author": 2}, "wikidata": {"pLabel": "Anna"}}, {"Band": 2}),
+        ({"obv": {"count_author": "viele"}}, {}),
+        (None, None),
+    ]
+    for entry, (scrape, user) in zip(entries, values):
+        ListEntry.objects.filter(pk=entry.pk).update(columns_scrape=scrape, columns_user=user)
+    return [entry.pk for entry in entries]
+
+
+class JSONFilterTestCase(DjangoTestCase):
+
+    def setUp(self) -> None:
+        self.pks = create_entries(List.objects.create(title="Liste").pk)
+
+    def ids(self, field: str, conditions: dict) -> list:
+        qs = filter_json_field(ListEntry.objects.all(), field, json.dumps(conditions))
+        return sorted(self.pks.index(pk) for pk in qs.values_list("pk", flat=True))
+
+    def test_containment(self):
+        self.assertEqual(self.ids("columns_scrape", {"wikidata__pLabel": "Franz"}), [0])
+        self.assertEqual(self.ids("columns_scrape", {"wikidata__contains": {"pLabel": "Anna"}}), [1])
+        self.assertEqual(self.ids("columns_user", {"Band": 2, "Notiz": "ok"}), [])
+
+    def test_numeric_ranges(self):
+        self.assertEqual(self.ids("columns_scrape", {"obv__count_author__gte": 2}), [0, 1])
+        self.assertEqual(self.ids("columns_scrape", {"obv__count_author__gt": "2", "obv__count_author__lte": 5}), [0])
+        self.assertEqual(self.ids("columns_user", {"Band__lt": 2}), [0])
+
+    def test_exists(self):
+        self.assertEqual(self.ids("columns_scrape", {"wikidata__exists": True}), [0, 1])
+        self.assertEqual(self.ids("columns_user", {"Notiz__exists": "false"}), [1, 2, 3])
+        self.assertEqual(self.ids("columns_user", {'No"tiz__exists': True}), [])
+
+    def explain(self, field: str, conditions: dict) -> str:
+        qs = filter_json_field(ListEntry.objects.all(), field, json.dumps(conditions)).values("pk")
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}", params)
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def test_indexes_are_used(self):
+        self.assertIn("listentry_columns_scrape_gin", self.explain("columns_scrape", {"wikidata__pLabel": "Franz"}))
+        self.assertIn("listentry_columns_user_gin", self.explain("columns_user", {"Notiz__exists": True}))
+        for field, paths in NUMERIC_INDEXES.items():
+            for path in paths:
+                self.assertIn(
+                    f"listentry_{'_'.join(path)}_idx", self.explain(field, {"__".join(path) + "__gte": 1})
+                )
+
+
+class JSONFilterAPITestCase(SetUpUserMixin, APITestCase):
+    user: Editor
+
+    def setUp(self) -> None:
+        self.setUpUser()
+        self.pks = create_entries(List.objects.create(title="Liste", editor=self.user).pk)
+
+    def get(self, **params):
+        return self.client.get(
+            "/research/api/v1/lemmaresearch/", {key: json.dumps(value) for key, value in params.items()}
+        )
+
+    def test_filter(self):
+        response = self.get(columns_scrape={"obv__count_author__gte": 3}, columns_user={"Band": 1})
+        self.assertEqual([x["id"] for x in response.data["results"]], [self.pks[0]])
+
+    def test_invalid_filters_are_rejected(self):
+        for params in (
+            {"columns_scrape": {"obv__count_author__gte": "viele"}},
+            {"columns_scrape": {"wikidata__exists": 1}},
+            {"columns_scrape": {"obv____gte": 1}},
+            {"columns_scrape": {"wikidata__pLabel__icontains": "schubert"}},
+            {"columns_user": {"Band__in": [1, 2]}},
+            {"columns_user": {"Band__isnull": False}},
+            {"columns_user": ["Band"]},
+        ):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+        response = self.client.get("/research/api/v1/lemmaresearch/", {"columns_user": "{"})
+        self.assertEqual(response.status_code, 400)
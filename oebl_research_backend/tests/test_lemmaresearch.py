@@ -0,0 +1,318 @@
+"""
+Test the lemmaresearch endpoint: oebl_research_backend.api_views.LemmaResearchView, its pagination and the sync endpoint
+"""
+import datetime
+from unittest import mock
+
+from django.core import signing
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from oebl_irs_workflow.models import Editor
+from oebl_research_backend.models import IRSPerson, List, ListEntry, ListEntryChange
+from oebl_research_backend.sync import TOKEN_SALT, prune_changes
+from oebl_research_backend.tasks import ingest_lemmas, write_scrape
+from oebl_irs_workflow.tests.utilities import SetUpUserMixin
+from .test_ingest import create_lemma
+
+
+class LemmaResearchListTestCase(SetUpUserMixin, APITestCase):
+    user: Editor
+
+    def setUp(self) -> None:
+        self.setUpUser()
+        self.list = List.objects.create(title="Liste", editor=self.user)
+        ingest_lemmas([create_lemma(idx, gnd=[f"11851{idx}"]) for idx in range(1, 21)], self.list.pk)
+
+    def test_queries_do_not_depend_on_page_size(self):
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get("/research/api/v1/lemmaresearch/", {"limit": 2})
+        self.assertEqual(len(response.data["results"]), 2)
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.get("/research/api/v1/lemmaresearch/", {"limit": 20})
+        self.assertEqual(len(response.data["results"]), 20)
+        self.assertEqual(response.data["results"][0]["list"]["editor"], self.user.pk)
+        self.assertIn(["118511"], [x["gnd"] for x in response.data["results"]])
+
+    def test_queries_per_page(self):
+        # session, user, count and the page
+        with self.assertNumQueries(4):
+            self.client.get("/research/api/v1/lemmaresearch/", {"limit": 50, "list_id": self.list.pk})
+
+    def test_cursor_pagination(self):
+        # rows updated by one statement share their timestamp, the id breaks the tie
+        ListEntry.objects.filter(pk__in=ListEntry.objects.order_by("pk").values("pk")[:10]).update(
+            last_updated=timezone.now()
+        )
+        expected = list(ListEntry.objects.order_by("last_updated", "pk").values_list("pk", flat=True))
+        seen = []
+        response = self.client.get("/research/api/v1/lemmaresearch/", {"pagination": "cursor", "limit": 7})
+        while True:
+            self.assertNotIn("count", response.data)
+            seen.extend(x["id"] for x in response.data["results"])
+            if response.data["next"] is None:
+                break
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(response.data["next"])
+            self.assertFalse(any("COUNT(" in q["sql"] for q in queries.captured_queries))
+        self.assertEqual(seen, expected)
+
+    def test_cursor_pagination_with_modified_after(self):
+        before = timezone.now()
+        changed = list(ListEntry.objects.order_by("pk").values_list("pk", flat=True)[:3])
+        ListEntry.objects.filter(pk__in=changed).update(last_updated=timezone.now())
+        response = self.client.get(
+            "/research/api/v1/lemmaresearch/",
+            {"pagination": "cursor", "limit": 2, "modified_after": before.isoformat()},
+        )
+        self.assertIn("modified_after", response.data["next"])
+        ids = [x["id"] for x in response.data["results"]]
+        ids += [x["id"] for x in self.client.get(response.data["next"]).data["results"]]
+        self.assertEqual(ids, changed)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/research/api/v1/lemmaresearch/", {"cursor": "invalid"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_pagination_with_sort_is_rejected(self):
+        response = self.client.get("/research/api/v1/lemmaresearch/", {"pagination": "cursor", "sort": "last_name"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("sort", response.data)
+
+
+class LemmaResearchSyncTestCase(SetUpUserMixin, APITransactionTestCase):
+    """The sync reads committed changes only, the tests commit their writes"""
+    user: Editor
+
+    def setUp(self) -> None:
+        self.setUpUser()
+        self.list = List.objects.create(title="Liste", editor=self.user)
+        self.other = List.objects.create(title="Andere Liste", editor=self.user)
+        ingested = ingest_lemmas([create_lemma(idx) for idx in range(1, 6)], self.list.pk)
+        self.pks = [x[3].pk for x in ingested]
+
+    def sync(self, token=None, list_id=None):
+        params = {"list_id": list_id or self.list.pk}
+        if token:
+            params["token"] = token
+        return self.client.get("/research/api/v1/lemmaresearch/sync/", params)
+
+    def test_initial_sync_returns_the_list(self):
+        response = self.sync()
+        self.assertEqual([x["id"] for x in response.data["changes"]], self.pks)
+        self.assertEqual(response.data["changes"][0]["lastName"], "Nachname 1")
+        self.assertFalse(response.data["more"])
+        self.assertTrue(response.data["reset"])
+        response = self.sync(response.data["token"])
+        self.assertFalse(response.data["reset"])
+        self.assertEqual(response.data["changes"], [])
+        # deleted entries are not part of the full sync
+        self.client.delete(f"/research/api/v1/lemmaresearch/{self.pks[0]}/")
+        response = self.sync()
+        self.assertEqual([x["id"] for x in response.data["changes"]], self.pks[1:])
+
+    def synced_token(self) -> str:
+        response = self.sync()
+        while response.data["more"] or response.data["changes"]:
+            response = self.sync(response.data["token"])
+        return response.data["token"]
+
+    def test_changed_fields_and_tombstones(self):
+        token = self.synced_token()
+        self.client.patch(f"/research/api/v1/lemmaresearch/{self.pks[0]}/", {"selected": True}, format="json")
+        self.client.patch(f"/research/api/v1/lemmaresearch/{self.pks[0]}/", {"lastName": "Neu"}, format="json")
+        self.client.patch(
+            f"/research/api/v1/lemmaresearch/{self.pks[1]}/", {"list": {"id": self.other.pk}}, format="json"
+        )
+        self.client.delete(f"/research/api/v1/lemmaresearch/{self.pks[2]}/")
+        write_scrape(self.pks[3], "wikidata", {"pLabel": "Nachname 4"})
+        response = self.sync(token)
+        changes = {x["id"]: x for x in response.data["changes"]}
+        self.assertEqual(
+            set(changes[self.pks[0]]), {"id", "deleted", "last_updated", "selected", "lastName"}
+        )
+        self.assertEqual(changes[self.pks[0]]["lastName"], "Neu")
+        self.assertEqual(changes[self.pks[1]], {"id": self.pks[1], "deleted": True})
+        self.assertEqual(changes[self.pks[2]], {"id": self.pks[2], "deleted": True})
+        self.assertEqual(changes[self.pks[3]]["columns_scrape"]["wikidata"], {"pLabel": "Nachname 4"})
+        self.assertNotIn(self.pks[4], changes)
+        # the moved entry is a full record in its new list
+        moved = self.sync(list_id=self.other.pk).data["changes"]
+        self.assertEqual([x["id"] for x in moved], [self.pks[1]])
+        self.assertIn("lastName", moved[0])
+
+    @override_settings(RESEARCH_SYNC_LIMIT=2)
+    def test_more(self):
+        response = self.sync()
+        ids = [x["id"] for x in response.data["changes"]]
+        while response.data["more"]:
+            response = self.sync(response.data["token"])
+            self.assertFalse(response.data["reset"])
+            ids += [x["id"] for x in response.data["changes"]]
+        self.assertEqual(ids, self.pks)
+        self.client.patch(f"/research/api/v1/lemmaresearch/{self.pks[0]}/", {"selected": True}, format="json")
+        self.assertEqual([x["id"] for x in self.sync(response.data["token"]).data["changes"]], self.pks[:1])
+
+    def test_invalid_token(self):
+        token = self.sync().data["token"]
+        self.assertEqual(self.sync(token + "x").status_code, 400)
+        self.assertEqual(self.sync(token, list_id=self.other.pk).status_code, 400)
+
+    def test_uncommitted_changes_are_held_back(self):
+        token = self.synced_token()
+        other = connection.copy()
+        try:
+            other.set_autocommit(False)
+            with other.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {ListEntryChange._meta.db_table} (list_entry_id, list_id, fields, deleted, created, txid) "
+                    "VALUES (%s, %s, %s, false, now(), txid_current())",
+                    [self.pks[0], self.list.pk, ["selected"]],
+                )
+            # logged after the open transaction, with a higher id
+            self.client.patch(f"/research/api/v1/lemmaresearch/{self.pks[1]}/", {"selected": True}, format="json")
+            response = self.sync(token)
+            self.assertEqual(response.data["changes"], [])
+            other.commit()
+        finally:
+            other.close()
+        changes = self.sync(response.data["token"]).data["changes"]
+        self.assertEqual([x["id"] for x in changes], self.pks[:2])
+
+    def test_expired_token_resets(self):
+        token = self.synced_token()
+        self.client.delete(f"/research/api/v1/lemmaresearch/{self.pks[0]}/")
+        with override_settings(RESEARCH_SYNC_RETENTION=-1):
+            response = self.sync(token)
+        self.assertTrue(response.data["reset"])
+        self.assertEqual([x["id"] for x in response.data["changes"]], self.pks[1:])
+        # tokens without transaction position
+        response = self.sync(signing.dumps({"list": self.list.pk, "seq": 1}, salt=TOKEN_SALT))
+        self.assertTrue(response.data["reset"])
+
+    def test_old_changes_are_pruned(self):
+        self.assertEqual(prune_changes(), 0)
+        ListEntryChange.objects.filter(list_entry_id__in=self.pks[:2]).update(
+            created=timezone.now() - datetime.timedelta(days=31)
+        )
+        self.assertEqual(prune_changes(), 2)
+        self.assertEqual(ListEntryChange.objects.count(), 3)
+
+    def test_bulk_delete_and_move(self):
+        token = self.synced_token()
+        self.client.post("/research/api/v1/lemmaresearch/bulk-delete/", {"ids": self.pks[:2]}, format="json")
+        with mock.patch("oebl_research_backend.api_views.rescrape_entries"):
+            self.client.patch(
+                "/research/api/v1/lemmaresearch/bulk-update/",
+                {"ids": self.pks[2:4], "patch": {"list": {"id": self.other.pk}}},
+                format="json",
+            )
+        changes = self.sync(token).data["changes"]
+        self.assertEqual(changes, [{"id": pk, "deleted": True} for pk in self.pks[:4]])
+
+
+class LemmaResearchBulkDeleteTestCase(SetUpUserMixin, APITestCase):
+    user: Editor
+
+    def setUp(self) -> None:
+        self.setUpUser()
+        self.list = List.objects.create(title="Liste", editor=self.user)
+        self.other = List.objects.create(title="Andere Liste", editor=self.user)
+        self.pks = [x[3].pk for x in ingest_lemmas([create_lemma(idx) for idx in range(1, 31)], self.list.pk)]
+        ingest_lemmas([create_lemma(idx) for idx in range(31, 34)], self.other.pk)
+
+    def post(self, action: str, data: dict):
+        return self.client.post(f"/research/api/v1/lemmaresearch/{action}/", data, format="json")
+
+    def test_delete_by_filter(self):
+        before = timezone.now()
+        # session, user, savepoint, update, change log, release savepoint
+        with self.assertNumQueries(6):
+            response = self.post("bulk-delete", {"filter": {"list_id": self.list.pk}})
+        self.assertEqual(response.data, {"affected": 30})
+        self.assertEqual(ListEntry.objects.filter(deleted=True, last_updated__gte=before).count(), 30)
+        self.assertFalse(ListEntry.objects.filter(list=self.other, deleted=True).exists())
+        self.assertEqual(self.post("bulk-delete", {"filter": {"list_id": self.list.pk}}).data, {"affected": 0})
+        self.assertEqual(ListEntryChange.objects.filter(list_id=self.list.pk, deleted=True).count(), 30)
+
+    def test_delete_and_restore_by_ids(self):
+        response = self.post("bulk-delete", {"ids": self.pks[:3]})
+        self.assertEqual(response.data, {"affected": 3})
+        response = self.post("bulk-restore", {"ids": self.pks[:5]})
+        self.assertEqual(response.data, {"affected": 3})
+        self.assertFalse(ListEntry.objects.filter(deleted=True).exists())
+
+    def test_filter_with_search(self):
+        response = self.post("bulk-delete", {"filter": {"last_name": "Nachname 7", "list_id": self.list.pk}})
+        self.assertEqual(response.data, {"affected": 1})
+        self.assertEqual(list(ListEntry.objects.filter(deleted=True).values_list("pk", flat=True)), [self.pks[6]])
+
+    def test_invalid_selection(self):
+        for data in ({}, {"ids": [1], "filter": {"list_id": 1}}, {"filter": {"list": self.list.pk}}, {"ids": []}):
+            self.assertEqual(self.post("bulk-delete", data).status_code, 400, data)
+        self.assertFalse(ListEntry.objects.filter(deleted=True).exists())
+
+
+@mock.patch("oebl_research_backend.api_views.rescrape_entries")
+class LemmaResearchBulkUpdateTestCase(SetUpUserMixin, APITestCase):
+    user: Editor
+
+    def setUp(self) -> None:
+        self.setUpUser()
+        self.list = List.objects.create(title="Liste", editor=self.user)
+        self.other = List.objects.create(title="Andere Liste", editor=self.user)
+        self.pks = [x[3].pk for x in ingest_lemmas([create_lemma(idx) for idx in range(1, 11)], self.list.pk)]
+
+    def patch(self, data: dict):
+        return self.client.patch("/research/api/v1/lemmaresearch/bulk-update/", data, format="json")
+
+    def test_selected_and_columns_by_filter(self, rescrape_entries):
+        ListEntry.objects.filter(pk=self.pks[0]).update(selected=True, columns_user={"Band": 1})
+        response = self.patch(
+            {"filter": {"list_id": self.list.pk}, "patch": {"selected": True, "columns_user": {"Notiz": "ok"}}}
+        )
+        self.assertEqual(response.data, {"entries": 10, "persons": 0, "rescraped": 0, "success": None})
+        self.assertEqual(ListEntry.objects.get(pk=self.pks[0]).columns_user, {"Band": 1, "Notiz": "ok"})
+        self.assertEqual(ListEntry.objects.filter(selected=True, columns_user__Notiz="ok").count(), 10)
+        response = self.patch({"ids": self.pks[:5], "patch": {"selected": True}})
+        self.assertEqual(response.data["entries"], 0)
+        rescrape_entries.delay.assert_not_called()
+
+    def test_move_to_list(self, rescrape_entries):
+        response = self.patch({"ids": self.pks[:3], "patch": {"list": {"id": self.other.pk}}})
+        self.assertEqual(response.data["entries"], 3)
+        self.assertEqual(list(ListEntry.objects.filter(list=self.other).order_by("pk").values_list("pk", flat=True)), self.pks[:3])
+        self.assertEqual(
+            sorted(ListEntryChange.objects.filter(list_id=self.list.pk, deleted=True).values_list("list_entry_id", flat=True)),
+            self.pks[:3],
+        )
+        self.assertEqual(self.patch({"ids": self.pks[:3], "patch": {"list": {"id": 0}}}).status_code, 400)
+
+    def test_unchanged_persons_are_skipped(self, rescrape_entries):
+        IRSPerson.objects.filter(listentry__pk__in=self.pks[:4]).update(bio_note="Komponist")
+        response = self.patch({"ids": self.pks[:6], "patch": {"bioNote": "Komponist", "selected": False}})
+        self.assertEqual(response.data, {"entries": 0, "persons": 2, "rescraped": 0, "success": None})
+        self.assertEqual(IRSPerson.objects.filter(bio_note="Komponist").count(), 6)
+
+    def test_rescrape_only_changed_gnds(self, rescrape_entries):
+        rescrape_entries.delay.return_value.id = "job"
+        IRSPerson.objects.filter(listentry__pk=self.pks[1]).update(uris=["https://d-nb.info/gnd/118500/"])
+        IRSPerson.objects.filter(listentry__pk=self.pks[2]).update(
+            uris=["https://www.wikidata.org/entity/Q7312", "https://d-nb.info/gnd/118501/"]
+        )
+        response = self.patch({"ids": self.pks[:3], "patch": {"gnd": ["118500"]}})
+        self.assertEqual(response.data, {"entries": 0, "persons": 2, "rescraped": 2, "success": "job"})
+        rescrape_entries.delay.assert_called_once_with([self.pks[0], self.pks[2]], force_refresh=False)
+        self.assertEqual(
+            IRSPerson.objects.get(listentry__pk=self.pks[2]).uris,
+            ["https://www.wikidata.org/entity/Q7312", "https://d-nb.info/gnd/118500/"],
+        )
+
+    def test_invalid_patch(self, rescrape_entries):
+        for patch in ({}, {"deleted": True}, {"columns_scrape": {}}, {"selected": "vielleicht"}, {"gnd": [1]}, {"dateOfBirth": "gestern"}):
+            response = self.patch({"filter": {"list_id": self.list.pk}, "patch": patch})
+            self.assertEqual(response.status_code, 400, patch)
+        self.assertFalse(ListEntry.objects.filter(selected=True).exists())
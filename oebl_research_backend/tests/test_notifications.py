@@ -0,0 +1,89 @@
+"""
+Test oebl_research_backend.notifications
+"""
+import datetime
+from unittest import mock
+
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.utils import timezone
+
+from oebl_research_backend.http_session import use_session
+from oebl_research_backend.models import List, NotificationOutbox
+from oebl_research_backend.notifications import notify, retry_delay, send_pending
+from oebl_research_backend.tasks import flush_notifications, ingest_lemmas
+from .test_ingest import create_lemma
+
+
+class FakeResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakePostSession:
+    """Records the POSTs, answers with the queued status codes, then with 200"""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.posts = []
+
+    def post(self, url, headers=None, json=None):
+        self.posts.append(json)
+        return FakeResponse(self.statuses.pop(0) if self.statuses else 200)
+
+
+class NotificationsTestCase(DjangoTestCase):
+
+    def setUp(self) -> None:
+        ingested = ingest_lemmas([create_lemma(idx) for idx in range(1, 6)], List.objects.create(title="Liste").pk)
+        self.pks = [x[3].pk for x in ingested]
+
+    def test_entries_are_sent_in_one_post(self):
+        notify(self.pks[:3])
+        notify(self.pks[3])
+        session = FakePostSession()
+        with use_session(session):
+            self.assertEqual(send_pending(), (4, None))
+        self.assertEqual(len(session.posts), 1)
+        self.assertEqual(len(session.posts[0]), 4)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    @override_settings(RESEARCH_NOTIFY_BATCH_SIZE=2)
+    def test_batch_size(self):
+        notify(self.pks)
+        session = FakePostSession()
+        with use_session(session), mock.patch.object(flush_notifications, "apply_async") as apply_async:
+            flush_notifications()
+        self.assertEqual([len(x) for x in session.posts], [2, 2, 1])
+        apply_async.assert_not_called()
+
+    def test_periodic_flush_sends_rows_of_a_crashed_flush(self):
+        # lease of a flush that died expired, no flush is scheduled for the row
+        NotificationOutbox.objects.create(list_entry_id=self.pks[0], next_attempt=timezone.now() - datetime.timedelta(seconds=1))
+        notify(self.pks[1])
+        session = FakePostSession()
+        with use_session(session):
+            flush_notifications()
+        self.assertEqual(sorted(x["id"] for x in session.posts[0]), self.pks[:2])
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_failed_posts_are_retried_with_backoff(self):
+        notify(self.pks[:2])
+        session = FakePostSession(statuses=[500, 503])
+        with use_session(session):
+            self.assertEqual(send_pending(), (0, retry_delay(1)))
+            # leased until the retry is due
+            self.assertEqual(send_pending(), (0, None))
+            NotificationOutbox.objects.update(next_attempt=timezone.now() - datetime.timedelta(seconds=1))
+            self.assertEqual(send_pending(), (0, retry_delay(2)))
+            self.assertEqual(retry_delay(2), 2 * retry_delay(1))
+            NotificationOutbox.objects.update(next_attempt=timezone.now() - datetime.timedelta(seconds=1))
+            self.assertEqual(send_pending(), (2, None))
+        self.assertEqual(len(session.posts), 3)
+
+    def test_flush_reschedules_after_failure(self):
+        notify(self.pks[:1])
+        with use_session(FakePostSession(statuses=[500])), mock.patch.object(flush_notifications, "apply_async") as apply_async:
+            flush_notifications()
+        apply_async.assert_called_once_with(countdown=retry_delay(1))
+        self.assertEqual(NotificationOutbox.objects.get().attempts, 1)
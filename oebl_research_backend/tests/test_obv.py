@@ -0,0 +1,147 @@
+"""
+Test oebl_research_backend.obv
+"""
+import base64
+import json
+import random
+import time
+
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from oebl_research_backend import obv
+from oebl_research_backend.http_session import use_session
+
+
+def create_jwt(exp: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"eyJhbGciOiJIUzI1NiJ9.{payload}.c2lnbmF0dXJl"
+
+
+class FakeResponse:
+
+    def __init__(self, status_code: int, data):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+class FakeObvSession:
+    """Hands out a new token for every token request and answers searches with 401 for revoked tokens"""
+
+    def __init__(self, lifetime: float = 3600, token_response: FakeResponse = None):
+        self.lifetime = lifetime
+        self.token_response = token_response
+        self.tokens = []
+        self.revoked = set()
+        self.searches = 0
+
+    def get(self, url, headers=None, params=None):
+        if url == obv.OBV_TOKEN_URL:
+            if self.token_response is not None:
+                return self.token_response
+            self.tokens.append(create_jwt(time.time() + self.lifetime) + str(len(self.tokens)))
+            return FakeResponse(200, self.tokens[-1])
+        self.searches += 1
+        if headers["authorization"].split(" ")[1] in self.revoked:
+            return FakeResponse(401, {})
+        return self.search(params)
+
+    def search(self, params):
+        return FakeResponse(200, {"docs": []})
+
+
+class FakeObvSearchSession(FakeObvSession):
+    """Serves total records in pages, answering in random order"""
+
+    def __init__(self, total: int, failing: int = None):
+        super().__init__()
+        self.total = total
+        self.failing = failing
+        self.offsets = []
+
+    def search(self, params):
+        self.offsets.append(params["offset"])
+        if params["offset"] == self.failing:
+            return FakeResponse(503, {})
+        time.sleep(random.random() / 100)
+        records = range(params["offset"], min(params["offset"] + params["limit"], self.total))
+        return FakeResponse(
+            200,
+            {"info": {"total": self.total}, "docs": [{"pnx": {"display": {"id": x}}} for x in records]},
+        )
+
+
+class ObvTokenCacheTestCase(SimpleTestCase):
+
+    def setUp(self) -> None:
+        cache.delete(obv.TOKEN_CACHE_KEY)
+        obv.token_stats = obv.TokenStats()
+
+    def test_token_is_reused(self):
+        session = FakeObvSession()
+        with use_session(session):
+            for _ in range(3):
+                obv.obv_get({})
+        self.assertEqual(len(session.tokens), 1)
+        self.assertEqual(session.searches, 3)
+        self.assertAlmostEqual(obv.token_stats.hit_rate, 2 / 3)
+
+    def test_token_near_expiry_is_refreshed(self):
+        session = FakeObvSession(lifetime=obv.TOKEN_REFRESH_MARGIN / 2)
+        with use_session(session):
+            obv.obv_get({})
+            obv.obv_get({})
+        self.assertEqual(len(session.tokens), 2)
+
+    def test_unauthorized_refreshes_token(self):
+        session = FakeObvSession()
+        with use_session(session):
+            obv.obv_get({})
+            session.revoked.add(session.tokens[0])
+            response = obv.obv_get({})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(session.tokens), 2)
+        self.assertEqual(obv.token_stats.unauthorized, 1)
+
+    def test_failed_token_requests_are_not_cached(self):
+        for response in (FakeResponse(500, "Internal Server Error"), FakeResponse(200, {"error": "unavailable"})):
+            with use_session(FakeObvSession(token_response=response)):
+                with self.assertRaises(obv.ObvTokenError):
+                    obv.get_obv_token()
+            self.assertIsNone(cache.get(obv.TOKEN_CACHE_KEY))
+
+    def test_expiry_of_token_without_exp(self):
+        self.assertIsNone(obv.get_token_expiry("not-a-jwt"))
+
+
+class SearchObvRecordsTestCase(SimpleTestCase):
+
+    def setUp(self) -> None:
+        cache.delete(obv.TOKEN_CACHE_KEY)
+
+    def test_single_page(self):
+        session = FakeObvSearchSession(total=3)
+        with use_session(session):
+            records = obv.search_obv_records("118540238", limit=5)
+        self.assertEqual([r["id"] for r in records], [0, 1, 2])
+        self.assertEqual(session.offsets, [0])
+
+    def test_pages_are_fetched_once_and_merged_in_order(self):
+        session = FakeObvSearchSession(total=23)
+        with use_session(session):
+            records = obv.search_obv_records("118540238", limit=5, max_workers=3)
+        self.assertEqual([r["id"] for r in records], list(range(23)))
+        self.assertEqual(sorted(session.offsets), [0, 5, 10, 15, 20])
+
+    def test_failed_page_raises(self):
+        with use_session(FakeObvSearchSession(total=23, failing=10)):
+            with self.assertRaises(obv.ObvPageError):
+                obv.search_obv_records("118540238", limit=5, max_workers=3)
@@ -0,0 +1,116 @@
+"""
+Test oebl_research_backend.progress and the events endpoint of the researchjobs endpoint
+"""
+import datetime
+import json
+from unittest import mock
+
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from oebl_irs_workflow.models import Editor
+from oebl_research_backend.models import List, ResearchJob
+from oebl_research_backend.progress import DONE, job_state, prune_events, record_progress, wait_for_events
+from oebl_research_backend.tasks import scrape_chunk, write_scrape
+from oebl_irs_workflow.tests.utilities import SetUpUserMixin
+from .test_research_jobs import create_upload
+
+
+@override_settings(RESEARCH_CHUNK_SIZE=2)
+@mock.patch("oebl_research_backend.tasks.dispatch_scrapes")
+@mock.patch("oebl_research_backend.tasks.scrape_chunk.delay")
+class ResearchJobEventsTestCase(SetUpUserMixin, APITestCase):
+    user: Editor
+
+    def setUp(self) -> None:
+        self.setUpUser()
+        self.list = List.objects.create(title="Liste", editor=self.user)
+
+    def start_job(self) -> ResearchJob:
+        response = self.client.post(
+            "/research/api/v1/lemmaresearch/", create_upload(self.list.pk, 3), format="json"
+        )
+        job = ResearchJob.objects.get(job_id=response.data["success"])
+        for chunk in job.chunks.all():
+            scrape_chunk(chunk.pk)
+        return job
+
+    def events(self, job: ResearchJob, **kwargs):
+        return self.client.get(f"/research/api/v1/researchjobs/{job.job_id}/events/", {"timeout": 0, **kwargs})
+
+    def test_scrapes_are_reported(self, delay, dispatch_scrapes):
+        job = self.start_job()
+        pks = list(job.entries.order_by("pk").values_list("pk", flat=True))
+        self.assertEqual(len(pks), 3)
+        write_scrape(pks[0], "wikidata", {"pLabel": "Nachname 1"})
+        response = self.events(job)
+        self.assertEqual(
+            [(x["listEntry"], x["source"]) for x in response.data["events"]], [(pks[0], "wikidata")]
+        )
+        self.assertFalse(response.data["state"]["finished"])
+        cursor = response.data["cursor"]
+        self.assertEqual(self.events(job, after=cursor).data["events"], [])
+        record_progress(pks, DONE)
+        response = self.events(job, after=cursor)
+        self.assertEqual([x["listEntry"] for x in response.data["events"]], pks)
+        self.assertEqual(response.data["state"]["entriesDone"], 3)
+        self.assertTrue(response.data["state"]["finished"])
+
+    def test_entries_are_done_once(self, delay, dispatch_scrapes):
+        job = self.start_job()
+        pks = list(job.entries.values_list("pk", flat=True))
+        self.assertEqual(record_progress(pks[:2], DONE), 2)
+        self.assertEqual(record_progress(pks, DONE), 1)
+        self.assertEqual(job.events.filter(source=DONE).count(), 3)
+        job.refresh_from_db()
+        self.assertEqual((job.chunks_done, job.total_entries, job.entries_done), (2, 3, 3))
+
+    def test_old_events_are_pruned(self, delay, dispatch_scrapes):
+        job = self.start_job()
+        record_progress(job.entries.values_list("pk", flat=True), DONE)
+        self.assertEqual(prune_events(), 0)
+        ResearchJob.objects.filter(pk=job.pk).update(created=job.created - datetime.timedelta(days=8))
+        self.assertEqual(prune_events(), 3)
+        response = self.events(job)
+        self.assertEqual(response.data["events"], [])
+        self.assertTrue(response.data["state"]["finished"])
+
+    def test_timeout_must_be_finite(self, delay, dispatch_scrapes):
+        job = self.start_job()
+        for timeout in ("nan", "inf", "-inf", "x"):
+            self.assertEqual(self.events(job, timeout=timeout).status_code, 400, timeout)
+        with mock.patch("oebl_research_backend.progress.time.sleep") as sleep:
+            self.assertEqual(wait_for_events(job, 0, float("nan"))[0], [])
+            self.assertEqual(wait_for_events(job, 0, float("inf"))[0], [])
+        sleep.assert_not_called()
+
+    def test_unfinished_chunks(self, delay, dispatch_scrapes):
+        response = self.client.post(
+            "/research/api/v1/lemmaresearch/", create_upload(self.list.pk, 3), format="json"
+        )
+        job = ResearchJob.objects.get(job_id=response.data["success"])
+        scrape_chunk(job.chunks.get(index=0).pk)
+        record_progress(job.entries.values_list("pk", flat=True), DONE)
+        job.refresh_from_db()
+        self.assertEqual(job_state(job)["chunksFinished"], 1)
+        self.assertFalse(job_state(job)["finished"])
+
+    def test_event_stream(self, delay, dispatch_scrapes):
+        job = self.start_job()
+        pks = list(job.entries.order_by("pk").values_list("pk", flat=True))
+        record_progress(pks[:1], "obv")
+        record_progress(pks, DONE)
+        first = job.events.order_by("pk").first()
+        response = self.client.get(
+            f"/research/api/v1/researchjobs/{job.job_id}/events/",
+            HTTP_ACCEPT="text/event-stream",
+            HTTP_LAST_EVENT_ID=str(first.pk),
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        messages = b"".join(response.streaming_content).decode().strip().split("\n\n")
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(messages.pop(0), "retry: 2000")
+        self.assertTrue(messages[0].startswith(f"id: {first.pk + 1}\nevent: progress\n"))
+        self.assertEqual(json.loads(messages[0].split("data: ")[1])["source"], DONE)
+        self.assertTrue(messages[-1].startswith("event: state\n"))
+        self.assertTrue(json.loads(messages[-1].split("data: ")[1])["finished"])
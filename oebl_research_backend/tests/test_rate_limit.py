@@ -0,0 +1,68 @@
+"""
+Test oebl_research_backend.rate_limit
+"""
+from django.test import TestCase as DjangoTestCase, override_settings
+
+from oebl_research_backend.rate_limit import TokenBucket, get_bucket, get_rate_limits
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTestCase(DjangoTestCase):
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+
+    def create_bucket(self, rate: float = 2.0, burst: int = 2) -> TokenBucket:
+        return TokenBucket("obv", rate=rate, burst=burst, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_burst_is_available_immediately(self):
+        bucket = self.create_bucket()
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(self.clock.slept, [])
+
+    def test_waits_for_refill_when_empty(self):
+        bucket = self.create_bucket()
+        bucket.acquire()
+        bucket.acquire()
+        self.assertAlmostEqual(bucket.acquire(), 0.5)
+
+    def test_state_is_shared_between_instances(self):
+        self.create_bucket().acquire()
+        self.create_bucket().acquire()
+        self.assertGreater(self.create_bucket().try_acquire(), 0)
+
+    def test_refill_is_capped_by_burst(self):
+        bucket = self.create_bucket()
+        bucket.acquire()
+        self.clock.now += 3600
+        for _ in range(2):
+            self.assertEqual(bucket.try_acquire(), 0)
+        self.assertGreater(bucket.try_acquire(), 0)
+
+
+class RateLimitSettingsTestCase(DjangoTestCase):
+
+    @override_settings(RESEARCH_RATE_LIMITS={"obv": {"rate": 10}, "gnd": {"rate": 1, "burst": 1}})
+    def test_settings_override_defaults(self):
+        limits = get_rate_limits()
+        self.assertEqual(limits["obv"]["rate"], 10)
+        self.assertEqual(limits["obv"]["hosts"], ["search.obvsg.at"])
+        self.assertIn("gnd", limits)
+
+    @override_settings(RESEARCH_RATE_LIMITS={"wikidata": {"rate": None}})
+    def test_source_without_rate_is_not_limited(self):
+        self.assertIsNone(get_bucket("wikidata"))
@@ -0,0 +1,61 @@
+"""
+Test the recompute_scrape_columns management command
+"""
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase as DjangoTestCase
+
+from oebl_research_backend.models import List, ListEntry, ScrapeResult
+from oebl_research_backend.tasks import ingest_lemmas
+from .test_ingest import create_lemma
+
+
+class RecomputeScrapeColumnsTestCase(DjangoTestCase):
+
+    def setUp(self) -> None:
+        self.lists = [List.objects.create(title="Liste 1"), List.objects.create(title="Liste 2")]
+        self.entries = []
+        for lst in self.lists:
+            entry = ingest_lemmas([create_lemma(1, lastName="Bach")], lst.pk)[0][3]
+            ScrapeResult.objects.create(list_entry=entry, source="obv", payload=[{"creator": ["Bacher, Hans"]}])
+            ScrapeResult.objects.create(list_entry=entry, source="wikidata", payload={"pLabel": "Bach"})
+            # columns as computed by the old substring matching
+            entry.columns_scrape = {"obv": {"count_author": 1, "list_topic_authors": []}, "wikidata": []}
+            entry.save()
+            self.entries.append(entry)
+
+    def recompute(self, *args) -> str:
+        out = StringIO()
+        call_command("recompute_scrape_columns", "--workers", "1", *args, stdout=out)
+        return out.getvalue()
+
+    def test_recompute_list(self):
+        last_updated = ListEntry.objects.get(pk=self.entries[0].pk).last_updated
+        out = self.recompute("--list", str(self.lists[0].pk))
+        self.assertIn("changed columns_scrape of 1 list entries", out)
+        self.entries[0].refresh_from_db()
+        self.assertGreater(self.entries[0].last_updated, last_updated)
+        self.assertEqual(self.entries[0].columns_scrape["obv"]["count_author"], 0)
+        self.assertEqual(self.entries[0].columns_scrape["obv"]["list_topic_authors"], ["Bacher, Hans"])
+        self.assertEqual(self.entries[0].columns_scrape["wikidata"], {"pLabel": "Bach"})
+        self.entries[1].refresh_from_db()
+        self.assertEqual(self.entries[1].columns_scrape["obv"]["count_author"], 1)
+
+    def test_kind(self):
+        self.recompute("--kind", "wikidata")
+        for entry in self.entries:
+            entry.refresh_from_db()
+            self.assertEqual(entry.columns_scrape["obv"]["count_author"], 1)
+            self.assertEqual(entry.columns_scrape["wikidata"], {"pLabel": "Bach"})
+
+    def test_dry_run(self):
+        out = self.recompute("--dry-run", "--kind", "obv")
+        self.assertIn(f"ListEntry {self.entries[0].pk}: obv.count_author: 1 -> 0", out)
+        self.assertIn("obv.list_topic_authors: 0 -> 1 entries", out)
+        self.assertIn("would change columns_scrape of 2 list entries", out)
+        self.assertEqual(ListEntry.objects.filter(columns_scrape__obv__count_author=1).count(), 2)
+
+    def test_date_range(self):
+        out = self.recompute("--until", "2000-01-01")
+        self.assertIn("changed columns_scrape of 0 list entries", out)
@@ -0,0 +1,127 @@
+"""
+Test the chunked list upload: oebl_research_backend.tasks.start_research_job and the researchjobs endpoint
+"""
+from unittest import mock
+
+from django.test import TestCase as DjangoTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from oebl_irs_workflow.models import Editor
+from oebl_research_backend.models import List, ListEntry, ResearchJob
+from oebl_research_backend.tasks import scrape_chunk, start_research_job
+from oebl_irs_workflow.tests.utilities import SetUpUserMixin
+
+
+def create_upload(list_id: int, n: int) -> dict:
+    return {
+        "listId": list_id,
+        "lemmas": [{"id": idx, "firstName": "Vorname", "lastName": f"Nachname {idx}"} for idx in range(1, n + 1)],
+    }
+
+
+@override_settings(RESEARCH_CHUNK_SIZE=2)
+@mock.patch("oebl_research_backend.tasks.dispatch_scrapes")
+@mock.patch("oebl_research_backend.tasks.scrape_chunk.delay")
+class StartResearchJobTestCase(DjangoTestCase):
+
+    def setUp(self) -> None:
+        self.list = List.objects.create(title="Liste")
+
+    def test_splits_upload_into_chunks(self, delay, dispatch_scrapes):
+        job = start_research_job(create_upload(self.list.pk, 5), None, self.list.pk)
+        self.assertEqual(job.total_chunks, 3)
+        self.assertEqual(delay.call_count, 3)
+        self.assertEqual([len(c.lemmas) for c in job.chunks.all()], [2, 2, 1])
+
+    def test_resubmission_skips_finished_chunks(self, delay, dispatch_scrapes):
+        upload = create_upload(self.list.pk, 5)
+        job = start_research_job(upload, None, self.list.pk)
+        for chunk in job.chunks.all()[:2]:
+            scrape_chunk(chunk.pk)
+        job.chunks.update(dispatched=None)
+        delay.reset_mock()
+        resumed = start_research_job(upload, None, self.list.pk)
+        self.assertEqual(resumed.pk, job.pk)
+        delay.assert_called_once_with(job.chunks.get(index=2).pk)
+        self.assertEqual(ListEntry.objects.count(), 4)
+
+    def test_finished_upload_starts_a_new_job(self, delay, dispatch_scrapes):
+        upload = create_upload(self.list.pk, 3)
+        job = start_research_job(upload, None, self.list.pk)
+        for chunk in job.chunks.all():
+            scrape_chunk(chunk.pk)
+        job.refresh_from_db()
+        self.assertIsNotNone(job.finished)
+        ListEntry.objects.all().delete()
+        delay.reset_mock()
+        new = start_research_job(upload, None, self.list.pk)
+        self.assertNotEqual(new.pk, job.pk)
+        self.assertEqual(delay.call_count, 2)
+        for chunk in new.chunks.all():
+            scrape_chunk(chunk.pk)
+        self.assertEqual(ListEntry.objects.count(), 3)
+
+    def test_running_chunks_are_not_dispatched_again(self, delay, dispatch_scrapes):
+        upload = create_upload(self.list.pk, 3)
+        start_research_job(upload, None, self.list.pk)
+        delay.reset_mock()
+        start_research_job(upload, None, self.list.pk)
+        delay.assert_not_called()
+
+    def test_chunk_is_finished_after_dispatch(self, delay, dispatch_scrapes):
+        job = start_research_job(create_upload(self.list.pk, 2), None, self.list.pk)
+        chunk = job.chunks.get()
+        dispatch_scrapes.side_effect = [ConnectionError("broker down"), None]
+        with self.assertRaises(ConnectionError):
+            scrape_chunk(chunk.pk)
+        chunk.refresh_from_db()
+        self.assertIsNone(chunk.finished)
+        self.assertEqual(len(chunk.listentry_ids), 2)
+        # the retry dispatches the entries ingested before without ingesting again
+        scrape_chunk(chunk.pk)
+        self.assertEqual(ListEntry.objects.count(), 2)
+        self.assertEqual([x[3].pk for x in dispatch_scrapes.call_args[0][0]], chunk.listentry_ids)
+        chunk.refresh_from_db()
+        job.refresh_from_db()
+        self.assertIsNotNone(chunk.finished)
+        self.assertEqual((job.chunks_done, job.total_entries), (1, 2))
+        self.assertIsNotNone(job.finished)
+
+    def test_failed_rows_are_recorded(self, delay, dispatch_scrapes):
+        upload = create_upload(self.list.pk, 2)
+        upload["lemmas"][1]["dateOfBirth"] = "kein Datum"
+        job = start_research_job(upload, None, self.list.pk)
+        scrape_chunk(job.chunks.get().pk)
+        chunk = job.chunks.get()
+        self.assertEqual(chunk.failed_rows[0]["row"], 1)
+        self.assertIsNotNone(chunk.finished)
+        self.assertIsNone(chunk.lemmas)
+        self.assertEqual(ListEntry.objects.count(), 1)
+
+
+@override_settings(RESEARCH_CHUNK_SIZE=2)
+@mock.patch("oebl_research_backend.tasks.dispatch_scrapes")
+@mock.patch("oebl_research_backend.tasks.scrape_chunk.delay")
+class ResearchJobStatusTestCase(SetUpUserMixin, APITestCase):
+    user: Editor
+
+    def setUp(self) -> None:
+        self.setUpUser()
+        self.list = List.objects.create(title="Liste", editor=self.user)
+
+    def test_status_reports_progress(self, delay, dispatch_scrapes):
+        response = self.client.post(
+            "/research/api/v1/lemmaresearch/", create_upload(self.list.pk, 3), format="json"
+        )
+        job = ResearchJob.objects.get(job_id=response.data["success"])
+        scrape_chunk(job.chunks.get(index=0).pk)
+        response = self.client.get(f"/research/api/v1/researchjobs/{job.job_id}/")
+        self.assertEqual(response.data["totalChunks"], 2)
+        self.assertEqual(response.data["chunksDone"], 1)
+        self.assertFalse(response.data["finished"])
+
+    def test_jobs_of_other_users_are_hidden(self, delay, dispatch_scrapes):
+        other = Editor.objects.create(username="other")
+        job = start_research_job(create_upload(self.list.pk, 1), other.pk, self.list.pk)
+        self.assertEqual(self.client.get(f"/research/api/v1/researchjobs/{job.job_id}/").status_code, 404)
+        self.assertEqual(self.client.get("/research/api/v1/researchjobs/").data["count"], 0)
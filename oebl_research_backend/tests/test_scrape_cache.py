@@ -0,0 +1,99 @@
+"""
+Test oebl_research_backend.scrape_cache
+"""
+import datetime
+
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.utils import timezone
+
+from oebl_research_backend.models import ScrapeCacheEntry
+from oebl_research_backend import scrape_cache
+from oebl_research_backend.scrape_cache import ScrapeCacheMiss, cache_key, cached, evict, store
+from oebl_research_backend.wikidata import query_wikidata_cached
+
+
+class FakeFetch:
+
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.response
+
+
+class ScrapeCacheTestCase(DjangoTestCase):
+
+    def test_key_is_independent_of_query_order(self):
+        self.assertEqual(cache_key("obv", {"gnd": "1", "limit": 50}), cache_key("obv", {"limit": 50, "gnd": "1"}))
+        self.assertNotEqual(cache_key("obv", {"gnd": "1"}), cache_key("wikidata", {"gnd": "1"}))
+
+    def test_response_is_fetched_once(self):
+        fetch = FakeFetch([{"title": "Titel"}])
+        self.assertEqual(cached("obv", {"gnd": "1"}, fetch), [{"title": "Titel"}])
+        self.assertEqual(cached("obv", {"gnd": "1"}, fetch), [{"title": "Titel"}])
+        self.assertEqual(fetch.calls, 1)
+
+    def test_force_refresh(self):
+        fetch = FakeFetch({"edits_count": 1})
+        cached("wikipedia", {"url": "x"}, fetch)
+        fetch.response = {"edits_count": 2}
+        self.assertEqual(cached("wikipedia", {"url": "x"}, fetch, force_refresh=True), {"edits_count": 2})
+        self.assertEqual(cached("wikipedia", {"url": "x"}, fetch), {"edits_count": 2})
+        self.assertEqual(fetch.calls, 2)
+
+    @override_settings(RESEARCH_SCRAPE_CACHE_TTL={"obv": 60})
+    def test_expired_responses_are_fetched_again(self):
+        fetch = FakeFetch([])
+        cached("obv", {"gnd": "1"}, fetch)
+        ScrapeCacheEntry.objects.update(fetched=timezone.now() - datetime.timedelta(seconds=61))
+        cached("obv", {"gnd": "1"}, fetch)
+        self.assertEqual(fetch.calls, 2)
+
+    def test_none_is_not_recorded(self):
+        fetch = FakeFetch(None)
+        cached("obv", {"gnd": "1"}, fetch)
+        self.assertFalse(ScrapeCacheEntry.objects.exists())
+
+    def test_offline_replay(self):
+        fetch = FakeFetch([])
+        cached("obv", {"gnd": "1"}, fetch)
+        ScrapeCacheEntry.objects.update(fetched=timezone.now() - datetime.timedelta(days=365))
+        with self.settings(RESEARCH_SCRAPE_CACHE_OFFLINE=True):
+            self.assertEqual(cached("obv", {"gnd": "1"}, fetch, force_refresh=True), [])
+            with self.assertRaises(ScrapeCacheMiss):
+                cached("obv", {"gnd": "2"}, fetch)
+        self.assertEqual(fetch.calls, 1)
+
+    def test_least_recently_used_are_evicted(self):
+        for gnd in ["1", "2", "3"]:
+            store("obv", {"gnd": gnd}, ["x" * 8])
+        ScrapeCacheEntry.objects.filter(query__gnd="1").update(last_accessed=timezone.now() + datetime.timedelta(seconds=1))
+        size = ScrapeCacheEntry.objects.first().size
+        self.assertEqual(evict(max_size=2 * size), 1)
+        self.assertEqual(sorted(ScrapeCacheEntry.objects.values_list("query__gnd", flat=True)), ["1", "3"])
+
+    @override_settings(RESEARCH_SCRAPE_CACHE_EVICT_EVERY=3, RESEARCH_SCRAPE_CACHE_MAX_SIZE=1)
+    def test_eviction_is_amortized(self):
+        scrape_cache._stores_since_evict = 0
+        for gnd in ["1", "2"]:
+            store("obv", {"gnd": gnd}, ["x" * 8])
+        self.assertEqual(ScrapeCacheEntry.objects.count(), 2)
+        store("obv", {"gnd": "3"}, ["x" * 8])
+        self.assertEqual(ScrapeCacheEntry.objects.count(), 0)
+
+    def test_wikidata_is_cached_per_gnd(self):
+        queried = []
+
+        def endpoint(query):
+            queried.append(query)
+            return {"results": {"bindings": [{"gnd": {"value": "1"}, "pLabel": {"value": "Person 1"}}]}}
+
+        res, failed = query_wikidata_cached(["1", "2"], run=endpoint)
+        self.assertEqual(res, {"1": {"pLabel": "Person 1"}, "2": {}})
+        res, failed = query_wikidata_cached(["1", "2", "3"], run=endpoint)
+        self.assertEqual(len(queried), 2)
+        self.assertIn('"3"', queried[1])
+        self.assertNotIn('"1"', queried[1])
+        self.assertEqual(res["1"], {"pLabel": "Person 1"})
@@ -0,0 +1,87 @@
+"""
+Test oebl_research_backend.search and the search filters of the lemmaresearch endpoint
+"""
+from django.db import connection
+from django.test import TestCase as DjangoTestCase
+from rest_framework.test import APITestCase
+
+from oebl_irs_workflow.models import Editor
+from oebl_research_backend.models import IRSPerson, List
+from oebl_research_backend.search import search_persons, search_query
+from oebl_research_backend.tasks import ingest_lemmas
+from oebl_irs_workflow.tests.utilities import SetUpUserMixin
+from .test_ingest import create_lemma
+
+
+class SearchDocumentTestCase(DjangoTestCase):
+
+    def setUp(self) -> None:
+        self.list = List.objects.create(title="Liste")
+        ingest_lemmas(
+            [
+                create_lemma(1, lastName="Schubert", firstName="Franz", alternativeNames=[{"lastName": "Schober"}]),
+                create_lemma(2, lastName="Mozart", firstName="Wolfgang"),
+                create_lemma(3, lastName="Haydn", firstName="Joseph"),
+            ],
+            self.list.pk,
+        )
+        IRSPerson.objects.filter(name="Mozart").update(bio_note="Lehrer von Schubert")
+
+    def names(self, value: str) -> list:
+        return [p.name for p in search_persons(IRSPerson.objects.all(), value)]
+
+    def test_document_is_set_on_insert(self):
+        self.assertEqual(self.names("franz"), ["Schubert"])
+        self.assertEqual(self.names("schober"), ["Schubert"])
+
+    def test_name_ranks_above_bio_note(self):
+        self.assertEqual(self.names("Schubert"), ["Schubert", "Mozart"])
+
+    def test_document_is_updated(self):
+        person = IRSPerson.objects.get(name="Haydn")
+        person.profession_detail = "Komponist"
+        person.save()
+        IRSPerson.objects.filter(name="Mozart").update(bio_note="Salzburg")
+        self.assertEqual(self.names("komponist"), ["Haydn"])
+        self.assertEqual(self.names("salzburg"), ["Mozart"])
+        self.assertEqual(self.names("Schubert"), ["Schubert"])
+
+    def test_web_search_syntax(self):
+        self.assertEqual(self.names("schubert -lehrer"), ["Schubert"])
+        self.assertEqual(self.names("haydn or mozart"), ["Mozart", "Haydn"])
+
+    def test_index_is_used(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            sql, params = (
+                IRSPerson.objects.filter(search_document=search_query("schubert")).values("pk").query.sql_with_params()
+            )
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        self.assertIn("oebl_resear_search__482521_gin", plan)
+
+
+class SearchFilterTestCase(SetUpUserMixin, APITestCase):
+    user: Editor
+
+    def setUp(self) -> None:
+        self.setUpUser()
+        self.list = List.objects.create(title="Liste", editor=self.user)
+        ingest_lemmas(
+            [
+                create_lemma(1, lastName="Schubert", firstName="Franz"),
+                create_lemma(2, lastName="Franz", firstName="Robert"),
+            ],
+            self.list.pk,
+        )
+        IRSPerson.objects.filter(name="Franz").update(bio_note="Schubert")
+
+    def test_search(self):
+        response = self.client.get("/research/api/v1/lemmaresearch/", {"search": "schubert"})
+        self.assertEqual([x["lastName"] for x in response.data["results"]], ["Schubert", "Franz"])
+
+    def test_last_name(self):
+        response = self.client.get("/research/api/v1/lemmaresearch/", {"last_name": "franz"})
+        self.assertEqual([x["lastName"] for x in response.data["results"]], ["Franz"])
+        response = self.client.get("/research/api/v1/lemmaresearch/", {"first_name": "franz"})
+        self.assertEqual([x["lastName"] for x in response.data["results"]], ["Schubert"])
@@ -0,0 +1,92 @@
+"""
+Test oebl_research_backend.wikidata
+"""
+import re
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase as DjangoTestCase, override_settings
+
+from oebl_research_backend.tasks import dispatch_scrapes, get_obv_records, get_wikidata_records_batch, get_wikipedia_entries
+from oebl_research_backend.wikidata import build_query, query_wikidata_batched
+
+
+class FakeEndpoint:
+    """Answers queries for up to max_gnds GNDs, fails (like a timeout) for larger ones"""
+
+    def __init__(self, max_gnds: int, broken=()):
+        self.max_gnds = max_gnds
+        self.broken = set(broken)
+        self.queries = []
+
+    def __call__(self, query: str) -> dict:
+        gnds = re.findall(r'"([0-9X-]+)"', query.split("VALUES")[1].split("}")[0])
+        self.queries.append(gnds)
+        if len(gnds) > self.max_gnds or self.broken.intersection(gnds):
+            raise TimeoutError("query timed out")
+        return {
+            "results": {
+                "bindings": [
+                    {"gnd": {"value": gnd}, "p": {"value": f"http://www.wikidata.org/entity/Q{gnd}"}}
+                    for gnd in gnds
+                ]
+            }
+        }
+
+
+class WikidataBatchTestCase(SimpleTestCase):
+
+    def test_one_query_per_batch(self):
+        endpoint = FakeEndpoint(max_gnds=10)
+        res, failed = query_wikidata_batched([str(x) for x in range(1, 21)], batch_size=10, run=endpoint)
+        self.assertEqual(len(endpoint.queries), 2)
+        self.assertEqual(res["7"], {"p": "http://www.wikidata.org/entity/Q7"})
+        self.assertEqual(failed, [])
+
+    def test_failing_batches_are_split(self):
+        endpoint = FakeEndpoint(max_gnds=2)
+        res, failed = query_wikidata_batched([str(x) for x in range(1, 9)], batch_size=8, run=endpoint)
+        self.assertEqual(len(res), 8)
+        self.assertEqual([len(q) for q in endpoint.queries], [8, 4, 2, 2, 4, 2, 2])
+
+    def test_single_failing_gnd_is_reported(self):
+        endpoint = FakeEndpoint(max_gnds=4, broken=["3"])
+        res, failed = query_wikidata_batched(["1", "2", "3", "4"], batch_size=4, run=endpoint)
+        self.assertEqual(failed, ["3"])
+        self.assertEqual(sorted(res), ["1", "2", "4"])
+
+    def test_malformed_gnds_are_not_queried(self):
+        query = build_query(["118540238", '1" } ?p ?x ?y . {'])
+        self.assertIn('"118540238"', query)
+        self.assertNotIn("?x ?y", query)
+
+
+@override_settings(RESEARCH_WIKIDATA_BATCH_SIZE=2)
+@mock.patch("oebl_research_backend.tasks.notify")
+@mock.patch("oebl_research_backend.tasks.group")
+class DispatchScrapesTestCase(DjangoTestCase):
+
+    def create_ingested(self, n: int) -> list:
+        return [
+            ([f"11850{x}"], {"firstName": "Vorname", "lastName": f"Nachname {x}"}, SimpleNamespace(pk=x), SimpleNamespace(pk=100 + x))
+            for x in range(n)
+        ]
+
+    def test_wikidata_is_batched(self, group, notify):
+        dispatch_scrapes(self.create_ingested(3), "job")
+        chords = group.call_args[0][0]
+        self.assertEqual(len(chords), 2)
+        header = chords[0].tasks
+        wikidata, wikipedia = header[0].tasks
+        self.assertEqual(wikidata.task, get_wikidata_records_batch.name)
+        self.assertEqual([x[3] for x in wikidata.args[0]], [[100], [101]])
+        self.assertEqual(wikipedia.task, get_wikipedia_entries.name)
+        self.assertEqual([s.task for s in header[1:]], [get_obv_records.name] * 2)
+        self.assertEqual(chords[0].body.args[2], [100, 101])
+        self.assertEqual(chords[1].body.args[2], [102])
+
+    def test_entries_without_single_gnd_are_posted(self, group, notify):
+        ingested = self.create_ingested(2)
+        ingested[1] = ([], *ingested[1][1:])
+        dispatch_scrapes(ingested, "job")
+        notify.assert_called_once_with([101])
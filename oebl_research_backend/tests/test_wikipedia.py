@@ -0,0 +1,78 @@
+"""
+Test oebl_research_backend.wikipedia
+"""
+import requests
+from django.test import SimpleTestCase
+
+from oebl_research_backend import wikipedia
+from oebl_research_backend.http_session import use_session
+
+
+class FakeResponse:
+
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+    def json(self):
+        return self.data
+
+
+class FakeApiSession:
+    """Serves the revisions of one article in batches of two, like the MediaWiki API with continuation"""
+
+    def __init__(self, users, missing=False, fail_at=None, failure=None):
+        self.users = users
+        self.missing = missing
+        self.fail_at = fail_at
+        self.failure = failure
+        self.requests = []
+
+    def get(self, url, params=None):
+        self.requests.append(params)
+        if len(self.requests) == self.fail_at:
+            return self.failure
+        if self.missing:
+            return FakeResponse({"query": {"pages": [{"title": params["titles"], "missing": True}]}})
+        start = int(params.get("rvcontinue", 0))
+        page = {"title": params["titles"], "revisions": [{"user": u} for u in self.users[start:start + 2]]}
+        if start == 0:
+            page["extract"] = "Text des Artikels"
+        res = {"query": {"pages": [page]}}
+        if start + 2 < len(self.users):
+            res["continue"] = {"rvcontinue": str(start + 2), "continue": "||"}
+        return FakeResponse(res)
+
+
+class ArticleStatisticsTestCase(SimpleTestCase):
+
+    def test_counts_distinct_editors_across_batches(self):
+        session = FakeApiSession(["A", "B", "A", "C", "B"])
+        with use_session(session):
+            res = wikipedia.get_article_statistics("Franz Schubert")
+        self.assertEqual(res, {"edits_count": 5, "number_of_editors": 3, "txt": "Text des Artikels"})
+        self.assertEqual(len(session.requests), 3)
+        self.assertEqual(session.requests[1]["rvcontinue"], "2")
+
+    def test_missing_article(self):
+        with use_session(FakeApiSession([], missing=True)):
+            res = wikipedia.get_article_statistics("Gibt es nicht")
+        self.assertEqual(res["edits_count"], wikipedia.NOT_AVAILABLE)
+
+    def test_failed_calls_raise(self):
+        for failure, exception in (
+            (FakeResponse({}, status_code=503), requests.HTTPError),
+            (FakeResponse({"error": {"code": "ratelimited", "info": "too many requests"}}), wikipedia.WikipediaAPIError),
+        ):
+            with use_session(FakeApiSession(["A", "B", "C"], fail_at=2, failure=failure)):
+                with self.assertRaises(exception):
+                    wikipedia.get_article_statistics("Franz Schubert")
+
+    def test_title_from_url(self):
+        self.assertEqual(
+            wikipedia.title_from_url("https://de.wikipedia.org/wiki/Kurt_G%C3%B6del"), "Kurt_Gödel"
+        )
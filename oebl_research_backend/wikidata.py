@@ -0,0 +1,137 @@
+"""Batched lookups of persons in Wikidata by GND.
+
+Up to RESEARCH_WIKIDATA_BATCH_SIZE GNDs are resolved with one SPARQL query using a
+VALUES block. When a query fails (typically a timeout of the query service) the batch is
+split in halves and retried, down to single GNDs. Results are recorded per GND in the
+scrape cache, so only GNDs without a fresh response are queried.
+"""
+import re
+import typing
+
+from django.conf import settings
+from SPARQLWrapper import SPARQLWrapper, JSON
+
+from . import rate_limit, scrape_cache
+
+WIKIDATA_ENDPOINT = "https://query.wikidata.org/sparql"
+BATCH_SIZE = 50
+"""default number of GNDs per query, see RESEARCH_WIKIDATA_BATCH_SIZE"""
+QUERY_TIMEOUT = 60
+GND_PATTERN = re.compile(r"[0-9]+[0-9X-]*", re.IGNORECASE)
+
+WIKIDATA_QUERY = """
+    SELECT ?gnd ?p ?pLabel ?date_of_birth ?date_of_death ?ndb ?loc ?viaf ?wiki_de ?parlAT ?wienWiki (GROUP_CONCAT(?ausz2;SEPARATOR=", ") AS ?auszeichnungen)
+        WHERE {{
+          VALUES ?gnd {{ {values} }}
+          ?p wdt:P227 ?gnd.
+          OPTIONAL {{ ?p wdt:P7902 ?ndb }}
+          OPTIONAL {{ ?p wdt:P244 ?loc }}
+          OPTIONAL {{ ?p wdt:P2280 ?parlAT }}
+          OPTIONAL {{ ?p wdt:P7842 ?wienWiki }}
+          OPTIONAL {{ ?p wdt:P569 ?date_of_birth }}
+          OPTIONAL {{ ?p wdt:P570 ?date_of_death }}
+          OPTIONAL {{ ?p wdt:P214 ?viaf }}
+          OPTIONAL {{ ?wiki_de schema:about ?p .
+            ?wiki_de schema:inLanguage "de" .
+            ?wiki_de schema:isPartOf <https://de.wikipedia.org/> }}
+          OPTIONAL {{ ?p wdt:P166 ?ausz2 }}
+             SERVICE wikibase:label {{
+             bd:serviceParam wikibase:language "[AUTO_LANGUAGE], de" .
+           }}
+          }}
+        GROUP BY ?gnd ?p ?pLabel ?date_of_birth ?date_of_death ?ndb ?loc ?viaf ?wiki_de ?parlAT ?wienWiki
+"""
+
+
+def build_query(gnds: typing.List[str]) -> str:
+    """SPARQL query resolving all gnds, GNDs that are not well formed are left out"""
+    values = " ".join(f'"{gnd}"' for gnd in gnds if GND_PATTERN.fullmatch(gnd))
+    return WIKIDATA_QUERY.format(values=values)
+
+
+def run_query(query: str) -> dict:
+    sparqlwd = SPARQLWrapper(WIKIDATA_ENDPOINT)
+    sparqlwd.setQuery(query)
+    sparqlwd.setReturnFormat(JSON)
+    sparqlwd.setTimeout(QUERY_TIMEOUT)
+    rate_limit.acquire("wikidata")
+    return sparqlwd.query().convert()
+
+
+def query_wikidata(gnds: typing.List[str], run=run_query) -> typing.Dict[str, dict]:
+    """Resolves gnds with a single query
+
+    Returns:
+        Dict[str, dict]: the values of the first binding of every GND found, keyed by GND
+    """
+    results = run(build_query(gnds))
+    res = {}
+    for binding in results["results"]["bindings"]:
+        gnd = binding["gnd"]["value"]
+        if gnd not in res:
+            res[gnd] = {k: v["value"] for k, v in binding.items() if k != "gnd"}
+    return res
+
+
+def query_wikidata_batched(
+    gnds: typing.List[str], batch_size: typing.Optional[int] = None, run=run_query
+) -> typing.Tuple[typing.Dict[str, dict], typing.List[str]]:
+    """Resolves gnds in batches, failing batches are split in halves and retried
+
+    Args:
+        gnds (List[str]): GNDs to resolve
+        batch_size (int, optional): GNDs per query. Defaults to RESEARCH_WIKIDATA_BATCH_SIZE or BATCH_SIZE.
+        run (callable, optional): executes a query, used by tests. Defaults to run_query.
+
+    Returns:
+        Tuple[Dict[str, dict], List[str]]: results keyed by GND and the GNDs that failed even when queried alone
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, "RESEARCH_WIKIDATA_BATCH_SIZE", BATCH_SIZE)
+    gnds = list(dict.fromkeys(gnds))
+    res = {}
+    failed = []
+    batches = [gnds[i:i + batch_size] for i in range(0, len(gnds), batch_size)]
+    while batches:
+        batch = batches.pop(0)
+        try:
+            res.update(query_wikidata(batch, run=run))
+        except Exception as e:
+            print(f"wikidata query for {len(batch)} GNDs failed: {e}")
+            if len(batch) == 1:
+                failed.extend(batch)
+            else:
+                half = len(batch) // 2
+                batches[0:0] = [batch[:half], batch[half:]]
+    return res, failed
+
+
+def query_wikidata_cached(
+    gnds: typing.List[str], force_refresh: bool = False, batch_size: typing.Optional[int] = None, run=run_query
+) -> typing.Tuple[typing.Dict[str, dict], typing.List[str]]:
+    """Same as query_wikidata_batched, served from the scrape cache where possible
+
+    GNDs without a wikidata item are recorded as empty results. In offline mode GNDs that
+    were never recorded are returned as failed.
+
+    Args:
+        gnds (List[str]): GNDs to resolve
+        force_refresh (bool, optional): query all gnds even if cached. Defaults to False.
+        batch_size (int, optional): GNDs per query. Defaults to RESEARCH_WIKIDATA_BATCH_SIZE or BATCH_SIZE.
+        run (callable, optional): executes a query, used by tests. Defaults to run_query.
+
+    Returns:
+        Tuple[Dict[str, dict], List[str]]: results keyed by GND and the GNDs that failed
+    """
+    gnds = list(dict.fromkeys(gnds))
+    hits = scrape_cache.lookup_many("wikidata", [{"gnd": gnd} for gnd in gnds], force_refresh=force_refresh)
+    res = {gnds[idx]: response for idx, response in hits.items()}
+    missing = [gnd for gnd in gnds if gnd not in res]
+    if scrape_cache.is_offline():
+        return res, missing
+    found, failed = query_wikidata_batched(missing, batch_size=batch_size, run=run)
+    for gnd in missing:
+        if gnd not in failed:
+            res[gnd] = found.get(gnd, {})
+            scrape_cache.store("wikidata", {"gnd": gnd}, res[gnd])
+    return res, failed
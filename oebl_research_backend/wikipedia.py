@@ -0,0 +1,138 @@
+"""Revision statistics and article text of german Wikipedia articles.
+
+By default the MediaWiki query API is used: revisions (only the user of each revision) are
+fetched in batches of the API maximum together with the plain text extract of the article,
+following the continuation until all revisions are seen. The legacy mode scrapes the HTML
+history pages instead and is kept for comparison (RESEARCH_WIKIPEDIA_MODE = "html").
+Failed API calls raise, so partial statistics are neither written nor cached.
+"""
+import typing
+from urllib.parse import unquote
+
+from django.conf import settings
+from lxml import html
+
+from .http_session import get_session
+
+WIKIPEDIA_API_URL = "https://de.wikipedia.org/w/api.php"
+NOT_AVAILABLE = "Not available"
+
+
+class WikipediaAPIError(Exception):
+    """The MediaWiki API answered with an error (e.g. throttling)"""
+    pass
+
+
+def title_from_url(url: str) -> str:
+    """Article title of a wikipedia url, e.g. https://de.wikipedia.org/wiki/Franz_Schubert"""
+    return unquote(url.split("/")[-1])
+
+
+def get_article_statistics(title: str, api_url: str = WIKIPEDIA_API_URL) -> dict:
+    """Number of revisions, exact number of distinct editors and the plain text of an article
+
+    Args:
+        title (str): title of the article
+        api_url (str, optional): api.php of the wiki. Defaults to WIKIPEDIA_API_URL.
+
+    Raises:
+        requests.HTTPError: an API call failed
+        WikipediaAPIError: the API answered with an error
+
+    Returns:
+        dict: edits_count, number_of_editors and txt; the counts are NOT_AVAILABLE for missing articles
+    """
+    session = get_session()
+    params = {
+        "action": "query",
+        "format": "json",
+        "formatversion": "2",
+        "redirects": "1",
+        "titles": title,
+        "prop": "revisions|extracts",
+        "rvprop": "user",
+        "rvlimit": "max",
+        "explaintext": "1",
+    }
+    count_vers = 0
+    editors = set()
+    txt = ""
+    cont: typing.Dict[str, str] = {}
+    while True:
+        response = session.get(api_url, params={**params, **cont})
+        response.raise_for_status()
+        res = response.json()
+        if res.get("error"):
+            raise WikipediaAPIError(f"{res['error'].get('code')}: {res['error'].get('info')}")
+        for page in res.get("query", {}).get("pages", []):
+            if page.get("missing") or page.get("invalid"):
+                return {"edits_count": NOT_AVAILABLE, "number_of_editors": NOT_AVAILABLE, "txt": ""}
+            revisions = page.get("revisions", [])
+            count_vers += len(revisions)
+            editors.update(rev["user"] for rev in revisions if "user" in rev)
+            txt = page.get("extract") or txt
+        if "continue" not in res:
+            break
+        cont = res["continue"]
+    return {"edits_count": count_vers, "number_of_editors": len(editors), "txt": txt}
+
+
+def get_article_statistics_html(url: str) -> dict:
+    """Same as get_article_statistics, scraped from the HTML history pages of the article
+
+    The editor count is summed per history page, so editors appearing on several pages are
+    counted more than once.
+    """
+    session = get_session()
+    try:
+        url_version_hist = f"https://de.wikipedia.org/w/index.php?title={url.split('/')[-1]}&offset=&limit=500&action=history"
+        vers_hist_page = session.get(url_version_hist)
+        tree_vers_hist = html.fromstring(vers_hist_page.content)
+        vers_hist_entries = tree_vers_hist.xpath('//*[@id="pagehistory"]/ul/li')
+        count_vers = len(vers_hist_entries)
+        count_editors = [
+            x.xpath('.//span[@class="history-user"]/a/@href')[0]
+            for x in vers_hist_entries
+        ]
+        count_editors = len(list(dict.fromkeys(count_editors)))
+        next_link = tree_vers_hist.xpath('//*[@id="mw-content-text"]/a[@rel="next"]')
+        while len(next_link) > 0:
+            vers_hist_page = session.get(
+                "https://de.wikipedia.org" + next_link[0].get("href")
+            )
+            tree_vers_hist = html.fromstring(vers_hist_page.content)
+            vers_hist_entries = tree_vers_hist.xpath('//*[@id="pagehistory"]/ul/li')
+            count_vers += len(vers_hist_entries)
+            count_editors_1 = [
+                x.xpath('.//span[@class="history-user"]/a/@href')[0]
+                for x in vers_hist_entries
+            ]
+            count_editors += len(list(dict.fromkeys(count_editors_1)))
+            next_link = tree_vers_hist.xpath(
+                '//*[@id="mw-content-text"]/a[@rel="next"]'
+            )
+    except Exception as e:
+        print(e)
+        count_editors = NOT_AVAILABLE
+        count_vers = NOT_AVAILABLE
+    page = session.get(url)
+    tree = html.fromstring(page.content)
+    txt = tree.xpath('.//div[@class="mw-parser-output"]')[0].text_content()
+    return {"edits_count": count_vers, "number_of_editors": count_editors, "txt": txt}
+
+
+def get_wikipedia_statistics(url: str, mode: typing.Optional[str] = None) -> dict:
+    """Revision statistics and text of the article at url
+
+    Args:
+        url (str): url of the article
+        mode (str, optional): "api" or "html". Defaults to RESEARCH_WIKIPEDIA_MODE or "api".
+
+    Returns:
+        dict: edits_count, number_of_editors and txt
+    """
+    if mode is None:
+        mode = getattr(settings, "RESEARCH_WIKIPEDIA_MODE", "api")
+    if mode == "html":
+        return get_article_statistics_html(url)
+    return get_article_statistics(title_from_url(url))